@@ -0,0 +1,135 @@
+# app/database/migrations.py
+"""
+Schema upgrades for databases created from older models.
+
+Base.metadata.create_all creates missing tables but never adds columns or
+indexes to a table that already exists. upgrade() adds the ones listed below,
+skipping anything that is already there, so it is safe to run on every
+startup (main.py does, right after create_all) or by hand:
+
+    python -m app.database.migrations
+"""
+from sqlalchemy import inspect, text
+from app.database.connection import Base
+from app.models import blockchain, record, access_control, access_log, connection  # noqa: F401  (registers the tables below)
+from app.utils.logger import logger
+
+# (table, column, SQL default for existing rows or None), in the models' definitions
+COLUMNS = [
+    ("blocks", "hash_version", None),  # NULL = legacy hash, see block_hash_service
+    ("blocks", "anchor_id", None),
+    ("records", "status", "'ready'"),  # rows from before async uploads are ready
+    ("records", "ciphertext_sha256", None),
+    ("records", "idempotency_key", None),
+    ("access_control", "expires_at", None),  # NULL = until revoked
+]
+
+# (table, index name), in the models' definitions
+INDEXES = [
+    ("blocks", "ix_blocks_anchor_id"),
+    ("blocks", "ix_blocks_patient_id_id"),
+    ("blocks", "ix_blocks_doctor_id_id"),
+    ("blocks", "ix_blocks_record_id_id"),
+    ("records", "ix_records_ciphertext_sha256"),
+    ("records", "ix_records_idempotency_key"),  # unique
+    ("access_control", "ix_access_control_expires_at"),
+    ("access_control", "ix_access_control_doctor_id_record_id"),
+    ("access_logs", "ix_access_logs_patient_id_id"),
+    ("access_logs", "ix_access_logs_doctor_id_id"),
+    ("connections", "ix_connections_doctor_id_patient_id"),
+]
+
+# one grant per (patient, doctor, record); target of the grant upserts in access_grant_service
+GRANT_CONSTRAINT = ("uq_access_control_grant", ("patient_id", "doctor_id", "record_id"))
+
+# (table, column, constraint name); not added on SQLite, which cannot ALTER in a foreign key
+FOREIGN_KEYS = [
+    ("blocks", "anchor_id", "fk_blocks_anchor_id"),
+]
+
+
+def _add_column(conn, table: str, column: str, default):
+    col = Base.metadata.tables[table].c[column]
+    ddl = f"ALTER TABLE {table} ADD COLUMN {column} {col.type.compile(dialect=conn.dialect)}"
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+    conn.execute(text(ddl))
+
+
+def _has_unique(inspector, table: str, columns) -> bool:
+    unique = [c["column_names"] for c in inspector.get_unique_constraints(table)]
+    unique += [i["column_names"] for i in inspector.get_indexes(table) if i.get("unique")]
+    return any(set(cols) == set(columns) for cols in unique)
+
+
+def _drop_duplicate_grants(conn) -> int:
+    """Keeps the newest access_control row of each (patient, doctor, record) grant."""
+    return conn.execute(text(
+        "DELETE FROM access_control WHERE record_id IS NOT NULL AND id NOT IN ("
+        " SELECT keep_id FROM (SELECT MAX(id) AS keep_id FROM access_control"
+        " WHERE record_id IS NOT NULL GROUP BY patient_id, doctor_id, record_id) AS newest)"
+    )).rowcount
+
+
+def _add_foreign_key(conn, table: str, column: str, name: str):
+    (fk,) = Base.metadata.tables[table].c[column].foreign_keys
+    target = fk.column
+    conn.execute(text(
+        f"ALTER TABLE {table} ADD CONSTRAINT {name} FOREIGN KEY ({column}) "
+        f"REFERENCES {target.table.name} ({target.name})"
+    ))
+
+
+def upgrade(engine) -> list:
+    """
+    Adds missing columns, indexes and foreign keys; returns what was added.
+    Duplicate grants are collapsed to their newest row before the grant
+    unique index is added.
+    """
+    applied = []
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+
+    for table, column, default in COLUMNS:
+        if table in tables and column not in {c["name"] for c in inspector.get_columns(table)}:
+            with engine.begin() as conn:
+                _add_column(conn, table, column, default)
+            applied.append(f"column {table}.{column}")
+
+    for table, name in INDEXES:
+        if table not in tables or name in {i["name"] for i in inspector.get_indexes(table)}:
+            continue
+        # a unique column created by an older create_all already has an unnamed unique index
+        column = Base.metadata.tables[table].c.get(name[len(f"ix_{table}_"):])
+        if column is not None and column.unique and _has_unique(inspector, table, [column.name]):
+            continue
+        index = next(i for i in Base.metadata.tables[table].indexes if i.name == name)
+        with engine.begin() as conn:
+            index.create(conn)
+        applied.append(f"index {name}")
+
+    name, columns = GRANT_CONSTRAINT
+    if "access_control" in tables and not _has_unique(inspector, "access_control", columns):
+        with engine.begin() as conn:
+            dropped = _drop_duplicate_grants(conn)
+            conn.execute(text(f"CREATE UNIQUE INDEX {name} ON access_control ({', '.join(columns)})"))
+        applied.append(f"unique index {name}" + (f" ({dropped} duplicate grants dropped)" if dropped else ""))
+
+    if engine.dialect.name != "sqlite":
+        for table, column, name in FOREIGN_KEYS:
+            existing = [fk["constrained_columns"] for fk in inspector.get_foreign_keys(table)]
+            if table in tables and [column] not in existing:
+                with engine.begin() as conn:
+                    _add_foreign_key(conn, table, column, name)
+                applied.append(f"foreign key {name}")
+
+    if applied:
+        logger.info("Schema upgraded: %s", ", ".join(applied))
+    return applied
+
+
+if __name__ == "__main__":
+    from app.database.connection import engine
+
+    Base.metadata.create_all(bind=engine)
+    print("\n".join(upgrade(engine)) or "Schema is up to date.")
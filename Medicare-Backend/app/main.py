@@ -3,8 +3,11 @@ from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from sqlalchemy.exc import SQLAlchemyError
 from app.database.connection import Base, engine
+from app.database import migrations
 from app.routes import auth, doctor, patient, admin, record, access_control, blockchain
-from app.services.blockchain_service import verify_chain
+from app.services.integrity_auditor_service import auditor as integrity_auditor
+from app.services import merkle_service, ingest_service
+from app.services.grant_expiry_service import scheduler as grant_expiry
 from app.database.connection import SessionLocal
 from app.utils.logger import logger
 from app.routes import connection_router
@@ -39,6 +42,8 @@ app.include_router(connection_router.router)
 def initialize_tables():
     try:
         Base.metadata.create_all(bind=engine)
+        # create_all does not add new columns or indexes to existing tables
+        migrations.upgrade(engine)
         print("All SQLAlchemy tables created successfully.")
     except SQLAlchemyError as e:
         print(f"Error while creating tables: {e}")
@@ -60,14 +65,34 @@ async def catch_exceptions_middleware(request: Request, call_next):
 
 
 @app.on_event("startup")
-def verify_blockchain_startup():
-    db = SessionLocal()
-    result = verify_chain(db)
-
-    if result["valid"]:
-        print(f"[BLOCKCHAIN] Verified Successfully")
-    else:
-        print(f"[BLOCKCHAIN]  Verification failed")
+def start_integrity_auditor():
+    # chain verification runs in the background so startup is not blocked on it
+    integrity_auditor.start()
+
+@app.on_event("shutdown")
+def stop_integrity_auditor():
+    integrity_auditor.stop()
+
+@app.on_event("startup")
+def start_merkle_anchoring():
+    merkle_service.start_anchoring()
+
+@app.on_event("shutdown")
+def stop_merkle_anchoring():
+    merkle_service.stop_anchoring()
+
+@app.on_event("startup")
+def recover_async_uploads():
+    # async uploads interrupted by a restart are re-queued or marked failed
+    ingest_service.recover()
+
+@app.on_event("startup")
+def start_grant_expiry():
+    grant_expiry.start()
+
+@app.on_event("shutdown")
+def stop_grant_expiry():
+    grant_expiry.stop()
 
 def custom_openapi():
     if app.openapi_schema:
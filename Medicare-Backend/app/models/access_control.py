@@ -1,9 +1,15 @@
-from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey, String, Text
+from sqlalchemy import Column, Integer, Boolean, DateTime, ForeignKey, String, Text, UniqueConstraint, Index
 from datetime import datetime
 from app.database.connection import Base
 
 class AccessControl(Base):
     __tablename__ = "access_control"
+    __table_args__ = (
+        # one wrapped key per doctor and record; target of the grant upserts
+        UniqueConstraint("patient_id", "doctor_id", "record_id", name="uq_access_control_grant"),
+        # per-doctor loads of the authorization index and doctor key lookups
+        Index("ix_access_control_doctor_id_record_id", "doctor_id", "record_id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -19,3 +25,4 @@ class AccessControl(Base):
     status = Column(String(100), default="pending")  # pending, approved, rejected
     granted_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow)
+    expires_at = Column(DateTime, nullable=True, index=True)  # UTC; NULL = until revoked
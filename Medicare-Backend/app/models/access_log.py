@@ -1,10 +1,15 @@
-from sqlalchemy import Column, Integer, ForeignKey, String, DateTime
+from sqlalchemy import Column, Integer, ForeignKey, String, DateTime, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database.connection import Base
 
 class AccessLog(Base):
     __tablename__ = "access_logs"
+    __table_args__ = (
+        # newest-first log pages per patient / per doctor
+        Index("ix_access_logs_patient_id_id", "patient_id", "id"),
+        Index("ix_access_logs_doctor_id_id", "doctor_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     patient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
@@ -1,10 +1,17 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
 from datetime import datetime
-import hashlib
 from app.database.connection import Base
 
 class Block(Base):
     __tablename__ = "blocks"
+    __table_args__ = (
+        # per-patient chain walks and head lookups
+        Index("ix_blocks_patient_id_id", "patient_id", "id"),
+        # per-doctor ledger pages
+        Index("ix_blocks_doctor_id_id", "doctor_id", "id"),
+        # record provenance (upload + access history)
+        Index("ix_blocks_record_id_id", "record_id", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     doctor_id = Column(Integer, nullable=False)
@@ -16,14 +23,53 @@ class Block(Base):
     data_hash = Column(String(255), nullable=True)
     ipfs_cid = Column(String(255), nullable=True)
 
-    @staticmethod
-    def generate_hash(
-        doctor_id: int,
-        patient_id: int,
-        ipfs_cid: str = "",
-        previous_hash: str = "",
-        data_hash: str = "",
-    ) -> str:
-        raw = f"{doctor_id}|{patient_id}|{ipfs_cid}|{previous_hash}|{data_hash}|{datetime.utcnow().isoformat()}"
-        return hashlib.sha256(raw.encode()).hexdigest()
-    
\ No newline at end of file
+    # NULL = legacy hash that cannot be recomputed, see block_hash_service
+    hash_version = Column(Integer, nullable=True)
+    # Merkle batch this block's hash was anchored in, NULL until anchored
+    anchor_id = Column(Integer, ForeignKey("merkle_anchors.id"), nullable=True, index=True)
+
+
+class ChainCheckpoint(Base):
+    """Last verified block of a patient's chain, so verification can resume from there."""
+    __tablename__ = "chain_checkpoints"
+
+    patient_id = Column(Integer, primary_key=True, autoincrement=False)
+    last_block_id = Column(Integer, nullable=False)
+    head_hash = Column(String(255), nullable=False)
+    block_count = Column(Integer, nullable=False, default=0)
+    verified_at = Column(DateTime, default=datetime.utcnow)
+
+
+class AuditWatermark(Base):
+    """Highest block id a background audit pass has covered, by pass (see integrity_auditor_service)."""
+    __tablename__ = "audit_watermarks"
+
+    name = Column(String(50), primary_key=True)
+    last_block_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class ChainHead(Base):
+    """
+    Current head of each patient chain. Appends lock this row (SELECT ... FOR UPDATE)
+    in the same transaction as the block insert, so concurrent appends to one
+    chain serialize on a single row instead of forking the chain.
+    """
+    __tablename__ = "chain_heads"
+
+    patient_id = Column(Integer, primary_key=True, autoincrement=False)
+    last_block_id = Column(Integer, nullable=True)
+    head_hash = Column(String(255), nullable=False, default="0")
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+class MerkleAnchor(Base):
+    """Merkle root over a batch of block hashes (see merkle_service)."""
+    __tablename__ = "merkle_anchors"
+
+    id = Column(Integer, primary_key=True, index=True)
+    root_hash = Column(String(64), nullable=False)
+    leaf_count = Column(Integer, nullable=False)
+    first_block_id = Column(Integer, nullable=False)
+    last_block_id = Column(Integer, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, ForeignKey, Enum, DateTime, String
+from sqlalchemy import Column, Integer, ForeignKey, Enum, DateTime, String, Index
 from app.database.connection import Base
 import enum
 from datetime import datetime
@@ -10,6 +10,10 @@ class ConnectionStatus(enum.Enum):
 
 class Connection(Base):
     __tablename__ = "connections"
+    __table_args__ = (
+        # doctor -> connected patients (authorization index loads)
+        Index("ix_connections_doctor_id_patient_id", "doctor_id", "patient_id"),
+    )
 
     id = Column(Integer, primary_key=True, autoincrement=True)
     patient_id = Column(Integer, ForeignKey("users.id"))
@@ -22,3 +22,6 @@ class Record(Base):
     signature_b64 = Column(Text, nullable=True)  # base64 ECDSA signature (DER)
     block_id = Column(Integer, ForeignKey("blocks.id"), nullable=True)
     description = Column(Text, nullable=True)
+    status = Column(String(20), default="ready")  # pending, ready, failed (async uploads)
+    ciphertext_sha256 = Column(String(64), nullable=True, index=True)  # hex digest of the uploaded ciphertext
+    idempotency_key = Column(String(200), nullable=True, unique=True, index=True)  # "<uploader_id>:<Idempotency-Key header>"
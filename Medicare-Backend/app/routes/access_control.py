@@ -1,12 +1,13 @@
 # app/routes/access.py
 from fastapi import APIRouter, Depends, HTTPException, Query, Body
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, or_, func
+from sqlalchemy.orm import Session, aliased
 from app.database.connection import get_db
 from app.models.user import User, RoleEnum
 from app.models.access_control import AccessControl
 from app.services.token_service import require_role
 from app.services.auth_helpers import get_token_payload
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from app.models.access_control import AccessControl
 from app.models.connection import Connection, ConnectionStatus
 import base64
@@ -17,8 +18,13 @@ from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization, hashes
 from app.models.record import Record
 from app.models.access_log import AccessLog
+from app.services import key_wrap_service, access_grant_service
+from app.services.authz_index_service import index as authz_index
+from app.services.grant_expiry_service import scheduler as grant_expiry
+from app.utils.pagination import encode_cursor, decode_cursor, clamp_limit
 
 router = APIRouter(prefix="/access", tags=["Access Control"])
+GRANT_BATCH_MAX = int(os.getenv("GRANT_BATCH_MAX", 1000))
 
 @router.post("/request", dependencies=[Depends(require_role(RoleEnum.doctor))])
 def request_access(patient_id: int, db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
@@ -43,6 +49,7 @@ def request_access(patient_id: int, db: Session = Depends(get_db), payload: dict
         db.add(access)
 
     db.commit()
+    authz_index.invalidate(doctor.id)
     return {"message": "Access request sent to patient."}
 
 
@@ -53,22 +60,22 @@ def get_requests(db: Session = Depends(get_db), payload: dict = Depends(get_toke
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    requests = db.query(AccessControl).filter(
-        AccessControl.patient_id == patient.id,
-        AccessControl.status == "pending"
-    ).all()
+    requests = (
+        db.query(AccessControl.id, AccessControl.granted_at, AccessControl.updated_at, User.name, User.email)
+        .outerjoin(User, User.id == AccessControl.doctor_id)
+        .filter(AccessControl.patient_id == patient.id, AccessControl.status == "pending")
+        .all()
+    )
 
-    result = []
-    for req in requests:
-        doctor = db.query(User).filter(User.id == req.doctor_id).first()
-        result.append({
+    return [
+        {
             "id": req.id,
-            "doctorName": doctor.name if doctor else None,
-            "doctorEmail": doctor.email if doctor else None,
-            "requestedAt": req.updated_at or req.created_at
-        })
-
-    return result
+            "doctorName": req.name,
+            "doctorEmail": req.email,
+            "requestedAt": req.updated_at or req.granted_at
+        }
+        for req in requests
+    ]
 
 
 @router.post("/respond", dependencies=[Depends(require_role(RoleEnum.patient))])
@@ -88,9 +95,92 @@ def respond_access(requestId: int, status: str, db: Session = Depends(get_db), p
     access.granted = (status == "approved")
     access.updated_at = datetime.utcnow()
     db.commit()
+    authz_index.invalidate(access.doctor_id)
     return {"message": f"Access {status} for request {requestId}"}
 
 
+# Optional grant lifetime: "expires_in_hours" (e.g. 24 or 720) or an ISO-8601 "expires_at" (UTC if naive)
+def _grant_expiry(data: dict):
+    hours, at = data.get("expires_in_hours"), data.get("expires_at")
+    if hours is None and at is None:
+        return None
+    if hours is not None and at is not None:
+        raise HTTPException(status_code=400, detail="Pass either expires_in_hours or expires_at, not both")
+    now = datetime.utcnow()
+    if hours is not None:
+        if isinstance(hours, bool) or not isinstance(hours, (int, float)) or hours <= 0:
+            raise HTTPException(status_code=400, detail="expires_in_hours must be a positive number")
+        return now + timedelta(hours=hours)
+    try:
+        expires_at = datetime.fromisoformat(str(at).replace("Z", "+00:00"))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="expires_at must be an ISO-8601 datetime")
+    if expires_at.tzinfo:
+        expires_at = expires_at.astimezone(timezone.utc).replace(tzinfo=None)
+    if expires_at <= now:
+        raise HTTPException(status_code=400, detail="expires_at must be in the future")
+    return expires_at
+
+
+# Rewraps each record key for each doctor and stages the grants + logs (caller commits)
+def _grant_keys(db: Session, patient: User, doctors: list, records: list, private_key_pem: str, expires_at=None):
+    try:
+        unwrapper = key_wrap_service.Unwrapper(key_wrap_service.load_private_key(private_key_pem))
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid private key: {str(e)}")
+
+    aes_keys = {}
+    for record in records:
+        try:
+            bundle = key_wrap_service.patient_bundle(record.encryption_key)
+        except Exception:
+            raise HTTPException(status_code=400, detail=f"Invalid record encryption structure (record {record.id})")
+        try:
+            aes_keys[record.id] = unwrapper.unwrap(bundle)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to unwrap AES key for record {record.id}: {str(e)}")
+
+    grants, logs = [], []
+    for doctor in doctors:
+        try:
+            wrapper = key_wrap_service.RecipientWrapper(doctor.public_key)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Failed to encrypt key for doctor {doctor.id}: {str(e)}")
+        for record in records:
+            grants.append({
+                "patient_id": patient.id,
+                "doctor_id": doctor.id,
+                "record_id": record.id,
+                **wrapper.wrap(aes_keys[record.id]),
+            })
+            logs.append(AccessLog(
+                patient_id=patient.id,
+                doctor_id=doctor.id,
+                record_id=record.id,
+                action=f"Granted access to {doctor.name} for {record.filename}"[:100],
+            ))
+    access_grant_service.upsert_grants(db, grants, expires_at)
+    db.add_all(logs)
+
+
+# Post-commit bookkeeping of a grant: drop cached authorization, schedule its expiry
+def _grant_committed(doctor_ids: list, expires_at):
+    authz_index.invalidate(*doctor_ids)
+    if expires_at is not None:
+        grant_expiry.schedule(expires_at)
+
+
+# Resolves the authenticated patient and the target doctor of a grant
+def _grant_parties(db: Session, payload: dict, doctor_id: int):
+    patient = db.query(User).filter(User.id == payload.get("user_id")).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    doctor = db.query(User).filter(User.id == doctor_id, User.role == RoleEnum.doctor).first()
+    if not doctor:
+        raise HTTPException(status_code=404, detail="Doctor not found")
+    return patient, doctor
+
+
 @router.post("/grant-key", dependencies=[Depends(require_role(RoleEnum.patient))])
 def grant_record_access_key(
     data: dict = Body(..., media_type="application/json"),
@@ -103,155 +193,133 @@ def grant_record_access_key(
       - Decrypt AES key using patient's private key
       - Re-encrypt it for the doctor's public key
       - Store it in access_control table
+    Optional "expires_in_hours" (e.g. 24 or 720) or "expires_at" make the
+    grant time-bounded; it is removed automatically when it expires.
     """
-    import base64, os, json
-    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-    from cryptography.hazmat.primitives.asymmetric import ec
-    from cryptography.hazmat.primitives import serialization, hashes
-    from datetime import datetime
-    from app.models.record import Record
-
-    print("\n================= /access/grant-key DEBUG START =================")
-    print("Incoming payload:", payload)
-    print("Incoming data body:", data)
-
     doctor_id = data.get("doctor_id")
     record_id = data.get("record_id")
     private_key_pem = data.get("private_key_pem")
-
-    # Validate
     if not all([doctor_id, record_id, private_key_pem]):
-        print("❌ Missing parameter(s):", {"doctor_id": doctor_id, "record_id": record_id, "private_key_pem": bool(private_key_pem)})
         raise HTTPException(status_code=400, detail="Missing required parameters")
+    expires_at = _grant_expiry(data)
 
-    # ✅ Identify patient
-    patient_id = payload.get("user_id")
-    patient_email = payload.get("sub")
-    print("🩺 Authenticated patient:", patient_email, "| ID:", patient_id)
-
-    patient = db.query(User).filter(User.id == patient_id).first()
-    if not patient:
-        print("❌ Patient not found for:", patient_email)
-        raise HTTPException(status_code=404, detail="Patient not found")
-
-    # ✅ Identify doctor
-    doctor = db.query(User).filter(User.id == doctor_id, User.role == RoleEnum.doctor).first()
-    print("👨‍⚕️ Doctor found:", doctor.name if doctor else None)
-    if not doctor:
-        raise HTTPException(status_code=404, detail="Doctor not found")
-
-    # ✅ Get the record
+    patient, doctor = _grant_parties(db, payload, doctor_id)
     record = db.query(Record).filter(Record.id == record_id, Record.patient_id == patient.id).first()
-    print("📄 Record found:", record.filename if record else None)
     if not record:
         raise HTTPException(status_code=404, detail="Record not found or not owned by this patient")
 
-    # ✅ Load patient's private key
-    try:
-        patient_priv = serialization.load_pem_private_key(private_key_pem.encode(), password=None)
-        print("🔑 Patient private key loaded successfully")
-    except Exception as e:
-        print("❌ Failed to load private key:", e)
-        raise HTTPException(status_code=400, detail=f"Invalid private key: {str(e)}")
-
-    # ✅ Parse record encryption bundle
-    try:
-        enc = record.encryption_key
-        if isinstance(enc, str):
-            enc = json.loads(enc)
-
-        bundle = enc.get("patient_bundle", enc)
-        wrapped_b64 = bundle["wrapped_b64"]
-        nonce_b64 = bundle["nonce_b64"]
-        eph_pub_spki_b64 = bundle["eph_pub_spki_b64"]
-        print("🧩 Record bundle parsed OK")
-    except Exception as e:
-        print("❌ Invalid record structure:", e)
-        raise HTTPException(status_code=400, detail="Invalid record encryption structure")
-
-    # ✅ Unwrap AES key using patient's private key
-    try:
-        eph_pub = serialization.load_der_public_key(base64.b64decode(eph_pub_spki_b64))
-        shared_secret = patient_priv.exchange(ec.ECDH(), eph_pub)
-        h = hashes.Hash(hashes.SHA256()); h.update(shared_secret); kek = h.finalize()
-
-        aes_key = AESGCM(kek).decrypt(
-            base64.b64decode(nonce_b64),
-            base64.b64decode(wrapped_b64),
-            None
-        )
-        print("✅ AES key unwrapped successfully")
-    except Exception as e:
-        print("❌ Failed to unwrap AES key:", e)
-        raise HTTPException(status_code=500, detail=f"Failed to unwrap AES key: {str(e)}")
-
-    # ✅ Re-encrypt AES key for doctor
-    try:
-        doctor_pub = serialization.load_pem_public_key(doctor.public_key.encode())
-        eph_priv_for_doc = ec.generate_private_key(ec.SECP256R1())
-        eph_pub_bytes_for_doc = eph_priv_for_doc.public_key().public_bytes(
-            encoding=serialization.Encoding.DER,
-            format=serialization.PublicFormat.SubjectPublicKeyInfo
-        )
-
-        shared_secret_doc = eph_priv_for_doc.exchange(ec.ECDH(), doctor_pub)
-        h2 = hashes.Hash(hashes.SHA256()); h2.update(shared_secret_doc); kek_doc = h2.finalize()
+    _grant_keys(db, patient, [doctor], [record], private_key_pem, expires_at)
+    db.commit()
+    _grant_committed([doctor.id], expires_at)
+    return {
+        "message": f"Access granted to Dr. {doctor.name} for record {record.filename}",
+        "doctor_id": doctor.id,
+        "record_id": record.id,
+        "expires_at": expires_at,
+    }
 
-        nonce = os.urandom(12)
-        wrapped_for_doctor = AESGCM(kek_doc).encrypt(nonce, aes_key, None)
-        print("✅ AES key rewrapped for doctor")
-    except Exception as e:
-        print("❌ Failed during rewrap:", e)
-        raise HTTPException(status_code=500, detail=f"Failed to encrypt key for doctor: {str(e)}")
 
-    # ✅ Store or update in access_control table
-    existing = db.query(AccessControl).filter(
-        AccessControl.patient_id == patient.id,
-        AccessControl.doctor_id == doctor.id,
-        AccessControl.record_id == record.id
-    ).first()
-
-    if existing:
-        print("ℹ️ Existing entry found — updating it.")
-        existing.encrypted_aes_key = base64.b64encode(wrapped_for_doctor).decode()
-        existing.nonce_b64 = base64.b64encode(nonce).decode()
-        existing.eph_pub_b64 = base64.b64encode(eph_pub_bytes_for_doc).decode()
-        existing.status = "approved"
-        existing.granted = True
-        existing.updated_at = datetime.utcnow()
+@router.post("/grant-key/batch", dependencies=[Depends(require_role(RoleEnum.patient))])
+def grant_record_access_keys_batch(
+    data: dict = Body(..., media_type="application/json"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    """
+    Patient grants a doctor access to many records at once.
+    Body: {"doctor_id", "private_key_pem", "record_ids": [..] or "all"}, plus
+    optional "expires_in_hours" / "expires_at" as for /access/grant-key.
+    All access rows and logs are written in one transaction; nothing is
+    granted if any record fails.
+    """
+    doctor_id = data.get("doctor_id")
+    record_ids = data.get("record_ids")
+    private_key_pem = data.get("private_key_pem")
+    if not all([doctor_id, record_ids, private_key_pem]):
+        raise HTTPException(status_code=400, detail="Missing required parameters")
+    if record_ids != "all" and not (isinstance(record_ids, list) and all(isinstance(i, int) for i in record_ids)):
+        raise HTTPException(status_code=400, detail="record_ids must be a list of ids or \"all\"")
+    expires_at = _grant_expiry(data)
+
+    patient, doctor = _grant_parties(db, payload, doctor_id)
+    query = db.query(Record).filter(Record.patient_id == patient.id)
+    if record_ids != "all":
+        record_ids = list(dict.fromkeys(record_ids))
+        if len(record_ids) > GRANT_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"At most {GRANT_BATCH_MAX} records per batch")
+        query = query.filter(Record.id.in_(record_ids))
+    records = query.order_by(Record.id).all()
+    if record_ids == "all":
+        if len(records) > GRANT_BATCH_MAX:
+            raise HTTPException(status_code=400, detail=f"At most {GRANT_BATCH_MAX} records per batch")
     else:
-        print("🆕 Creating new access entry")
-        access = AccessControl(
-            patient_id=patient.id,
-            doctor_id=doctor.id,
-            record_id=record.id,
-            encrypted_aes_key=base64.b64encode(wrapped_for_doctor).decode(),
-            nonce_b64=base64.b64encode(nonce).decode(),
-            eph_pub_b64=base64.b64encode(eph_pub_bytes_for_doc).decode(),
-            granted=True,
-            status="approved",
-            updated_at=datetime.utcnow(),
-        )
-        db.add(access)
+        missing = sorted(set(record_ids) - {r.id for r in records})
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Records not found or not owned by this patient: {missing}")
 
+    _grant_keys(db, patient, [doctor], records, private_key_pem, expires_at)
     db.commit()
-    log_entry = AccessLog(
-        patient_id=patient.id,
-        doctor_id=doctor.id,
-        record_id=record.id,
-        action=f"Granted access to {doctor.name} for {record.filename}",
+    _grant_committed([doctor.id], expires_at)
+    return {
+        "message": f"Access granted to Dr. {doctor.name} for {len(records)} records",
+        "doctor_id": doctor.id,
+        "record_ids": [r.id for r in records],
+        "expires_at": expires_at,
+    }
+
+
+@router.post("/grant-key/multi", dependencies=[Depends(require_role(RoleEnum.patient))])
+def grant_record_access_key_multi(
+    data: dict = Body(..., media_type="application/json"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    """
+    Patient shares one record with several doctors (e.g. a care team).
+    Body: {"record_id", "doctor_ids": [..], "private_key_pem"}, plus optional
+    "expires_in_hours" / "expires_at".
+    The record key is unwrapped once and wrapped for every doctor; all grants
+    are upserted in one statement.
+    """
+    record_id = data.get("record_id")
+    doctor_ids = data.get("doctor_ids")
+    private_key_pem = data.get("private_key_pem")
+    if not all([record_id, doctor_ids, private_key_pem]):
+        raise HTTPException(status_code=400, detail="Missing required parameters")
+    if not (isinstance(doctor_ids, list) and all(isinstance(i, int) for i in doctor_ids)):
+        raise HTTPException(status_code=400, detail="doctor_ids must be a list of ids")
+    doctor_ids = list(dict.fromkeys(doctor_ids))
+    if len(doctor_ids) > GRANT_BATCH_MAX:
+        raise HTTPException(status_code=400, detail=f"At most {GRANT_BATCH_MAX} doctors per grant")
+    expires_at = _grant_expiry(data)
+
+    patient = db.query(User).filter(User.id == payload.get("user_id")).first()
+    if not patient:
+        raise HTTPException(status_code=404, detail="Patient not found")
+    record = db.query(Record).filter(Record.id == record_id, Record.patient_id == patient.id).first()
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found or not owned by this patient")
+    doctors = (
+        db.query(User)
+        .filter(User.id.in_(doctor_ids), User.role == RoleEnum.doctor)
+        .order_by(User.id)
+        .all()
     )
-    db.add(log_entry)
-    db.commit()
-    print("✅ Database commit successful")
-    print("================= /access/grant-key DEBUG END =================\n")
+    missing = sorted(set(doctor_ids) - {d.id for d in doctors})
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Doctors not found: {missing}")
 
+    _grant_keys(db, patient, doctors, [record], private_key_pem, expires_at)
+    db.commit()
+    _grant_committed([d.id for d in doctors], expires_at)
     return {
-        "message": f"Access granted to Dr. {doctor.name} for record {record.filename}",
-        "doctor_id": doctor.id,
+        "message": f"Access granted to {len(doctors)} doctors for record {record.filename}",
         "record_id": record.id,
+        "doctor_ids": [d.id for d in doctors],
+        "expires_at": expires_at,
     }
 
+
 @router.post("/revoke")
 def revoke_access(
     doctor_id: int = Query(...),
@@ -272,21 +340,20 @@ def revoke_access(
     if user.role != RoleEnum.patient:
         raise HTTPException(status_code=403, detail="Only patients can revoke record access")
 
-    # Find the access control row
-    access = (
+    # Delete every matching row: tables without uq_access_control_grant may hold duplicates
+    deleted = (
         db.query(AccessControl)
         .filter(
             AccessControl.patient_id == user.id,
             AccessControl.doctor_id == doctor_id,
             AccessControl.record_id == record_id,
         )
-        .first()
+        .delete(synchronize_session=False)
     )
-    if not access:
+    if not deleted:
         raise HTTPException(status_code=404, detail="Access record not found")
-
-    db.delete(access)
     db.commit()
+    authz_index.invalidate(doctor_id)
     log_entry = AccessLog(
         patient_id=user.id,
         doctor_id=doctor_id,
@@ -306,193 +373,233 @@ def check_access(patient_id: int, db: Session = Depends(get_db), payload: dict =
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
-    access = db.query(AccessControl).filter(
-        AccessControl.patient_id == patient_id,
-        AccessControl.doctor_id == doctor.id,
-        AccessControl.status == "approved",
-        AccessControl.granted == True
-    ).first()
+    return {"access_granted": authz_index.has_patient_access(db, doctor.id, patient_id)}
+
 
-    return {"access_granted": bool(access)}
+# Keyset page of `query` on `column` (ascending, or newest first); returns (rows, has_more)
+def _page(query, column, after, limit: int, descending: bool = False):
+    if after:
+        query = query.filter(column < after if descending else column > after)
+    rows = query.order_by(column.desc() if descending else column).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+
+# Positions of a two-list ("granted" + "available") page; None marks a finished list
+def _section_positions(cursor: str):
+    if not cursor:
+        return {"granted": 0, "available": 0}
+    position = decode_cursor(cursor)
+    return {key: position.get(key) for key in ("granted", "available")}
+
+
+def _section_cursor(granted, granted_more, granted_key, available, available_more):
+    if not granted_more and not available_more:
+        return None
+    return encode_cursor(
+        granted=granted_key(granted[-1]) if granted_more else None,
+        available=available[-1].id if available_more else None,
+    )
 
 
 @router.get("/doctor/{doctor_id}", dependencies=[Depends(require_role(RoleEnum.doctor))])
-def get_doctor_access_list(doctor_id: int, db: Session = Depends(get_db)):
-    # Step 1: Fetch all patients (not doctors)
-    all_patients = db.query(User).filter(User.role == RoleEnum.patient).all()
-
-    # Step 2: Fetch all existing access records for this doctor
-    access_records = db.query(AccessControl).filter(AccessControl.doctor_id == doctor_id).all()
-
-    granted_patients = []
-    granted_patient_ids = set()
-    requested_patient_ids = set()
-
-    # Step 3: Classify patients based on access status
-    for record in access_records:
-        patient = db.query(User).filter(User.id == record.patient_id).first()
-        if not patient:
-            continue
-
-        if record.status == "approved" and record.granted:
-            granted_patients.append({
-                "id": patient.id,
-                "name": patient.name,
-                "email": patient.email,
-                "status": record.status,
-                "granted": True
-            })
-            granted_patient_ids.add(patient.id)
-        elif record.status == "pending":
-            requested_patient_ids.add(patient.id)
+def get_doctor_access_list(doctor_id: int, limit: int = 100, cursor: str = None, db: Session = Depends(get_db)):
+    """
+    Patients this doctor has approved access to ("granted", one entry per access
+    row) and patients with neither a grant nor a pending request ("available").
+    Both lists are paged together; pass `next_cursor` back as `cursor`.
+    `granted_count` is the total number of granted entries.
+    """
+    limit = clamp_limit(limit)
+    position = _section_positions(cursor)
 
-    # Step 4: Get available patients (not granted, not pending)
-    available_patients = [
-        {
-            "id": patient.id,
-            "name": patient.name,
-            "email": patient.email,
-            "status": "none",
-            "granted": False
-        }
-        for patient in all_patients
-        if patient.id not in granted_patient_ids and patient.id not in requested_patient_ids
-    ]
+    granted_query = (
+        db.query(AccessControl.id, AccessControl.status, User.id.label("patient_id"), User.name, User.email)
+        .join(User, User.id == AccessControl.patient_id)
+        .filter(
+            AccessControl.doctor_id == doctor_id,
+            AccessControl.status == "approved",
+            AccessControl.granted == True,
+        )
+    )
+    granted, granted_more = [], False
+    if position["granted"] is not None:
+        granted, granted_more = _page(granted_query, AccessControl.id, position["granted"], limit)
+
+    available, available_more = [], False
+    if position["available"] is not None:
+        engaged = db.query(AccessControl.id).filter(
+            AccessControl.doctor_id == doctor_id,
+            AccessControl.patient_id == User.id,
+            or_(
+                and_(AccessControl.status == "approved", AccessControl.granted == True),
+                AccessControl.status == "pending",
+            ),
+        )
+        available, available_more = _page(
+            db.query(User.id, User.name, User.email).filter(User.role == RoleEnum.patient, ~engaged.exists()),
+            User.id, position["available"], limit,
+        )
 
     return {
-        "granted": granted_patients,
-        "available": available_patients
+        "granted": [
+            {"id": r.patient_id, "name": r.name, "email": r.email, "status": r.status, "granted": True}
+            for r in granted
+        ],
+        "available": [
+            {"id": p.id, "name": p.name, "email": p.email, "status": "none", "granted": False}
+            for p in available
+        ],
+        "granted_count": granted_query.count(),
+        "next_cursor": _section_cursor(granted, granted_more, lambda r: r.id, available, available_more),
     }
-    
+
+
 @router.get("/patient/{patient_id}", dependencies=[Depends(require_role(RoleEnum.patient))])
-def get_patient_access_list(patient_id: int, db: Session = Depends(get_db)):
-    patient = db.query(User).filter(User.id == patient_id, User.role == RoleEnum.patient).first()
+def get_patient_access_list(patient_id: int, limit: int = 100, cursor: str = None, db: Session = Depends(get_db)):
+    """
+    Record grants this patient has given ("granted") and doctors without a
+    record grant or pending record request ("available"), paged like
+    /access/doctor/{doctor_id}.
+    """
+    patient = db.query(User.id).filter(User.id == patient_id, User.role == RoleEnum.patient).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
+    limit = clamp_limit(limit)
+    position = _section_positions(cursor)
 
-    all_doctors = db.query(User).filter(User.role == RoleEnum.doctor).all()
-    access_records = db.query(AccessControl).filter(AccessControl.patient_id == patient_id).all()
-
-    granted_doctors = []
-    granted_doctor_ids = set()
-    requested_doctor_ids = set()
-
-    for record in access_records:
-        doctor = db.query(User).filter(User.id == record.doctor_id).first()
-        file = db.query(Record).filter(Record.id == record.record_id).first()
-        if not doctor or not file:
-            continue
-
-        if record.status == "approved" and record.granted:
-            granted_doctors.append({
-                "id": doctor.id,
-                "record_id": record.record_id,
-                "file_name": file.filename,
-                "name": doctor.name,
-                "email": doctor.email,
-                "specialization": getattr(doctor, "specialization", None),
-                "grantedAt": record.updated_at or record.created_at
-            })
-            granted_doctor_ids.add(doctor.id)
-        elif record.status == "pending":
-            requested_doctor_ids.add(doctor.id)
-
-    available_doctors = [
-        {
-            "id": doctor.id,
-            "name": doctor.name,
-            "email": doctor.email,
-            "specialization": getattr(doctor, "specialization", None),
-        }
-        for doctor in all_doctors
-        if doctor.id not in granted_doctor_ids and doctor.id not in requested_doctor_ids
-    ]
+    granted_query = (
+        db.query(
+            AccessControl.id, AccessControl.record_id, AccessControl.granted_at, AccessControl.updated_at,
+            Record.filename, User.id.label("doctor_id"), User.name, User.email,
+        )
+        .join(User, User.id == AccessControl.doctor_id)
+        .join(Record, Record.id == AccessControl.record_id)
+        .filter(
+            AccessControl.patient_id == patient_id,
+            AccessControl.status == "approved",
+            AccessControl.granted == True,
+        )
+    )
+    granted, granted_more = [], False
+    if position["granted"] is not None:
+        granted, granted_more = _page(granted_query, AccessControl.id, position["granted"], limit)
+
+    available, available_more = [], False
+    if position["available"] is not None:
+        engaged = db.query(AccessControl.id).filter(
+            AccessControl.patient_id == patient_id,
+            AccessControl.doctor_id == User.id,
+            AccessControl.record_id.isnot(None),
+            or_(
+                and_(AccessControl.status == "approved", AccessControl.granted == True),
+                AccessControl.status == "pending",
+            ),
+        )
+        available, available_more = _page(
+            db.query(User.id, User.name, User.email)
+            .filter(User.role == RoleEnum.doctor, ~engaged.exists()),
+            User.id, position["available"], limit,
+        )
 
     return {
-        "granted": granted_doctors,
-        "available": available_doctors
+        "granted": [
+            {
+                "id": r.doctor_id,
+                "record_id": r.record_id,
+                "file_name": r.filename,
+                "name": r.name,
+                "email": r.email,
+                "specialization": None,
+                "grantedAt": r.updated_at or r.granted_at,
+            }
+            for r in granted
+        ],
+        "available": [
+            {"id": d.id, "name": d.name, "email": d.email, "specialization": None}
+            for d in available
+        ],
+        "granted_count": granted_query.count(),
+        "next_cursor": _section_cursor(granted, granted_more, lambda r: r.id, available, available_more),
     }
 
 @router.get("/authorized", dependencies=[Depends(require_role(RoleEnum.patient))])
-def get_authorized_doctors(db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
+def get_authorized_doctors(limit: int = 100, cursor: str = None, db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
     """
     Get count and list of doctors who currently have authorized access to this patient.
+    `count` is the total; the list is paged by `cursor`/`next_cursor`.
     """
     patient_email = payload.get("sub")
-    patient = db.query(User).filter(User.email == patient_email).first()
+    patient = db.query(User.id).filter(User.email == patient_email).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    # Fetch all approved + granted records for this patient
-    access_records = db.query(AccessControl).filter(
-        AccessControl.patient_id == patient.id,
-        AccessControl.status == "approved",
-        AccessControl.granted == True
-    ).all()
-
-    # Prepare list of authorized doctors
-    authorized_doctors = []
-    for record in access_records:
-        doctor = db.query(User).filter(User.id == record.doctor_id).first()
-        if doctor:
-            authorized_doctors.append({
-                "id": doctor.id,
-                "name": doctor.name,
-                "email": doctor.email,
-                "specialization": getattr(doctor, "specialization", None),
-                "grantedAt": record.updated_at or record.created_at
-            })
-
+    query = (
+        db.query(AccessControl.id, AccessControl.granted_at, AccessControl.updated_at,
+                 User.id.label("doctor_id"), User.name, User.email)
+        .join(User, User.id == AccessControl.doctor_id)
+        .filter(
+            AccessControl.patient_id == patient.id,
+            AccessControl.status == "approved",
+            AccessControl.granted == True,
+        )
+    )
+    rows, has_more = _page(query, AccessControl.id, decode_cursor(cursor).get("id") if cursor else None, clamp_limit(limit))
     return {
-        "count": len(authorized_doctors),
-        "authorized_doctors": authorized_doctors
+        "count": query.count(),
+        "authorized_doctors": [
+            {
+                "id": r.doctor_id,
+                "name": r.name,
+                "email": r.email,
+                "specialization": None,
+                "grantedAt": r.updated_at or r.granted_at,
+            }
+            for r in rows
+        ],
+        "next_cursor": encode_cursor(id=rows[-1].id) if has_more else None,
     }
 
 @router.get("/authorized-patients", dependencies=[Depends(require_role(RoleEnum.doctor))])
-def get_authorized_patients(db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
+def get_authorized_patients(limit: int = 100, cursor: str = None, db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
     """
     Get count and list of patients that the logged-in doctor currently has authorized access to.
+    `count` is the total; the list is paged by `cursor`/`next_cursor`.
     """
     doctor_email = payload.get("sub")
-    doctor = db.query(User).filter(User.email == doctor_email).first()
+    doctor = db.query(User.id).filter(User.email == doctor_email).first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
-    # Fetch all approved + granted records for this doctor
-    access_records = db.query(AccessControl).filter(
-        AccessControl.doctor_id == doctor.id,
-        AccessControl.status == "approved",
-        AccessControl.granted == True
-    ).all()
-
-    # Prepare list of authorized patients
-    authorized_patients = []
-    for record in access_records:
-        patient = db.query(User).filter(User.id == record.patient_id).first()
-        if patient:
-            authorized_patients.append({
-                "id": patient.id,
-                "name": patient.name,
-                "email": patient.email,
-                "grantedAt": record.updated_at or record.created_at
-            })
-
+    query = (
+        db.query(AccessControl.id, AccessControl.granted_at, AccessControl.updated_at,
+                 User.id.label("patient_id"), User.name, User.email)
+        .join(User, User.id == AccessControl.patient_id)
+        .filter(
+            AccessControl.doctor_id == doctor.id,
+            AccessControl.status == "approved",
+            AccessControl.granted == True,
+        )
+    )
+    rows, has_more = _page(query, AccessControl.id, decode_cursor(cursor).get("id") if cursor else None, clamp_limit(limit))
     return {
-        "count": len(authorized_patients),
-        "authorized_patients": authorized_patients
+        "count": query.count(),
+        "authorized_patients": [
+            {
+                "id": r.patient_id,
+                "name": r.name,
+                "email": r.email,
+                "grantedAt": r.updated_at or r.granted_at,
+            }
+            for r in rows
+        ],
+        "next_cursor": encode_cursor(id=rows[-1].id) if has_more else None,
     }
 
 @router.get("/doctor-key/{record_id}", dependencies=[Depends(require_role(RoleEnum.doctor))])
 def get_doctor_key(record_id: int, db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
     doctor_id = payload.get("user_id")
 
-    access = db.query(AccessControl).filter(
-        AccessControl.doctor_id == doctor_id,
-        AccessControl.record_id == record_id,
-        AccessControl.status == "approved",
-        AccessControl.granted == True
-    ).first()
-
+    access = authz_index.record_access(db, doctor_id, record_id)
     if not access:
         raise HTTPException(status_code=403, detail="Access not granted for this record")
 
@@ -502,64 +609,66 @@ def get_doctor_key(record_id: int, db: Session = Depends(get_db), payload: dict
         "eph_pub_b64": access.eph_pub_b64,
     }
 
+# One page of access logs, newest first, with the counterpart's name and the record's file name,
+# plus the total number of logs of the owner
+def _access_log_page(db: Session, owner_column, owner_id: int, counterpart_column, limit: int, cursor: str):
+    total = db.query(func.count(AccessLog.id)).filter(owner_column == owner_id).scalar()
+    counterpart = aliased(User)
+    rows, has_more = _page(
+        db.query(AccessLog.id, AccessLog.action, AccessLog.timestamp,
+                 counterpart.name.label("counterpart_name"), Record.filename)
+        .outerjoin(counterpart, counterpart.id == counterpart_column)
+        .outerjoin(Record, Record.id == AccessLog.record_id)
+        .filter(owner_column == owner_id),
+        AccessLog.id, decode_cursor(cursor).get("id") if cursor else None, clamp_limit(limit), descending=True,
+    )
+    return rows, total, (encode_cursor(id=rows[-1].id) if has_more else None)
+
+
 @router.get("/logs/patient/{patient_id}", dependencies=[Depends(require_role(RoleEnum.patient))])
-def get_patient_access_logs(patient_id: int, db: Session = Depends(get_db)):
+def get_patient_access_logs(patient_id: int, limit: int = 100, cursor: str = None, db: Session = Depends(get_db)):
     """
-    Returns all access activities involving this patient.
+    Returns access activities involving this patient, newest first, one page at a time.
     Includes both uploads by doctors and actions performed on their records.
+    `count` is the total number of logs; pass `next_cursor` back as `cursor` for the next page.
     """
-    patient = db.query(User).filter(User.id == patient_id, User.role == RoleEnum.patient).first()
+    patient = db.query(User.id).filter(User.id == patient_id, User.role == RoleEnum.patient).first()
     if not patient:
         raise HTTPException(status_code=404, detail="Patient not found")
 
-    logs = (
-        db.query(AccessLog)
-        .filter(AccessLog.patient_id == patient_id)
-        .order_by(AccessLog.timestamp.desc())
-        .all()
-    )
-
-    result = []
-    for log in logs:
-        doctor = db.query(User).filter(User.id == log.doctor_id).first()
-        record = db.query(Record).filter(Record.id == log.record_id).first()
-        result.append({
+    rows, total, next_cursor = _access_log_page(db, AccessLog.patient_id, patient_id, AccessLog.doctor_id, limit, cursor)
+    result = [
+        {
             "id": log.id,
-            "doctor_name": doctor.name if doctor else "Unknown",
-            "record_name": record.filename if record else "Unknown record",
+            "doctor_name": log.counterpart_name or "Unknown",
+            "record_name": log.filename or "Unknown record",
             "action": log.action,
             "timestamp": log.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-        })
-
-    return {"count": len(result), "logs": result}
+        }
+        for log in rows
+    ]
+    return {"count": total, "logs": result, "next_cursor": next_cursor}
 
 @router.get("/logs/doctor/{doctor_id}", dependencies=[Depends(require_role(RoleEnum.doctor))])
-def get_doctor_access_logs(doctor_id: int, db: Session = Depends(get_db)):
+def get_doctor_access_logs(doctor_id: int, limit: int = 100, cursor: str = None, db: Session = Depends(get_db)):
     """
-    Returns all access activities performed by this doctor.
+    Returns access activities performed by this doctor, newest first, one page at a time.
     Includes uploads, views, and decryptions on patient records.
+    `count` is the total number of logs; pass `next_cursor` back as `cursor` for the next page.
     """
-    doctor = db.query(User).filter(User.id == doctor_id, User.role == RoleEnum.doctor).first()
+    doctor = db.query(User.id).filter(User.id == doctor_id, User.role == RoleEnum.doctor).first()
     if not doctor:
         raise HTTPException(status_code=404, detail="Doctor not found")
 
-    logs = (
-        db.query(AccessLog)
-        .filter(AccessLog.doctor_id == doctor_id)
-        .order_by(AccessLog.timestamp.desc())
-        .all()
-    )
-
-    result = []
-    for log in logs:
-        patient = db.query(User).filter(User.id == log.patient_id).first()
-        record = db.query(Record).filter(Record.id == log.record_id).first()
-        result.append({
+    rows, total, next_cursor = _access_log_page(db, AccessLog.doctor_id, doctor_id, AccessLog.patient_id, limit, cursor)
+    result = [
+        {
             "id": log.id,
-            "patient_name": patient.name if patient else "Unknown",
-            "record_name": record.filename if record else "Unknown record",
+            "patient_name": log.counterpart_name or "Unknown",
+            "record_name": log.filename or "Unknown record",
             "action": log.action,
             "timestamp": log.timestamp.strftime("%Y-%m-%d %H:%M:%S"),
-        })
-
-    return {"count": len(result), "logs": result}
\ No newline at end of file
+        }
+        for log in rows
+    ]
+    return {"count": total, "logs": result, "next_cursor": next_cursor}
@@ -6,6 +6,12 @@ from app.models.blockchain import Block
 from app.models.access_log import AccessLog
 from app.models.record import Record
 from app.services.token_service import require_role
+from app.services import ipfs_service, ciphertext_cache
+from app.services.block_append_service import appender as block_appender
+from app.services.integrity_auditor_service import auditor as integrity_auditor
+from app.services.storage_service import store as blob_store
+from app.services.authz_index_service import index as authz_index
+from app.services.grant_expiry_service import scheduler as grant_expiry
 from sqlalchemy import desc
 from io import StringIO
 import csv
@@ -27,6 +33,16 @@ def get_admin_stats(db: Session = Depends(get_db)):
         "logs": total_logs,
     }
 
+# IPFS client request counters and connection pool usage
+@router.get("/ipfs/stats", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_ipfs_stats():
+    return {"storage_backend": blob_store.name, **ipfs_service.pool_stats()}
+
+# Ciphertext cache hit/miss/eviction counters for sizing the cache
+@router.get("/cache/stats", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_cache_stats():
+    return ciphertext_cache.cache.stats()
+
 # Get all users (doctors + patients)
 @router.get("/users", dependencies=[Depends(require_role(RoleEnum.admin))])
 def get_all_users(db: Session = Depends(get_db)):
@@ -64,6 +80,7 @@ def delete_user(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     db.delete(user)
     db.commit()
+    authz_index.invalidate(user.id)
     return {"message": "User deleted successfully"}
 
 
@@ -138,3 +155,37 @@ def download_audit_logs(db: Session = Depends(get_db)):
     }
 
     return StreamingResponse(output, media_type="text/csv", headers=headers)
+
+
+# Group-commit block writer: appends, batches and queue depth
+@router.get("/ledger/append-stats", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_block_append_stats():
+    return block_appender.stats()
+
+
+# Background integrity auditor: last findings and run timings
+@router.get("/integrity/status", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_integrity_status():
+    return integrity_auditor.status()
+
+
+@router.post("/integrity/run", dependencies=[Depends(require_role(RoleEnum.admin))])
+def trigger_integrity_audit():
+    if integrity_auditor.is_running():
+        raise HTTPException(status_code=409, detail="An integrity audit is already running")
+    if integrity_auditor.trigger():
+        return {"message": "Integrity audit scheduled"}
+    # no background auditor in this worker (INTEGRITY_AUDIT_INTERVAL=0): run it here
+    return {"message": "Integrity audit completed", "result": integrity_auditor.run_once()}
+
+
+# Per-worker doctor authorization index: hit rate, entry ages and TTL (staleness window)
+@router.get("/authz/stats", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_authz_index_stats():
+    return authz_index.stats()
+
+
+# Time-bounded grant expiry: expired so far, pending heap size, next expiry
+@router.get("/grants/expiry-stats", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_grant_expiry_stats():
+    return grant_expiry.stats()
@@ -1,30 +1,39 @@
 # app/routes/blockchain.py
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from sqlalchemy.orm import Session, aliased
 from sqlalchemy import text
 from app.database.connection import get_db
-from app.models.blockchain import Block
-from app.models.user import RoleEnum
-from app.services.blockchain_service import get_all_blocks, verify_chain, add_block as service_add_block
+from app.models.blockchain import Block, MerkleAnchor
+from app.models.user import User, RoleEnum
+from app.services.blockchain_service import verify_chain as verify_chain_service, migrate_legacy_hashes, record_history
 from app.services.token_service import require_role
+from app.services import chain_audit_service, merkle_service
+from app.models.record import Record
+from app.services.authz_index_service import index as authz_index
 from app.services.auth_helpers import get_token_payload
+from app.utils.pagination import encode_cursor, decode_cursor, clamp_limit
 from pydantic import BaseModel
 from cryptography.hazmat.primitives.asymmetric import ec
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.kdf.hkdf import HKDF
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
-import base64, os, json, hashlib
+import base64, os, json, hashlib, threading
 from datetime import datetime
 
 router = APIRouter(prefix="/blockchain", tags=["Blockchain"])
 
-@router.get("/blockchain/verify")
-def verify_chain(db: Session = Depends(get_db)):
-    blocks = db.query(Block).order_by(Block.id).all()
-    for i in range(1, len(blocks)):
-        if blocks[i].previous_hash != blocks[i-1].hash_value:
-            return {"valid": False, "error_at": blocks[i].id}
-    return {"valid": True, "message": "Blockchain is valid and untampered"}
+_parallel_verify = threading.Lock()  # /verify/chains starts a process pool; one at a time
+
+@router.get("/blockchain/verify", dependencies=[Depends(require_role(RoleEnum.admin))])
+def verify_chain(full: bool = False, db: Session = Depends(get_db)):
+    """
+    Verifies chain linkage from the last checkpoint of each patient chain.
+    Pass ?full=true to re-verify every chain from genesis.
+    """
+    result = verify_chain_service(db, full=full)
+    if not result["valid"]:
+        return {**result, "error_at": result["broken"][0]["block_id"]}
+    return {**result, "message": "Blockchain is valid and untampered"}
 
 
 @router.get("/doctor/{doctor_id}")
@@ -86,51 +95,174 @@ def get_patient_blockchain(patient_id: int, db: Session = Depends(get_db)):
         })
     return response
 
+def _ledger_query(db: Session):
+    """Blocks with doctor and patient names resolved in the same query."""
+    doctor = aliased(User)
+    patient = aliased(User)
+    return (
+        db.query(
+            Block.id, Block.doctor_id, Block.patient_id, Block.record_id, Block.ipfs_cid,
+            Block.data_hash, Block.previous_hash, Block.hash_value, Block.timestamp,
+            doctor.name.label("doctor_name"), patient.name.label("patient_name"),
+        )
+        .outerjoin(doctor, doctor.id == Block.doctor_id)
+        .outerjoin(patient, patient.id == Block.patient_id)
+    )
+
+
+def _ledger_entry(row) -> dict:
+    return {
+        "id": row.id,
+        "doctor_id": row.doctor_id,
+        "doctor_name": row.doctor_name or "Unknown",
+        "patient_id": row.patient_id,
+        "patient_name": row.patient_name or "Unknown",
+        "record_id": row.record_id,
+        "ipfs_cid": row.ipfs_cid,
+        "data_hash": row.data_hash,
+        "previous_hash": row.previous_hash,
+        "hash": row.hash_value,  # renamed for frontend consistency
+        "action": "Record Uploaded",  # consistent action label
+        "timestamp": row.timestamp.isoformat() if row.timestamp else None,
+    }
+
+
 @router.get("/ledger")
 def get_ledger(db: Session = Depends(get_db)):
     """
     Returns a detailed blockchain ledger with doctor/patient names.
+    Unpaginated; large ledgers should use /blockchain/ledger/page.
     """
-    from app.models.user import User  # import locally to avoid circular dependency
-
-    blocks = db.query(Block).order_by(Block.id.desc()).all()
-    ledger = []
-
-    for b in blocks:
-        # Fetch related doctor & patient names (if exist)
-        doctor = db.query(User).filter(User.id == b.doctor_id).first()
-        patient = db.query(User).filter(User.id == b.patient_id).first()
-
-        ledger.append({
-            "id": b.id,
-            "doctor_id": b.doctor_id,
-            "doctor_name": doctor.name if doctor else "Unknown",
-            "patient_id": b.patient_id,
-            "patient_name": patient.name if patient else "Unknown",
-            "record_id": b.record_id,
-            "ipfs_cid": b.ipfs_cid,
-            "data_hash": b.data_hash,
-            "previous_hash": b.previous_hash,
-            "hash": b.hash_value,  # renamed for frontend consistency
-            "action": "Record Uploaded",  # consistent action label
-            "timestamp": b.timestamp.isoformat() if b.timestamp else None,
-        })
+    rows = _ledger_query(db).order_by(Block.id.desc()).all()
+    return {"blocks": [_ledger_entry(row) for row in rows]}
+
+
+@router.get("/ledger/page", dependencies=[Depends(require_role(RoleEnum.admin))])
+def get_ledger_page(
+    limit: int = 100,
+    cursor: str = None,
+    doctor_id: int = None,
+    patient_id: int = None,
+    record_id: int = None,
+    since: datetime = None,
+    until: datetime = None,
+    db: Session = Depends(get_db),
+):
+    """
+    One page of the ledger, newest first. Pass the returned `next_cursor` back
+    as `cursor` to get the following page; it is null on the last page.
+    """
+    limit = clamp_limit(limit)
+    query = _ledger_query(db)
+    if cursor:
+        query = query.filter(Block.id < decode_cursor(cursor).get("id", 0))
+    if doctor_id is not None:
+        query = query.filter(Block.doctor_id == doctor_id)
+    if patient_id is not None:
+        query = query.filter(Block.patient_id == patient_id)
+    if record_id is not None:
+        query = query.filter(Block.record_id == record_id)
+    if since is not None:
+        query = query.filter(Block.timestamp >= since)
+    if until is not None:
+        query = query.filter(Block.timestamp < until)
 
-    return {"blocks": ledger}
+    rows = query.order_by(Block.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "blocks": [_ledger_entry(row) for row in rows],
+        "next_cursor": encode_cursor(id=rows[-1].id) if has_more else None,
+    }
 
 @router.get("/verify", dependencies=[Depends(require_role(RoleEnum.admin))])
 def verify_blockchain(db: Session = Depends(get_db)):
-    blocks = db.query(Block).order_by(Block.id).all()
-    previous_hash = "0"
-    for block in blocks:
-        expected_hash = Block.generate_hash(
-            block.doctor_id,
-            block.patient_id,
-            block.ipfs_cid,
-            block.previous_hash,
-            block.data_hash,
-        )
-        if block.previous_hash != previous_hash or block.hash_value != expected_hash:
-            return {"valid": False}
-        previous_hash = block.hash_value
-    return {"valid": True}
\ No newline at end of file
+    """Full re-verification: linkage of every chain, and recomputed hashes for versioned blocks."""
+    result = verify_chain_service(db, full=True)
+    legacy = db.query(Block).filter(Block.hash_version.is_(None)).count()
+    return {"valid": result["valid"], "broken": result["broken"], "legacy_blocks": legacy}
+
+
+@router.post("/migrate-hashes", dependencies=[Depends(require_role(RoleEnum.admin))])
+def migrate_block_hashes(db: Session = Depends(get_db)):
+    """Rehashes chains with legacy blocks using the reproducible v2 encoding."""
+    return migrate_legacy_hashes(db)
+
+
+@router.get("/verify/chains", dependencies=[Depends(require_role(RoleEnum.admin))])
+def verify_chains_parallel(workers: int = Query(None, ge=1, le=os.cpu_count() or 1)):
+    """
+    Checks the linkage of every patient chain across a process pool, one result per chain.
+    `workers` defaults to AUDIT_WORKERS and is capped at the host's CPU count;
+    one run at a time per process.
+    """
+    if not _parallel_verify.acquire(blocking=False):
+        raise HTTPException(status_code=409, detail="A parallel verification is already running")
+    try:
+        return chain_audit_service.verify_parallel(workers)
+    finally:
+        _parallel_verify.release()
+
+
+@router.get("/record/{record_id}/history")
+def get_record_history(record_id: int, db: Session = Depends(get_db), payload: dict = Depends(get_token_payload)):
+    """Ordered upload/access block history of a record (admin, its patient, or its doctors)."""
+    record = db.get(Record, record_id)
+    if not record:
+        raise HTTPException(status_code=404, detail="Record not found")
+
+    user_id, role = payload.get("user_id"), payload.get("role")
+    allowed = role == RoleEnum.admin.value or user_id in (record.patient_id, record.doctor_id)
+    if not allowed and role == RoleEnum.doctor.value:
+        allowed = authz_index.record_access_id(db, user_id, record_id) is not None
+    if not allowed:
+        raise HTTPException(status_code=403, detail="Not allowed to view this record's history")
+
+    return {
+        "record_id": record.id,
+        "patient_id": record.patient_id,
+        "upload_block_id": record.block_id,
+        "history": record_history(db, record.id, record.block_id),
+    }
+
+
+def _proof_response(db: Session, block: Block):
+    proof = merkle_service.proof_for_block(db, block)
+    if proof is None:
+        raise HTTPException(status_code=404, detail="Block has not been anchored yet")
+    return proof
+
+
+@router.get("/proof/block/{block_id}")
+def get_block_proof(block_id: int, db: Session = Depends(get_db)):
+    """Merkle inclusion proof of a block's hash in its anchored batch root."""
+    block = db.get(Block, block_id)
+    if not block:
+        raise HTTPException(status_code=404, detail="Block not found")
+    return _proof_response(db, block)
+
+
+@router.get("/proof/record/{record_id}")
+def get_record_proof(record_id: int, db: Session = Depends(get_db)):
+    """Merkle inclusion proof for the upload block of a record."""
+    record = db.get(Record, record_id)
+    if not record or not record.block_id:
+        raise HTTPException(status_code=404, detail="Record has no block")
+    return _proof_response(db, db.get(Block, record.block_id))
+
+
+@router.get("/anchors")
+def list_anchors(limit: int = 50, db: Session = Depends(get_db)):
+    """Most recent Merkle roots."""
+    anchors = db.query(MerkleAnchor).order_by(MerkleAnchor.id.desc()).limit(min(limit, 500)).all()
+    return [
+        {
+            "id": a.id,
+            "root_hash": a.root_hash,
+            "leaf_count": a.leaf_count,
+            "first_block_id": a.first_block_id,
+            "last_block_id": a.last_block_id,
+            "created_at": a.created_at.isoformat() if a.created_at else None,
+        }
+        for a in anchors
+    ]
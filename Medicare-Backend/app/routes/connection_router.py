@@ -7,6 +7,7 @@ from app.models.connection import Connection, ConnectionStatus
 from app.models.user import User, RoleEnum
 from app.services.token_service import require_role
 from app.services.auth_helpers import get_token_payload
+from app.services.authz_index_service import index as authz_index
 from pydantic import BaseModel
 from datetime import datetime
 
@@ -130,6 +131,7 @@ def respond_to_request(connection_id: str, action: str, db: Session = Depends(ge
             )
             db.add(new_access)
         db.commit()
+    authz_index.invalidate(doctor.id)
 
     return {"message": f"Request {connection.status.value}", "status": connection.status.value}
 
@@ -239,20 +241,20 @@ def revoke_connection(
         Connection.patient_id == patient_id
     ).first()
 
-    # Find access control entry
+    # Find access control entries
     access = db.query(AccessControl).filter(
         AccessControl.doctor_id == doctor.id,
         AccessControl.patient_id == patient_id
-    ).first()
+    )
 
-    if not connection and not access:
+    if not connection and not access.first():
         raise HTTPException(status_code=404, detail="No active connection or access record found")
 
     if connection:
         db.delete(connection)
-    if access:
-        db.delete(access)
+    access.delete(synchronize_session=False)
 
     db.commit()
+    authz_index.invalidate(doctor.id)
 
     return {"message": "Connection and access revoked successfully"}
@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Body
-from sqlalchemy import text
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, Body, Request, Header
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 from datetime import datetime
-import base64, json, requests, io, mimetypes, os, hashlib  # <-- added hashlib
+from typing import List
+from concurrent.futures import ThreadPoolExecutor
+import base64, json, mimetypes, os, io, itertools, zipfile, hashlib, threading, collections  # <-- added hashlib
 from fastapi.responses import StreamingResponse
 from app.database.connection import get_db
 from app.services.auth_helpers import get_token_payload
@@ -10,12 +12,24 @@ from app.models.user import User
 from app.models.record import Record
 from app.models.blockchain import Block
 from app.models.access_log import AccessLog
-from app.services.ipfs_service import add_bytes
+from app.utils.logger import logger
+from app.services import ipfs_service, ciphertext_cache, ingest_service
+from app.services.storage_service import store as blob_store
+from app.services.blockchain_service import record_data_hash, append_blocks
+from app.services.block_append_service import appender as block_appender
+from app.services.authz_index_service import index as authz_index
+from app.services import segment_crypto_service as segcrypto
 from cryptography.hazmat.primitives import serialization, hashes
 from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from cryptography.hazmat.primitives.asymmetric import ec
 
 router = APIRouter(prefix="/record", tags=["Record"])
+BATCH_MAX_FILES = int(os.getenv("BATCH_MAX_FILES", 50))
+BATCH_PIN_CONCURRENCY = int(os.getenv("BATCH_PIN_CONCURRENCY", 4))
+EXPORT_FANOUT = int(os.getenv("EXPORT_FANOUT", 4))
+EXPORT_CHUNK_SIZE = 256 * 1024
+EXPORT_PREFETCH_BYTES = int(os.getenv("EXPORT_PREFETCH_BYTES", 64 * 1024 * 1024))
+DIGEST_CHUNK_SIZE = 1024 * 1024
 
 
 # Decodes base64 string safely
@@ -23,6 +37,14 @@ def b64decode_str(data_b64: str) -> bytes:
     return base64.b64decode(data_b64.encode())
 
 
+# Unwraps a record AES key: ECDH with the ephemeral key, SHA-256 KEK, AES-GCM unwrap
+def _unwrap_aes_key(private_key, eph_pub_spki_b64: str, nonce_b64: str, wrapped_b64: str) -> bytes:
+    eph_pub = serialization.load_der_public_key(base64.b64decode(eph_pub_spki_b64))
+    shared = private_key.exchange(ec.ECDH(), eph_pub)
+    h = hashes.Hash(hashes.SHA256()); h.update(shared); kek = h.finalize()
+    return AESGCM(kek).decrypt(base64.b64decode(nonce_b64), base64.b64decode(wrapped_b64), None)
+
+
 # Extracts encryption bundle and file nonce for patients
 def _pick_bundle_for_patient(enc: dict):
     if "wrapped_b64" in enc and "nonce_b64" in enc and "eph_pub_spki_b64" in enc:
@@ -72,18 +94,139 @@ def _pick_bundle_for_doctor(enc: dict):
     return None, None
 
 
-# Uploads encrypted records to IPFS and stores metadata + a blockchain block
-@router.post("/upload")
-def upload_record(
-    file: UploadFile = File(...),
-    description: str = Form(None),
-    patient_id: int = Form(None),
-    file_nonce_b64: str = Form(None),
-    wrapped_key: str = Form(None),
-    raw_aes_key_b64: str = Form(None),
-    db: Session = Depends(get_db),
-    payload: dict = Depends(get_token_payload)
-):
+# Records uploaded asynchronously cannot be read until they are pinned (NULL status predates async uploads)
+def _require_ready(record: Record):
+    if record.status not in (None, "ready"):
+        raise HTTPException(status_code=409, detail=f"Record is {record.status}")
+
+
+# Parses a single "bytes=start-end" Range header against the plaintext size
+def _parse_range(range_header: str, size: int):
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].strip()
+    if "," in spec:
+        return None  # multi-range requests get the whole record
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+        else:
+            start = max(size - int(end_s), 0)  # suffix range: last N bytes
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, end
+
+
+# Yields the decrypted record; segmented (v2.0) records are decrypted as they stream in,
+# and a byte range only fetches and decrypts the segments that cover it
+def _plaintext_stream(record: Record, enc: dict, aes_key: bytes, file_nonce_b64: str, byte_range=None):
+    if not segcrypto.is_segmented(enc):
+        ciphertext = ciphertext_cache.read(record.ipfs_cid)
+        try:
+            plaintext = AESGCM(aes_key).decrypt(base64.b64decode(file_nonce_b64), ciphertext, None)
+        finally:
+            if hasattr(ciphertext, "close"):
+                ciphertext.close()
+        return iter([plaintext])
+
+    segment_size = int(enc["segment_size"])
+    ct_segment = segment_size + segcrypto.TAG_LEN
+    first_index, final = 0, True
+    ct_start, ct_length = 0, None
+    skip, limit = 0, None
+
+    if byte_range:
+        start, end = byte_range
+        ct_size = int(enc["ciphertext_size"])
+        segment_count = max(1, -(-segcrypto.plaintext_size(ct_size, segment_size) // segment_size))
+        first_index, last_index = start // segment_size, end // segment_size
+        final = last_index == segment_count - 1
+        ct_start = first_index * ct_segment
+        ct_length = min((last_index + 1) * ct_segment, ct_size) - ct_start
+        skip, limit = start - first_index * segment_size, end - start + 1
+
+    chunks = ciphertext_cache.stream(record.ipfs_cid, ct_start, ct_length, chunk_size=ct_segment)
+    segments = segcrypto.iter_decrypt(
+        aes_key,
+        base64.b64decode(file_nonce_b64),
+        segment_size,
+        chunks,
+        first_index=first_index,
+        final=final,
+    )
+    plaintext = ipfs_service.slice_chunks(segments, skip, limit)
+
+    # decrypt the first segment up front so a bad key fails before any bytes are sent
+    try:
+        first = next(plaintext)
+    except StopIteration:
+        first = b""
+    except Exception:
+        chunks.close()
+        raise
+
+    def stream():
+        try:
+            yield first
+            yield from plaintext
+        finally:
+            chunks.close()
+
+    return stream()
+
+
+def _supports_ranges(enc: dict) -> bool:
+    return segcrypto.is_segmented(enc) and "ciphertext_size" in enc
+
+
+# Plaintext size and the (start, end) byte range a Range header asks for, or None for the whole record
+def _requested_range(enc: dict, range_header: str):
+    size = segcrypto.plaintext_size(int(enc["ciphertext_size"]), int(enc["segment_size"]))
+    return size, (_parse_range(range_header, size) if size else None)
+
+
+# Builds the download response, honoring Range headers for segmented records
+def _decrypted_response(record: Record, enc: dict, aes_key: bytes, file_nonce_b64: str, range_header: str = None):
+    mime_type, _ = mimetypes.guess_type(record.filename)
+    headers = {"Content-Disposition": f'attachment; filename="{record.filename}"'}
+
+    if not _supports_ranges(enc):
+        plaintext = _plaintext_stream(record, enc, aes_key, file_nonce_b64)
+        return StreamingResponse(plaintext, media_type=mime_type or "application/octet-stream", headers=headers), None
+
+    size, byte_range = _requested_range(enc, range_header)
+    plaintext = _plaintext_stream(record, enc, aes_key, file_nonce_b64, byte_range)
+
+    headers["Accept-Ranges"] = "bytes"
+    if byte_range:
+        start, end = byte_range
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        headers["Content-Length"] = str(end - start + 1)
+        status_code = 206
+    else:
+        headers["Content-Length"] = str(size)
+        status_code = 200
+
+    return StreamingResponse(
+        plaintext,
+        status_code=status_code,
+        media_type=mime_type or "application/octet-stream",
+        headers=headers,
+    ), byte_range
+
+
+# Resolves the uploader and the patient the record belongs to
+def _resolve_upload_parties(db: Session, payload: dict, patient_id: int):
     uploader_id = payload.get("user_id")
     if not uploader_id:
         raise HTTPException(status_code=401, detail="Unauthorized")
@@ -100,21 +243,87 @@ def upload_record(
             raise HTTPException(status_code=404, detail="Target patient not found")
     else:
         patient = uploader
+    return uploader, patient
+
 
+# Validates the encryption fields and reads through the spooled upload once (in chunks)
+# to measure it and compute its SHA-256 digest without loading it into memory
+def _check_upload(file: UploadFile, file_nonce_b64: str, wrapped_key: str, segment_size: int):
     if not wrapped_key or not file_nonce_b64:
         raise HTTPException(status_code=400, detail="Missing encryption data")
 
-    file_bytes = file.file.read()
-    if not file_bytes:
+    if segment_size:
+        try:
+            segcrypto.validate_segment_params(b64decode_str(file_nonce_b64), segment_size)
+        except Exception as e:
+            raise HTTPException(status_code=400, detail=f"Invalid segmented encryption data: {str(e)}")
+
+    digest = hashlib.sha256()
+    file_size = 0
+    file.file.seek(0)
+    while True:
+        chunk = file.file.read(DIGEST_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        file_size += len(chunk)
+    file.file.seek(0)
+    if not file_size:
         raise HTTPException(status_code=400, detail="Empty file")
+    return file_size, digest.hexdigest()
+
+
+# Finds an earlier upload this request repeats: same idempotency key from the same
+# uploader, or byte-identical ciphertext already stored for the same patient
+def _find_duplicate_upload(db: Session, uploader: User, patient: User, idempotency_key: str, digest: str):
+    if idempotency_key:
+        record = db.query(Record).filter(Record.idempotency_key == f"{uploader.id}:{idempotency_key}").first()
+        if record:
+            return record
+    return (
+        db.query(Record)
+        .filter(
+            Record.ciphertext_sha256 == digest,
+            Record.patient_id == patient.id,
+            Record.status != "failed",
+        )
+        .first()
+    )
 
-    try:
-        ipfs = add_bytes(file.filename, file_bytes)
-        cid = ipfs["cid"]
-        ipfs_uri = f"ipfs://{cid}"
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"IPFS upload failed: {str(e)}")
 
+def _mark_failed(db: Session, record_ids: list):
+    """Marks records whose upload block could not be appended (unless it landed after all)."""
+    db.query(Record).filter(Record.id.in_(record_ids), Record.status == "pending").update(
+        {"status": "failed"}, synchronize_session=False
+    )
+    db.commit()
+
+
+def _duplicate_upload_response(record: Record) -> dict:
+    return {
+        "message": "Record already uploaded",
+        "record_id": record.id,
+        "ipfs_cid": record.ipfs_cid,
+        "ipfs_uri": f"ipfs://{record.ipfs_cid}" if record.ipfs_cid else None,
+        "patient_id": record.patient_id,
+        "block_id": record.block_id,
+        "bundles": list(json.loads(record.encryption_key).keys()),
+        "status": record.status or "ready",
+        "duplicate": True,
+    }
+
+
+# Answers an upload whose insert hit a unique constraint; the conflicting row may be
+# gone again (its transaction rolled back) or not be an upload this request repeats
+def _conflicting_upload_response(db: Session, uploader: User, patient: User, idempotency_key: str, digest: str) -> dict:
+    duplicate = _find_duplicate_upload(db, uploader, patient, idempotency_key, digest)
+    if not duplicate:
+        raise HTTPException(status_code=409, detail="Upload conflicts with a concurrent request, retry later")
+    return _duplicate_upload_response(duplicate)
+
+
+# Builds the stored encryption bundle (patient bundle, plus a doctor bundle for doctor uploads)
+def _build_encryption_bundle(uploader: User, file_nonce_b64: str, wrapped_key: str, raw_aes_key_b64: str, segment_size: int, file_size: int) -> dict:
     try:
         wrap_data = json.loads(wrapped_key)
     except Exception:
@@ -130,11 +339,17 @@ def upload_record(
         "scheme": "ECIES(P-256)+AES-GCM",
         "version": "1.1",
     }
+    if segment_size:
+        encryption_bundle.update({
+            "scheme": segcrypto.SEGMENTED_SCHEME,
+            "version": segcrypto.SEGMENTED_VERSION,
+            "segment_size": segment_size,
+            "ciphertext_size": file_size,
+        })
 
     if uploader.role.value == "doctor":
         try:
             if not raw_aes_key_b64:
-                wrap_data = json.loads(wrapped_key)
                 raw_aes_key_b64 = wrap_data.get("wrappedB64")
 
             try:
@@ -168,6 +383,38 @@ def upload_record(
             # proceed with patient bundle only
             pass
 
+    return encryption_bundle
+
+
+# Uploads encrypted records to IPFS and stores metadata + a blockchain block
+@router.post("/upload")
+def upload_record(
+    file: UploadFile = File(...),
+    description: str = Form(None),
+    patient_id: int = Form(None),
+    file_nonce_b64: str = Form(None),
+    wrapped_key: str = Form(None),
+    raw_aes_key_b64: str = Form(None),
+    segment_size: int = Form(None),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    uploader, patient = _resolve_upload_parties(db, payload, patient_id)
+    file_size, digest = _check_upload(file, file_nonce_b64, wrapped_key, segment_size)
+
+    duplicate = _find_duplicate_upload(db, uploader, patient, idempotency_key, digest)
+    if duplicate:
+        return _duplicate_upload_response(duplicate)
+
+    encryption_bundle = _build_encryption_bundle(uploader, file_nonce_b64, wrapped_key, raw_aes_key_b64, segment_size, file_size)
+
+    try:
+        cid = blob_store.put_stream(file.filename, file.file)
+        ipfs_uri = f"ipfs://{cid}"
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Storage upload failed: {str(e)}")
+
     new_record = Record(
         patient_id=patient.id,
         doctor_id=uploader.id if uploader.role.value == "doctor" else None,
@@ -175,54 +422,242 @@ def upload_record(
         ipfs_cid=cid,
         description=description,
         encryption_key=json.dumps(encryption_bundle),
+        status="pending",
+        ciphertext_sha256=digest,
+        idempotency_key=f"{uploader.id}:{idempotency_key}" if idempotency_key else None,
     )
     db.add(new_record)
-    db.flush()  # <-- ensure new_record.id is available
-
-    # chain previous block per patient for clearer audit trail
-    previous_block = (
-        db.query(Block)
-        .filter(Block.patient_id == patient.id)
-        .order_by(Block.id.desc())
-        .first()
-    )
-    previous_hash = previous_block.hash_value if previous_block else "0"
-
-    # data hash binds important fields
-    data_string = f"{cid}-{new_record.id}-{uploader.id}-{patient.id}"
-    data_hash = hashlib.sha256(data_string.encode()).hexdigest()
-
-    block = Block(
-        doctor_id=uploader.id if uploader.role.value == "doctor" else 0,
-        patient_id=patient.id,
-        record_id=new_record.id,
-        ipfs_cid=cid,
-        data_hash=data_hash,
-        previous_hash=previous_hash,
-        hash_value=Block.generate_hash(
-            uploader.id,
-            patient.id,
-            cid,
-            previous_hash,
-            data_hash
-        ),
-    )
-    db.add(block)
-    db.flush()
-    new_record.block_id = block.id
-    db.commit()
+    try:
+        db.flush()  # <-- ensure new_record.id is available
+        record_id = new_record.id
+        db.commit()
+    except IntegrityError:
+        # a concurrent retry with the same idempotency key got there first
+        db.rollback()
+        return _conflicting_upload_response(db, uploader, patient, idempotency_key, digest)
+
+    # chain per patient; the data hash binds the important fields.
+    # The record turns ready in the same transaction as its block.
+    try:
+        block_id = block_appender.append(
+            doctor_id=uploader.id if uploader.role.value == "doctor" else 0,
+            patient_id=patient.id,
+            record_id=record_id,
+            ipfs_cid=cid,
+            data_hash=record_data_hash(cid, record_id, uploader.id, patient.id),
+            mark_record_ready=True,
+        )
+    except Exception as e:
+        _mark_failed(db, [record_id])
+        raise HTTPException(status_code=500, detail=f"Failed to append the upload block: {e}")
 
     return {
         "message": "Record uploaded successfully",
-        "record_id": new_record.id,
+        "record_id": record_id,
         "ipfs_cid": cid,
         "ipfs_uri": ipfs_uri,
         "patient_id": patient.id,
-        "block_id": block.id,
+        "block_id": block_id,
         "bundles": list(encryption_bundle.keys()),
     }
 
 
+# Uploads several encrypted records at once: files are pinned concurrently, then all
+# Record rows and one chained run of blocks are written in a single transaction
+@router.post("/upload/batch")
+def upload_records_batch(
+    files: List[UploadFile] = File(...),
+    manifest: str = Form(...),
+    patient_id: int = Form(None),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    """
+    `manifest` is a JSON array with one entry per file, in the same order:
+      {"file_nonce_b64", "wrapped_key", "raw_aes_key_b64"?, "segment_size"?, "description"?}
+    """
+    uploader, patient = _resolve_upload_parties(db, payload, patient_id)
+
+    try:
+        entries = json.loads(manifest)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid manifest JSON")
+    if not isinstance(entries, list) or len(entries) != len(files):
+        raise HTTPException(status_code=400, detail="Manifest must have one entry per file")
+    if len(files) > BATCH_MAX_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_FILES} files per batch")
+
+    bundles, digests, duplicates = [], [], {}
+    for i, (file, entry) in enumerate(zip(files, entries)):
+        wrapped_key = entry.get("wrapped_key")
+        if isinstance(wrapped_key, dict):
+            wrapped_key = json.dumps(wrapped_key)
+        file_size, digest = _check_upload(file, entry.get("file_nonce_b64"), wrapped_key, entry.get("segment_size"))
+        digests.append(digest)
+        duplicate = _find_duplicate_upload(db, uploader, patient, None, digest)
+        if duplicate or digest in digests[:i]:
+            duplicates[i] = duplicate
+        bundles.append(_build_encryption_bundle(
+            uploader,
+            entry.get("file_nonce_b64"),
+            wrapped_key,
+            entry.get("raw_aes_key_b64"),
+            entry.get("segment_size"),
+            file_size,
+        ))
+
+    def pin(file: UploadFile):
+        try:
+            return blob_store.put_stream(file.filename, file.file), None
+        except Exception as e:
+            return None, str(e)
+
+    to_pin = [file for i, file in enumerate(files) if i not in duplicates]
+    with ThreadPoolExecutor(max_workers=max(1, min(BATCH_PIN_CONCURRENCY, len(to_pin)))) as pool:
+        pinned_iter = pool.map(pin, to_pin)
+        pinned = [(None, None) if i in duplicates else next(pinned_iter) for i in range(len(files))]
+
+    results = [{"filename": file.filename, "error": error} for file, (_, error) in zip(files, pinned)]
+    for i, duplicate in duplicates.items():
+        if duplicate:
+            results[i].update(_duplicate_upload_response(duplicate))
+        else:
+            results[i].update({"duplicate": True, "error": "Same file appears earlier in this batch"})
+    uploaded = [
+        (i, Record(
+            patient_id=patient.id,
+            doctor_id=uploader.id if uploader.role.value == "doctor" else None,
+            filename=files[i].filename,
+            ipfs_cid=cid,
+            description=entries[i].get("description"),
+            encryption_key=json.dumps(bundles[i]),
+            status="ready",
+            ciphertext_sha256=digests[i],
+        ))
+        for i, (cid, _) in enumerate(pinned) if cid
+    ]
+
+    appended = 0
+    if uploaded:
+        # records and their upload blocks go in one transaction: all of them land or none do
+        try:
+            db.add_all([record for _, record in uploaded])
+            db.flush()
+            blocks = append_blocks(db, patient.id, [
+                {
+                    "doctor_id": uploader.id if uploader.role.value == "doctor" else 0,
+                    "record_id": record.id,
+                    "ipfs_cid": record.ipfs_cid,
+                    "data_hash": record_data_hash(record.ipfs_cid, record.id, uploader.id, patient.id),
+                }
+                for _, record in uploaded
+            ])
+            for (_, record), block in zip(uploaded, blocks):
+                record.block_id = block.id
+            created = [(i, record.id, record.ipfs_cid, record.block_id) for i, record in uploaded]
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.exception("Batch upload for patient %s failed", patient.id)
+            for i, _ in uploaded:
+                results[i]["error"] = f"Failed to save the batch: {e}"
+            created = []
+
+        for i, record_id, cid, block_id in created:
+            results[i].update({
+                "record_id": record_id,
+                "ipfs_cid": cid,
+                "ipfs_uri": f"ipfs://{cid}",
+                "block_id": block_id,
+                "bundles": list(bundles[i].keys()),
+            })
+            appended += 1
+
+    return {
+        "message": f"Uploaded {appended} of {len(files)} records",
+        "patient_id": patient.id,
+        "results": results,
+    }
+
+
+# Accepts an upload, spools it to disk and pins it to IPFS in the background
+@router.post("/upload/async", status_code=202)
+def upload_record_async(
+    file: UploadFile = File(...),
+    description: str = Form(None),
+    patient_id: int = Form(None),
+    file_nonce_b64: str = Form(None),
+    wrapped_key: str = Form(None),
+    raw_aes_key_b64: str = Form(None),
+    segment_size: int = Form(None),
+    idempotency_key: str = Header(None, alias="Idempotency-Key"),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    uploader, patient = _resolve_upload_parties(db, payload, patient_id)
+    file_size, digest = _check_upload(file, file_nonce_b64, wrapped_key, segment_size)
+
+    duplicate = _find_duplicate_upload(db, uploader, patient, idempotency_key, digest)
+    if duplicate:
+        return _duplicate_upload_response(duplicate)
+
+    encryption_bundle = _build_encryption_bundle(uploader, file_nonce_b64, wrapped_key, raw_aes_key_b64, segment_size, file_size)
+
+    if not ingest_service.reserve_slot():
+        raise HTTPException(status_code=503, detail="Upload queue is full, retry later")
+
+    spool_file = None
+    try:
+        new_record = Record(
+            patient_id=patient.id,
+            doctor_id=uploader.id if uploader.role.value == "doctor" else None,
+            filename=file.filename,
+            ipfs_cid="",
+            description=description,
+            encryption_key=json.dumps(encryption_bundle),
+            status="pending",
+            ciphertext_sha256=digest,
+            idempotency_key=f"{uploader.id}:{idempotency_key}" if idempotency_key else None,
+        )
+        db.add(new_record)
+        db.flush()
+        spool_file = ingest_service.spool(file.file, new_record.id)
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        ingest_service.release_slot()
+        if spool_file:
+            ingest_service.discard(spool_file)
+        return _conflicting_upload_response(db, uploader, patient, idempotency_key, digest)
+    except Exception:
+        db.rollback()
+        ingest_service.release_slot()
+        if spool_file:
+            ingest_service.discard(spool_file)
+        raise
+
+    ingest_service.submit(new_record.id, spool_file)
+    return {
+        "message": "Record accepted for processing",
+        "job_id": new_record.id,
+        "record_id": new_record.id,
+        "status": "pending",
+    }
+
+
+# Reports the progress of an async upload job (the job id is the record id)
+@router.get("/jobs/{job_id}")
+def get_upload_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    job = ingest_service.get_job(db, job_id)
+    if not job or payload.get("user_id") not in (job["patient_id"], job["doctor_id"]):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
 # Returns record details and encryption metadata
 @router.get("/view/{record_id}")
 def get_record_details(
@@ -269,6 +704,7 @@ def get_patient_records(
             "uploaded_at": r.uploaded_at,
             "description": r.description,
             "ipfs_cid": r.ipfs_cid,
+            "status": r.status or "ready",
         }
         for r in records
     ]
@@ -278,6 +714,7 @@ def get_patient_records(
 @router.post("/decrypt/{record_id}")
 def decrypt_record_backend(
     record_id: int,
+    request: Request,
     data: dict = Body(...),
     db: Session = Depends(get_db),
     payload: dict = Depends(get_token_payload)
@@ -290,6 +727,7 @@ def decrypt_record_backend(
     record = db.query(Record).filter(Record.id == record_id).first()
     if not record or record.patient_id != user_id:
         raise HTTPException(status_code=403, detail="Access denied")
+    _require_ready(record)
 
     enc = json.loads(record.encryption_key)
     bundle, file_nonce_b64 = _pick_bundle_for_patient(enc)
@@ -297,24 +735,181 @@ def decrypt_record_backend(
         raise HTTPException(status_code=400, detail="Missing file nonce")
 
     private_key = serialization.load_pem_private_key(private_pem.encode(), password=None)
-    eph_pub = serialization.load_der_public_key(base64.b64decode(bundle["eph_pub_spki_b64"]))
-    shared = private_key.exchange(ec.ECDH(), eph_pub)
-    h = hashes.Hash(hashes.SHA256()); h.update(shared); kek = h.finalize()
+    aes_key = _unwrap_aes_key(private_key, bundle["eph_pub_spki_b64"], bundle["nonce_b64"], bundle["wrapped_b64"])
 
-    aes_key = AESGCM(kek).decrypt(
-        base64.b64decode(bundle["nonce_b64"]),
-        base64.b64decode(bundle["wrapped_b64"]),
-        None
-    )
+    response, _ = _decrypted_response(record, enc, aes_key, file_nonce_b64, request.headers.get("range"))
+    return response
 
-    ipfs_url = f"http://127.0.0.1:8080/ipfs/{record.ipfs_cid}"
-    res = requests.get(ipfs_url, timeout=30)
-    plaintext = AESGCM(aes_key).decrypt(base64.b64decode(file_nonce_b64), res.content, None)
 
-    mime_type, _ = mimetypes.guess_type(record.filename)
-    return StreamingResponse(io.BytesIO(plaintext),
-        media_type=mime_type or "application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{record.filename}"'}
+# File-like sink for zipfile that hands written bytes back to a generator instead of keeping them
+class _ZipStream(io.RawIOBase):
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._parts.append(bytes(b))
+        return len(b)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+# Decrypted chunks fetched ahead of the ZIP writer, across records, within a shared byte budget.
+# A record may always queue one chunk while its own queue is empty, so the record being
+# written never waits on records behind it; memory stays under budget + fan-out * chunk.
+class _ExportPrefetch:
+    _DONE = object()
+
+    def __init__(self, budget: int):
+        self.budget = budget
+        self.buffered = 0
+        self.cancelled = False
+        self._cond = threading.Condition()
+
+    def new_queue(self) -> dict:
+        return {"chunks": collections.deque(), "bytes": 0, "done": False, "error": None}
+
+    def produce(self, queue: dict, chunks):
+        try:
+            for chunk in chunks:
+                with self._cond:
+                    while not self.cancelled and queue["bytes"] and self.buffered + len(chunk) > self.budget:
+                        self._cond.wait()
+                    if self.cancelled:
+                        return
+                    queue["chunks"].append(chunk)
+                    queue["bytes"] += len(chunk)
+                    self.buffered += len(chunk)
+                    self._cond.notify_all()
+        except Exception as e:
+            queue["error"] = e
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+            with self._cond:
+                queue["done"] = True
+                self._cond.notify_all()
+
+    def consume(self, queue: dict):
+        """Yields a record's chunks in order; raises the producer's error after the last one."""
+        while True:
+            with self._cond:
+                while not queue["chunks"] and not queue["done"]:
+                    self._cond.wait()
+                if not queue["chunks"]:
+                    break
+                chunk = queue["chunks"].popleft()
+                queue["bytes"] -= len(chunk)
+                self.buffered -= len(chunk)
+                self._cond.notify_all()
+            yield chunk
+        if queue["error"] is not None:
+            raise queue["error"]
+
+    def cancel(self):
+        with self._cond:
+            self.cancelled = True
+            self._cond.notify_all()
+
+
+# Streams all of a patient's records as a ZIP archive, decrypting with one private key
+@router.post("/export")
+def export_patient_records(
+    data: dict = Body(...),
+    db: Session = Depends(get_db),
+    payload: dict = Depends(get_token_payload)
+):
+    user_id = payload.get("user_id")
+    private_pem = data.get("private_key_pem")
+    if not private_pem:
+        raise HTTPException(status_code=400, detail="Private key missing")
+
+    try:
+        private_key = serialization.load_pem_private_key(private_pem.encode(), password=None)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid private key: {str(e)}")
+
+    records = (
+        db.query(Record)
+        .filter(Record.patient_id == user_id)
+        .order_by(Record.uploaded_at)
+        .all()
+    )
+    if not records:
+        raise HTTPException(status_code=404, detail="No records to export")
+
+    # unwrap every record key up front so a wrong private key fails before streaming starts
+    jobs, errors = [], []
+    for record in records:
+        if record.status not in (None, "ready"):
+            errors.append(f"{record.id}\t{record.filename}\trecord is {record.status}")
+            continue
+        try:
+            enc = json.loads(record.encryption_key)
+            bundle, file_nonce_b64 = _pick_bundle_for_patient(enc)
+            aes_key = _unwrap_aes_key(private_key, bundle["eph_pub_spki_b64"], bundle["nonce_b64"], bundle["wrapped_b64"])
+        except Exception as e:
+            errors.append(f"{record.id}\t{record.filename}\t{e.detail if isinstance(e, HTTPException) else 'key unwrap failed'}")
+            continue
+        jobs.append((record, enc, aes_key, file_nonce_b64))
+    if not jobs:
+        raise HTTPException(status_code=400, detail="Could not unwrap any record key with this private key")
+
+    prefetch = _ExportPrefetch(EXPORT_PREFETCH_BYTES)
+
+    def fetch(job, queue):
+        record, enc, aes_key, file_nonce_b64 = job
+        if prefetch.cancelled:
+            return
+        try:
+            chunks = _plaintext_stream(record, enc, aes_key, file_nonce_b64)
+        except Exception as e:
+            chunks, queue["error"] = (), e
+        prefetch.produce(queue, chunks)
+
+    def archive():
+        sink = _ZipStream()
+        with ThreadPoolExecutor(max_workers=EXPORT_FANOUT) as pool, \
+                zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as zf:
+            # records are fetched in order by EXPORT_FANOUT workers and written in the same order;
+            # decrypted bytes waiting to be written are capped by EXPORT_PREFETCH_BYTES
+            queues = [prefetch.new_queue() for _ in jobs]
+            for job, queue in zip(jobs, queues):
+                pool.submit(fetch, job, queue)
+            try:
+                for (record, *_), queue in zip(jobs, queues):
+                    chunks = prefetch.consume(queue)
+                    written = 0
+                    try:
+                        first = next(chunks, None)
+                        with zf.open(f"{record.id}_{os.path.basename(record.filename)}", "w", force_zip64=True) as entry:
+                            for chunk in itertools.chain([first] if first is not None else [], chunks):
+                                view = memoryview(chunk)
+                                for pos in range(0, len(view), EXPORT_CHUNK_SIZE):
+                                    entry.write(view[pos:pos + EXPORT_CHUNK_SIZE])
+                                    yield sink.drain()
+                                written += len(chunk)
+                    except Exception:
+                        logger.exception("Export of record %s failed", record.id)
+                        detail = f"failed after {written} bytes, the file in the archive is incomplete" if written else "download or decryption failed"
+                        errors.append(f"{record.id}\t{record.filename}\t{detail}")
+                    yield sink.drain()
+            finally:
+                prefetch.cancel()
+
+            if errors:
+                zf.writestr("EXPORT_ERRORS.txt", "\n".join(errors) + "\n")
+        yield sink.drain()
+
+    return StreamingResponse(
+        archive(),
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="medichain_records_{user_id}.zip"'},
     )
 
 
@@ -330,10 +925,7 @@ def get_patient_records_for_doctor(
     if role != "doctor":
         raise HTTPException(status_code=403, detail="Only doctors can access this route")
 
-    connection = db.execute(
-        text(f"SELECT * FROM connections WHERE doctor_id = {user_id} AND patient_id = {patient_id} AND status IN ('active', 'accepted')")
-    ).fetchone()
-    if not connection:
+    if not authz_index.is_connected(db, user_id, patient_id):
         raise HTTPException(status_code=403, detail="No active connection with this patient")
 
     records = db.query(Record).filter(Record.patient_id == patient_id).order_by(Record.uploaded_at.desc()).all()
@@ -356,12 +948,11 @@ def get_patient_records_for_doctor(
 @router.post("/doctor/decrypt/{record_id}")
 def decrypt_record_doctor(
     record_id: int,
+    request: Request,
     data: dict = Body(...),
     db: Session = Depends(get_db),
     payload: dict = Depends(get_token_payload)
 ):
-    from app.models.access_control import AccessControl
-
     doctor_id = payload.get("user_id")
     role = payload.get("role")
     if role != "doctor":
@@ -373,91 +964,46 @@ def decrypt_record_doctor(
     record = db.query(Record).filter(Record.id == record_id).first()
     if not record:
         raise HTTPException(status_code=404, detail="Record not found")
+    _require_ready(record)
 
     enc = json.loads(record.encryption_key)
     bundle, file_nonce_b64 = _pick_bundle_for_doctor(enc)
 
     if record.doctor_id == doctor_id and bundle:
-        eph_pub = serialization.load_der_public_key(base64.b64decode(bundle["eph_pub_spki_b64"]))
-        shared = doctor_priv.exchange(ec.ECDH(), eph_pub)
-        h = hashes.Hash(hashes.SHA256()); h.update(shared); kek = h.finalize()
-        aes_key = AESGCM(kek).decrypt(
-            base64.b64decode(bundle["nonce_b64"]),
-            base64.b64decode(bundle["wrapped_b64"]),
-            None
-        )
+        aes_key = _unwrap_aes_key(doctor_priv, bundle["eph_pub_spki_b64"], bundle["nonce_b64"], bundle["wrapped_b64"])
     else:
-        access = (
-            db.query(AccessControl)
-            .filter(
-                AccessControl.doctor_id == doctor_id,
-                AccessControl.record_id == record_id,
-                AccessControl.status == "approved",
-                AccessControl.granted == True,
-            )
-            .first()
-        )
+        access = authz_index.record_access(db, doctor_id, record_id)
         if not access:
             raise HTTPException(status_code=403, detail="Access not granted for this record")
-        eph_pub = serialization.load_der_public_key(base64.b64decode(access.eph_pub_b64))
-        shared = doctor_priv.exchange(ec.ECDH(), eph_pub)
-        h = hashes.Hash(hashes.SHA256()); h.update(shared); kek = h.finalize()
-        aes_key = AESGCM(kek).decrypt(
-            base64.b64decode(access.nonce_b64),
-            base64.b64decode(access.encrypted_aes_key),
-            None
-        )
+        aes_key = _unwrap_aes_key(doctor_priv, access.eph_pub_b64, access.nonce_b64, access.encrypted_aes_key)
         _, file_nonce_b64 = _pick_bundle_for_patient(enc)
 
-    ipfs_url = f"http://127.0.0.1:8080/ipfs/{record.ipfs_cid}"
-    res = requests.get(ipfs_url, timeout=30)
-    plaintext = AESGCM(aes_key).decrypt(base64.b64decode(file_nonce_b64), res.content, None)
+    # a viewer seeking through a record sends many ranged requests;
+    # only the opening request (from byte 0) is recorded as an access
+    range_header = request.headers.get("range")
+    byte_range = _requested_range(enc, range_header)[1] if _supports_ranges(enc) else None
+    if not byte_range or byte_range[0] == 0:
+        # recorded before the ciphertext is opened: nothing is served without its access
+        # block, and a failed append leaves no open stream behind
+        block_appender.append(
+            doctor_id=doctor_id,
+            patient_id=record.patient_id,
+            record_id=record.id,
+            ipfs_cid=record.ipfs_cid,
+            data_hash=record_data_hash(record.ipfs_cid, record.id, doctor_id, record.patient_id, access=True),
+        )
 
-    # chain per patient
-    previous_block = (
-        db.query(Block)
-        .filter(Block.patient_id == record.patient_id)
-        .order_by(Block.id.desc())
-        .first()
-    )
-    previous_hash = previous_block.hash_value if previous_block else "0"
-
-    data_string = f"{record.ipfs_cid}-{record.id}-{doctor_id}-{record.patient_id}-access"
-    data_hash = hashlib.sha256(data_string.encode()).hexdigest()
-
-    access_block = Block(
-        doctor_id=doctor_id,
-        patient_id=record.patient_id,
-        record_id=record.id,
-        ipfs_cid=record.ipfs_cid,
-        data_hash=data_hash,
-        previous_hash=previous_hash,
-        hash_value=Block.generate_hash(
-            doctor_id,
-            record.patient_id,
-            record.ipfs_cid,
-            previous_hash,
-            data_hash
-        ),
-    )
-    db.add(access_block)
-    db.commit()
-    
-    log_entry = AccessLog(
-        patient_id=record.patient_id,
-        doctor_id=doctor_id,
-        record_id=record.id,
-        action="Doctor decrypted and viewed the record",
-    )
-    db.add(log_entry)
-    db.commit()
+        log_entry = AccessLog(
+            patient_id=record.patient_id,
+            doctor_id=doctor_id,
+            record_id=record.id,
+            action="Doctor decrypted and viewed the record",
+        )
+        db.add(log_entry)
+        db.commit()
 
-    mime_type, _ = mimetypes.guess_type(record.filename)
-    return StreamingResponse(
-        io.BytesIO(plaintext),
-        media_type=mime_type or "application/octet-stream",
-        headers={"Content-Disposition": f'attachment; filename="{record.filename}"'}
-    )
+    response, _ = _decrypted_response(record, enc, aes_key, file_nonce_b64, range_header)
+    return response
 @router.get("/count/{user_id}")
 def get_record_count(
     user_id: int,
@@ -0,0 +1,89 @@
+# app/services/access_grant_service.py
+"""
+Writes wrapped-key grants into access_control.
+
+Grants are keyed by (patient_id, doctor_id, record_id). When the database
+has the uq_access_control_grant constraint they are upserted in a single
+INSERT ... ON DUPLICATE KEY UPDATE on MySQL (ON CONFLICT DO UPDATE on
+PostgreSQL/SQLite). create_all does not add that constraint to an existing
+access_control table (app/database/migrations.py does, after removing
+duplicates), and without it those statements would silently insert duplicate
+grants, so until then grants go through a lookup plus ORM writes in the same
+transaction. Constraint presence is checked once per engine.
+"""
+from datetime import datetime
+from collections import defaultdict
+from sqlalchemy import inspect, tuple_
+from sqlalchemy.orm import Session
+from app.models.access_control import AccessControl
+
+GRANT_KEY = ("patient_id", "doctor_id", "record_id")
+UPDATE_COLUMNS = ("encrypted_aes_key", "nonce_b64", "eph_pub_b64", "granted", "status", "updated_at", "expires_at")
+GRANT_CONSTRAINT = "uq_access_control_grant"
+
+_constraint_present = {}  # engine url -> bool
+
+
+def _has_grant_constraint(db: Session) -> bool:
+    engine = db.get_bind().engine
+    key = str(engine.url)
+    if key not in _constraint_present:
+        inspector = inspect(engine)
+        table = AccessControl.__tablename__
+        unique = [c["column_names"] for c in inspector.get_unique_constraints(table)]
+        unique += [i["column_names"] for i in inspector.get_indexes(table) if i.get("unique")]
+        _constraint_present[key] = any(set(cols) == set(GRANT_KEY) for cols in unique)
+    return _constraint_present[key]
+
+
+def upsert_grants(db: Session, grants: list, expires_at: datetime = None):
+    """
+    Upserts approved grants. Each grant is a dict with the GRANT_KEY columns plus
+    encrypted_aes_key, nonce_b64 and eph_pub_b64. A re-grant replaces the old
+    expiry (None = until revoked). Does not commit.
+    """
+    if not grants:
+        return
+    now = datetime.utcnow()
+    rows = [
+        {**g, "granted": True, "status": "approved", "granted_at": now, "updated_at": now, "expires_at": expires_at}
+        for g in grants
+    ]
+
+    dialect = db.get_bind().dialect.name
+    if not _has_grant_constraint(db):
+        _upsert_orm(db, rows)
+        return
+    if dialect == "mysql":
+        from sqlalchemy.dialects.mysql import insert
+        stmt = insert(AccessControl).values(rows)
+        stmt = stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in UPDATE_COLUMNS})
+    elif dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(AccessControl).values(rows)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(GRANT_KEY),
+            set_={c: stmt.excluded[c] for c in UPDATE_COLUMNS},
+        )
+    else:
+        _upsert_orm(db, rows)
+        return
+    db.execute(stmt)
+
+
+def _upsert_orm(db: Session, rows: list):
+    keys = [tuple(row[k] for k in GRANT_KEY) for row in rows]
+    existing = defaultdict(list)  # a table without the constraint may already hold duplicates
+    for a in db.query(AccessControl).filter(
+        tuple_(AccessControl.patient_id, AccessControl.doctor_id, AccessControl.record_id).in_(keys)
+    ):
+        existing[(a.patient_id, a.doctor_id, a.record_id)].append(a)
+    for key, row in zip(keys, rows):
+        if key not in existing:
+            db.add(AccessControl(**row))
+        for access in existing.get(key, ()):
+            for column in UPDATE_COLUMNS:
+                setattr(access, column, row[column])
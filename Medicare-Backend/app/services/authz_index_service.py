@@ -0,0 +1,165 @@
+# app/services/authz_index_service.py
+"""
+Per-worker authorization index for doctor access checks.
+
+For each doctor that makes a request, two small queries load:
+  - records:  record_id -> (access_control id, expires_at) of each approved, granted record grant
+  - patients: patient_id -> latest expires_at of the doctor's approved, granted rows
+              for that patient (None = no expiry)
+  - connected: patients with an accepted connection to the doctor
+and later checks are dictionary/set lookups. A grant past its expires_at is
+refused at lookup time, before the expiry scheduler has deleted it.
+
+Writers in this process call invalidate(doctor_id) after committing a grant,
+revoke, connection accept or connection revoke. A per-doctor generation
+counter stops a load that raced with an invalidation from caching its result.
+Other worker processes are not notified. Their entries expire after
+AUTHZ_INDEX_TTL seconds, so that is the staleness window across workers for
+patient and connection checks. record_access() re-checks the grant row it
+returns, so record grants changed elsewhere are refused at once.
+"""
+import os
+import time
+import threading
+from datetime import datetime
+from collections import OrderedDict
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+from app.models.access_control import AccessControl
+from app.models.connection import Connection, ConnectionStatus
+
+AUTHZ_INDEX_TTL = float(os.getenv("AUTHZ_INDEX_TTL", 30))  # seconds, 0 disables caching
+AUTHZ_INDEX_MAX_DOCTORS = int(os.getenv("AUTHZ_INDEX_MAX_DOCTORS", 10000))
+
+
+def _is_live_grant(access, doctor_id: int, record_id: int) -> bool:
+    return (
+        access is not None
+        and access.doctor_id == doctor_id
+        and access.record_id == record_id
+        and access.status == "approved"
+        and bool(access.granted)
+        and (access.expires_at is None or access.expires_at > datetime.utcnow())
+    )
+
+
+class _DoctorAccess:
+    __slots__ = ("records", "patients", "connected", "loaded_at")
+
+    def __init__(self, records: dict, patients: dict, connected: set):
+        self.records = records
+        self.patients = patients
+        self.connected = connected
+        self.loaded_at = time.monotonic()
+
+
+class AuthzIndex:
+    def __init__(self, ttl: float = AUTHZ_INDEX_TTL, max_doctors: int = AUTHZ_INDEX_MAX_DOCTORS):
+        self.ttl = ttl
+        self.max_doctors = max_doctors
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # doctor_id -> _DoctorAccess, least recently used first
+        self._generations = {}  # doctor_id -> invalidation count
+        self._stats = {"hits": 0, "loads": 0, "expired": 0, "invalidations": 0, "evictions": 0}
+
+    def _load(self, db: Session, doctor_id: int) -> _DoctorAccess:
+        records, patients = {}, {}
+        rows = db.query(
+            AccessControl.id, AccessControl.patient_id, AccessControl.record_id, AccessControl.expires_at
+        ).filter(
+            AccessControl.doctor_id == doctor_id,
+            AccessControl.status == "approved",
+            AccessControl.granted == True,
+            or_(AccessControl.expires_at.is_(None), AccessControl.expires_at > datetime.utcnow()),
+        )
+        for access_id, patient_id, record_id, expires_at in rows:
+            if patient_id not in patients:
+                patients[patient_id] = expires_at
+            elif patients[patient_id] is not None:
+                patients[patient_id] = None if expires_at is None else max(patients[patient_id], expires_at)
+            if record_id is not None:
+                records[record_id] = (access_id, expires_at)
+        connected = {
+            patient_id for (patient_id,) in db.query(Connection.patient_id).filter(
+                Connection.doctor_id == doctor_id,
+                Connection.status == ConnectionStatus.accepted,
+            )
+        }
+        return _DoctorAccess(records, patients, connected)
+
+    def _get(self, db: Session, doctor_id: int) -> _DoctorAccess:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(doctor_id)
+            if entry is not None:
+                if now - entry.loaded_at < self.ttl:
+                    self._entries.move_to_end(doctor_id)
+                    self._stats["hits"] += 1
+                    return entry
+                del self._entries[doctor_id]
+                self._stats["expired"] += 1
+            generation = self._generations.get(doctor_id, 0)
+
+        entry = self._load(db, doctor_id)
+        with self._lock:
+            self._stats["loads"] += 1
+            if self.ttl > 0 and self._generations.get(doctor_id, 0) == generation:
+                self._entries[doctor_id] = entry
+                while len(self._entries) > self.max_doctors:
+                    self._entries.popitem(last=False)
+                    self._stats["evictions"] += 1
+        return entry
+
+    def record_access_id(self, db: Session, doctor_id: int, record_id: int):
+        """Returns the access_control id granting `doctor_id` the record, or None."""
+        grant = self._get(db, doctor_id).records.get(record_id)
+        if grant is None or (grant[1] is not None and grant[1] <= datetime.utcnow()):
+            return None
+        return grant[0]
+
+    def record_access(self, db: Session, doctor_id: int, record_id: int):
+        """
+        Returns the AccessControl row granting `doctor_id` the record, or None.
+        The row itself is re-checked, so a grant rejected, revoked or expired
+        through another worker is refused before this worker's entry goes stale.
+        """
+        access_id = self.record_access_id(db, doctor_id, record_id)
+        access = db.get(AccessControl, access_id) if access_id else None
+        if access_id and not _is_live_grant(access, doctor_id, record_id):
+            self.invalidate(doctor_id)
+            return None
+        return access
+
+    def has_patient_access(self, db: Session, doctor_id: int, patient_id: int) -> bool:
+        patients = self._get(db, doctor_id).patients
+        if patient_id not in patients:
+            return False
+        expires_at = patients[patient_id]
+        return expires_at is None or expires_at > datetime.utcnow()
+
+    def is_connected(self, db: Session, doctor_id: int, patient_id: int) -> bool:
+        return patient_id in self._get(db, doctor_id).connected
+
+    def invalidate(self, *doctor_ids: int):
+        """Drops the doctors' entries; call after committing a change to their access."""
+        with self._lock:
+            for doctor_id in doctor_ids:
+                self._generations[doctor_id] = self._generations.get(doctor_id, 0) + 1
+                self._entries.pop(doctor_id, None)
+                self._stats["invalidations"] += 1
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        with self._lock:
+            stats = dict(self._stats)
+            ages = [now - e.loaded_at for e in self._entries.values()]
+            stats["doctors"] = len(self._entries)
+            stats["grants"] = sum(len(e.records) for e in self._entries.values())
+        lookups = stats["hits"] + stats["loads"]
+        stats["hit_rate"] = round(stats["hits"] / lookups, 4) if lookups else None
+        stats["ttl_seconds"] = self.ttl
+        stats["oldest_entry_seconds"] = round(max(ages), 3) if ages else None
+        return stats
+
+
+index = AuthzIndex()
@@ -0,0 +1,155 @@
+# app/services/block_append_service.py
+"""
+Group-commit block appends.
+
+Upload, ingest and access paths submit their blocks here instead of writing
+them in their own transactions. A single writer thread per worker process
+drains the queue in micro-batches (up to BLOCK_APPEND_MAX_BATCH blocks or
+BLOCK_APPEND_MAX_DELAY_MS after the first one), chains each patient's run
+with append_blocks and commits the whole batch in one transaction. Each
+caller gets a Future that resolves to its block id once that commit is done.
+
+Chain heads are locked in patient_id order, so writers in different
+processes cannot deadlock on each other.
+"""
+import os
+import time
+import queue
+import threading
+from collections import defaultdict
+from concurrent.futures import Future
+from app.database import connection
+from app.models.record import Record
+from app.services.blockchain_service import append_blocks
+from app.utils.logger import logger
+
+MAX_BATCH = int(os.getenv("BLOCK_APPEND_MAX_BATCH", 256))
+MAX_DELAY = float(os.getenv("BLOCK_APPEND_MAX_DELAY_MS", 5)) / 1000
+APPEND_TIMEOUT = float(os.getenv("BLOCK_APPEND_TIMEOUT", 30))
+
+
+class _Append:
+    __slots__ = ("patient_id", "entry", "mark_record_ready", "future")
+
+    def __init__(self, patient_id, entry, mark_record_ready):
+        self.patient_id = patient_id
+        self.entry = entry
+        self.mark_record_ready = mark_record_ready
+        self.future = Future()
+
+
+class BlockAppender:
+    def __init__(self, max_batch: int = MAX_BATCH, max_delay: float = MAX_DELAY):
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stats = {"appends": 0, "batches": 0, "failed": 0, "largest_batch": 0}
+
+    def submit(self, doctor_id: int, patient_id: int, record_id: int, ipfs_cid: str, data_hash: str,
+               mark_record_ready: bool = False) -> Future:
+        """
+        Queues a block append. With `mark_record_ready` the record's block_id and
+        status="ready" are written in the same transaction as the block.
+        """
+        self._ensure_running()
+        item = _Append(patient_id, {
+            "doctor_id": doctor_id,
+            "record_id": record_id,
+            "ipfs_cid": ipfs_cid,
+            "data_hash": data_hash,
+        }, mark_record_ready)
+        self._queue.put(item)
+        return item.future
+
+    def append(self, *args, **kwargs) -> int:
+        """Submits a block and waits until it is committed; returns the block id."""
+        return self.submit(*args, **kwargs).result(timeout=APPEND_TIMEOUT)
+
+    def _ensure_running(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="block-append", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_delay
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception as e:  # never let the writer thread die
+                logger.exception("Block append batch failed")
+                self._fail([item for item in batch if not item.future.done()], e)
+
+    def _commit(self, batch: list):
+        groups = defaultdict(list)
+        for item in batch:
+            groups[item.patient_id].append(item)
+        chains = [groups[pid] for pid in sorted(groups)]
+
+        try:
+            self._write(chains)
+        except Exception:
+            if len(chains) == 1:
+                raise
+            # isolate the failing chain: retry each chain in its own transaction
+            for chain in chains:
+                try:
+                    self._write([chain])
+                except Exception as e:
+                    logger.exception("Block append for patient %s failed", chain[0].patient_id)
+                    self._fail(chain, e)
+
+    def _fail(self, items: list, error: Exception):
+        with self._lock:
+            self._stats["failed"] += len(items)
+        for item in items:
+            item.future.set_exception(error)
+
+    def _write(self, chains: list):
+        db = connection.SessionLocal()
+        try:
+            results = []
+            for chain in chains:
+                blocks = append_blocks(db, chain[0].patient_id, [item.entry for item in chain])
+                for item, block in zip(chain, blocks):
+                    if item.mark_record_ready:
+                        db.query(Record).filter(Record.id == item.entry["record_id"]).update(
+                            {"block_id": block.id, "status": "ready"}, synchronize_session=False
+                        )
+                    results.append((item, block.id))
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        with self._lock:
+            self._stats["appends"] += len(results)
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(results))
+        for item, block_id in results:
+            item.future.set_result(block_id)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["queued"] = self._queue.qsize()
+        stats["avg_batch"] = round(stats["appends"] / stats["batches"], 2) if stats["batches"] else None
+        return stats
+
+
+appender = BlockAppender()
@@ -1,80 +1,270 @@
 # app/services/blockchain_service.py
 from sqlalchemy.orm import Session
-from app.models.blockchain import Block
+from sqlalchemy import or_
+from sqlalchemy.exc import IntegrityError
+from app.models.blockchain import Block, ChainCheckpoint, ChainHead
+from app.services.block_hash_service import HASH_VERSION, block_hash, canonical_timestamp
 from datetime import datetime
 import hashlib
-import json
 
-def calculate_hash(index, timestamp, data, previous_hash):
-    block_string = f"{index}{timestamp}{json.dumps(data, sort_keys=True)}{previous_hash}"
-    return hashlib.sha256(block_string.encode()).hexdigest()
+def record_data_hash(ipfs_cid: str, record_id: int, actor_id: int, patient_id: int, access: bool = False) -> str:
+    """Data hash binding a record's CID and parties; access blocks carry an "-access" suffix."""
+    data_string = f"{ipfs_cid}-{record_id}-{actor_id}-{patient_id}"
+    if access:
+        data_string += "-access"
+    return hashlib.sha256(data_string.encode()).hexdigest()
 
-def get_last_block(db: Session):
-    return db.query(Block).order_by(Block.index.desc()).first()
+def lock_chain_head(db: Session, patient_id: int) -> ChainHead:
+    """
+    Locks and returns the patient's ChainHead row, creating it from the chain's
+    last block the first time a chain is touched.
+    """
+    head = db.query(ChainHead).filter(ChainHead.patient_id == patient_id).with_for_update().first()
+    if head is not None:
+        return head
+    last = (
+        db.query(Block.id, Block.hash_value)
+        .filter(Block.patient_id == patient_id)
+        .order_by(Block.id.desc())
+        .first()
+    )
+    try:
+        with db.begin_nested():
+            db.add(ChainHead(
+                patient_id=patient_id,
+                last_block_id=last.id if last else None,
+                head_hash=last.hash_value if last else "0",
+            ))
+    except IntegrityError:
+        pass  # another transaction bootstrapped it first
+    return db.query(ChainHead).filter(ChainHead.patient_id == patient_id).with_for_update().populate_existing().one()
+
+def append_blocks(db: Session, patient_id: int, entries: list):
+    """
+    Appends a run of blocks to one patient's chain inside the caller's transaction.
+    `entries` are dicts with doctor_id, record_id, ipfs_cid and data_hash; the
+    chain head row is locked once and the run is chained in memory.
+    Blocks are flushed (so their ids are available) but not committed; the head
+    lock is held until the caller commits or rolls back.
+    """
+    head = lock_chain_head(db, patient_id)
+    previous_hash = head.head_hash
+
+    timestamp = canonical_timestamp()
+    blocks = []
+    for entry in entries:
+        block = Block(
+            doctor_id=entry["doctor_id"],
+            patient_id=patient_id,
+            record_id=entry["record_id"],
+            ipfs_cid=entry["ipfs_cid"],
+            data_hash=entry["data_hash"],
+            previous_hash=previous_hash,
+            timestamp=timestamp,
+            hash_version=HASH_VERSION,
+        )
+        block.hash_value = block_hash(block)
+        blocks.append(block)
+        previous_hash = block.hash_value
+    db.add_all(blocks)
+    db.flush()
+    head.last_block_id, head.head_hash = blocks[-1].id, blocks[-1].hash_value
+    return blocks
 
-def add_block(db: Session, data: dict):
+def append_block(db: Session, doctor_id: int, patient_id: int, record_id: int, ipfs_cid: str, data_hash: str):
+    """Appends a single block to the patient's chain (see append_blocks)."""
+    return append_blocks(db, patient_id, [{
+        "doctor_id": doctor_id,
+        "record_id": record_id,
+        "ipfs_cid": ipfs_cid,
+        "data_hash": data_hash,
+    }])[0]
+
+VERIFY_BATCH_SIZE = 1000
+
+# columns needed to check a block's link and recompute its hash
+CHAIN_COLUMNS = (
+    Block.id, Block.doctor_id, Block.patient_id, Block.record_id, Block.timestamp,
+    Block.ipfs_cid, Block.previous_hash, Block.data_hash, Block.hash_value, Block.hash_version,
+)
+
+def check_link(row, head_hash: str):
     """
-    Create and store a new block in DB. `data` should be JSON-serializable.
-    Returns the created Block model instance.
+    Returns why `row` does not extend a chain whose head is `head_hash`, or None.
+    Versioned blocks also have their hash recomputed; legacy ones are linkage-only.
     """
-    last_block = get_last_block(db)
-    previous_hash = last_block.hash if last_block else "0"
-    index = last_block.index + 1 if last_block else 0
-    timestamp = datetime.utcnow().isoformat()
-
-    block_hash = calculate_hash(index, timestamp, data, previous_hash)
-
-    new_block = Block(
-        index=index,
-        timestamp=timestamp,
-        data=json.dumps(data),
-        previous_hash=previous_hash,
-        hash=block_hash
+    if not row.hash_value or not row.timestamp:
+        return "missing hash or timestamp"
+    if (row.previous_hash or "0") != head_hash:
+        return "previous_hash does not match chain head"
+    if row.hash_version == HASH_VERSION and block_hash(row) != row.hash_value:
+        return "hash does not match block contents"
+    return None
+
+def _load_checkpoints(db: Session) -> dict:
+    return {c.patient_id: c for c in db.query(ChainCheckpoint).all()}
+
+def _stale_checkpoints(db: Session) -> list:
+    """Checkpoints whose head block was deleted or rewritten since it was verified."""
+    rows = (
+        db.query(ChainCheckpoint.patient_id, ChainCheckpoint.last_block_id)
+        .outerjoin(Block, Block.id == ChainCheckpoint.last_block_id)
+        .filter(or_(Block.id.is_(None), Block.hash_value != ChainCheckpoint.head_hash))
+        .all()
     )
+    return [{"patient_id": r.patient_id, "block_id": r.last_block_id, "error": "checkpoint head changed"} for r in rows]
 
-    db.add(new_block)
-    db.commit()
-    db.refresh(new_block)
-    return new_block
+def _save_checkpoint(db: Session, patient_id: int, values: dict, rewind: bool = False):
+    """
+    Moves a chain's checkpoint forward, or creates it. Only `rewind` (a full walk,
+    which may stop at a break before the old checkpoint) moves it back.
+    Verifications can run concurrently (the auditor in every worker, the admin
+    endpoint), so a checkpoint another one created first is updated, not re-inserted.
+    """
+    advance = db.query(ChainCheckpoint).filter(ChainCheckpoint.patient_id == patient_id)
+    if not rewind:
+        advance = advance.filter(ChainCheckpoint.last_block_id <= values["last_block_id"])
+    if advance.update(values, synchronize_session=False):
+        return
+    if db.query(ChainCheckpoint.patient_id).filter(ChainCheckpoint.patient_id == patient_id).first():
+        return  # already ahead of this verification
+    try:
+        with db.begin_nested():
+            db.add(ChainCheckpoint(patient_id=patient_id, **values))
+    except IntegrityError:
+        advance.update(values, synchronize_session=False)  # created concurrently
 
-def verify_chain(db):
+def verify_chain(db: Session, full: bool = False, on_batch=None):
     """
-    Simple verification that checks if all blocks exist and have valid fields.
+    Verifies the hash linkage of every patient chain.
+
+    Incremental by default: each chain resumes from its ChainCheckpoint and only
+    blocks appended since then are streamed (in batches of VERIFY_BATCH_SIZE).
+    `full=True` ignores the checkpoints and re-walks every chain from genesis.
+    Checkpoints are advanced to the last good block of each chain and committed.
+    `on_batch` is called after every VERIFY_BATCH_SIZE blocks (e.g. to throttle).
     """
-    blocks = db.query(Block).order_by(Block.id).all()
+    existing = _load_checkpoints(db)
+    checkpoints = {} if full else existing
+    broken = [] if full else _stale_checkpoints(db)
+    skip = {b["patient_id"] for b in broken}
 
-    if not blocks:
-        return {"valid": True, "total_blocks": 0}
+    query = db.query(*CHAIN_COLUMNS)
+    if not full:
+        query = query.outerjoin(ChainCheckpoint, ChainCheckpoint.patient_id == Block.patient_id).filter(
+            or_(ChainCheckpoint.last_block_id.is_(None), Block.id > ChainCheckpoint.last_block_id)
+        )
+    rows = query.order_by(Block.patient_id, Block.id).yield_per(VERIFY_BATCH_SIZE)
 
-    for block in blocks:
-        if not block.hash_value or not block.timestamp:
-            return {"valid": False, "total_blocks": len(blocks)}
+    heads = {}  # patient_id -> [last_block_id, head_hash, block_count]
+    checked = 0
+    for row in rows:
+        checked += 1
+        if on_batch and checked % VERIFY_BATCH_SIZE == 0:
+            on_batch()
+        patient_id = row.patient_id
+        if patient_id in skip:
+            continue
+        head = heads.get(patient_id)
+        if head is None:
+            cp = checkpoints.get(patient_id)
+            head = heads[patient_id] = [cp.last_block_id, cp.head_hash, cp.block_count] if cp else [None, "0", 0]
 
-    return {"valid": True, "total_blocks": len(blocks)}
+        error = check_link(row, head[1])
+        if error is None:
+            head[0], head[1] = row.id, row.hash_value
+            head[2] += 1
+            continue
+        broken.append({"patient_id": patient_id, "block_id": row.id, "error": error})
+        skip.add(patient_id)
 
+    now = datetime.utcnow()
+    for patient_id, (last_block_id, head_hash, count) in heads.items():
+        if last_block_id is None:
+            if patient_id in existing:
+                # a full walk found the chain broken before the old checkpoint
+                db.query(ChainCheckpoint).filter(ChainCheckpoint.patient_id == patient_id).delete(synchronize_session=False)
+            continue
+        _save_checkpoint(db, patient_id, {
+            "last_block_id": last_block_id, "head_hash": head_hash, "block_count": count, "verified_at": now,
+        }, rewind=full)
+    db.commit()
 
-def get_all_blocks(db: Session):
-    blocks = db.query(Block).order_by(Block.index).all()
-    return [
-        {
-            "index": b.index,
-            "timestamp": b.timestamp,
-            "data": json.loads(b.data),
-            "previous_hash": b.previous_hash,
-            "hash": b.hash,
-        }
-        for b in blocks
+    broken.sort(key=lambda b: b["block_id"] or 0)
+    return {
+        "valid": not broken,
+        "mode": "full" if full else "incremental",
+        "blocks_checked": checked,
+        "chains_advanced": len(heads),
+        "broken": broken,
+    }
+
+
+def migrate_legacy_hashes(db: Session) -> dict:
+    """
+    Rehashes every chain that still has legacy (hash_version NULL) blocks with the
+    canonical v2 encoding, relinking previous_hash along the way. A chain is only
+    rewritten if its existing linkage is intact; broken chains are left as they are
+    and reported. Each chain is committed separately and its checkpoint moved to the new head.
+    Ledger snapshots exported before the migration hold the old hashes; export a new one afterwards.
+    """
+    patient_ids = [
+        pid for (pid,) in db.query(Block.patient_id).filter(Block.hash_version.is_(None)).distinct()
     ]
+    migrated, skipped = [], []
+    for patient_id in patient_ids:
+        head = lock_chain_head(db, patient_id)  # keeps appends out while the chain is rewritten
+        blocks = db.query(Block).filter(Block.patient_id == patient_id).order_by(Block.id).all()
+        head_hash = "0"
+        for block in blocks:
+            # rehashing would invalidate the Merkle roots these hashes are anchored in
+            error = "chain has Merkle-anchored blocks" if block.anchor_id else check_link(block, head_hash)
+            if error:
+                skipped.append({"patient_id": patient_id, "block_id": block.id, "error": error})
+                break
+            head_hash = block.hash_value
+        else:
+            previous_hash = "0"
+            for block in blocks:
+                block.timestamp = canonical_timestamp(block.timestamp)
+                block.previous_hash = previous_hash
+                block.hash_version = HASH_VERSION
+                block.hash_value = block_hash(block)
+                previous_hash = block.hash_value
+            head.last_block_id, head.head_hash = blocks[-1].id, blocks[-1].hash_value
+            cp = db.get(ChainCheckpoint, patient_id)
+            if cp is not None:
+                cp.last_block_id, cp.head_hash = blocks[-1].id, blocks[-1].hash_value
+                cp.block_count, cp.verified_at = len(blocks), datetime.utcnow()
+            db.commit()
+            migrated.append(patient_id)
+            continue
+        db.rollback()
+    return {"chains_migrated": len(migrated), "chains_skipped": skipped}
+
 
-def find_blocks_by_record_id(db: Session, record_id: int):
-    blocks = db.query(Block).filter(Block.data.like(f'%\"record_id\": {record_id}%')).order_by(Block.index).all()
+def record_history(db: Session, record_id: int, upload_block_id: int = None) -> list:
+    """
+    Upload and access blocks of one record, oldest first, in a single range scan
+    of the (record_id, id) index. The record's own block_id is its upload block.
+    """
+    rows = (
+        db.query(Block.id, Block.doctor_id, Block.patient_id, Block.ipfs_cid,
+                 Block.data_hash, Block.hash_value, Block.timestamp)
+        .filter(Block.record_id == record_id)
+        .order_by(Block.id)
+        .all()
+    )
     return [
         {
-            "index": b.index,
-            "timestamp": b.timestamp,
-            "data": json.loads(b.data),
-            "previous_hash": b.previous_hash,
-            "hash": b.hash,
+            "block_id": b.id,
+            "event": "upload" if b.id == upload_block_id else "access",
+            "actor_id": b.doctor_id,
+            "patient_id": b.patient_id,
+            "ipfs_cid": b.ipfs_cid,
+            "data_hash": b.data_hash,
+            "hash": b.hash_value,
+            "timestamp": b.timestamp.isoformat() if b.timestamp else None,
         }
-        for b in blocks
+        for b in rows
     ]
@@ -0,0 +1,138 @@
+# app/services/chain_audit_service.py
+"""
+Parallel integrity audit of the block ledger.
+
+Every patient has an independent chain, so the ledger is split into
+contiguous patient_id ranges of roughly equal block counts and each range is
+streamed and checked in its own process with its own database connection.
+Read-only: checkpoints (see blockchain_service.verify_chain) are not touched.
+
+Run nightly with:  python -m app.services.chain_audit_service [workers]
+"""
+import os
+import sys
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from app.database import connection
+from app.models.blockchain import Block
+from app.services.blockchain_service import CHAIN_COLUMNS, check_link, VERIFY_BATCH_SIZE
+
+AUDIT_WORKERS = int(os.getenv("CHAIN_AUDIT_WORKERS", os.cpu_count() or 1))
+# ranges per worker, so one slow range does not leave the other cores idle
+PARTITIONS_PER_WORKER = 4
+
+_worker_session = None
+
+
+def _init_worker(database_url: str):
+    global _worker_session
+    engine = create_engine(database_url, poolclass=NullPool)
+    _worker_session = sessionmaker(bind=engine)
+
+
+def _partition(counts: list, parts: int) -> list:
+    """Cuts [(patient_id, blocks)] sorted by patient_id into contiguous (lo, hi) ranges."""
+    total = sum(c for _, c in counts)
+    target = max(1, -(-total // parts))
+    ranges, lo, acc = [], None, 0
+    for patient_id, count in counts:
+        if lo is None:
+            lo = patient_id
+        acc += count
+        if acc >= target:
+            ranges.append((lo, patient_id))
+            lo, acc = None, 0
+    if lo is not None:
+        ranges.append((lo, counts[-1][0]))
+    return ranges
+
+
+def _verify_range(lo: int, hi: int) -> list:
+    """Walks every chain with lo <= patient_id <= hi; returns one result per chain."""
+    db = _worker_session()
+    try:
+        rows = (
+            db.query(*CHAIN_COLUMNS)
+            .filter(Block.patient_id.between(lo, hi))
+            .order_by(Block.patient_id, Block.id)
+            .yield_per(VERIFY_BATCH_SIZE)
+        )
+        results = []
+        chain = None
+        for row in rows:
+            if chain is None or chain["patient_id"] != row.patient_id:
+                chain = {"patient_id": row.patient_id, "blocks": 0, "valid": True,
+                         "head_block_id": None, "head_hash": "0", "broken_at": None}
+                results.append(chain)
+            chain["blocks"] += 1
+            if not chain["valid"]:
+                continue
+            error = check_link(row, chain["head_hash"])
+            if error:
+                chain["valid"] = False
+                chain["broken_at"] = {"block_id": row.id, "error": error}
+            else:
+                chain["head_block_id"], chain["head_hash"] = row.id, row.hash_value
+        return results
+    finally:
+        db.close()
+
+
+def verify_parallel(workers: int = None, database_url: str = None) -> dict:
+    """Verifies every patient chain across a process pool."""
+    workers = max(1, workers or AUDIT_WORKERS)
+    database_url = database_url or connection.engine.url.render_as_string(hide_password=False)
+    started = time.monotonic()
+
+    db = connection.SessionLocal()
+    try:
+        counts = (
+            db.query(Block.patient_id, func.count(Block.id))
+            .group_by(Block.patient_id)
+            .order_by(Block.patient_id)
+            .all()
+        )
+    finally:
+        db.close()
+
+    chains = []
+    if counts:
+        ranges = _partition(counts, workers * PARTITIONS_PER_WORKER)
+        # spawn, not fork: the API process has live threads and pooled connections
+        with ProcessPoolExecutor(
+            max_workers=min(workers, len(ranges)),
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(database_url,),
+        ) as pool:
+            for part in pool.map(_verify_range, *zip(*ranges)):
+                chains.extend(part)
+
+    broken = [
+        {"patient_id": c["patient_id"], **c["broken_at"]}
+        for c in chains if not c["valid"]
+    ]
+    return {
+        "valid": not broken,
+        "chains": len(chains),
+        "blocks": sum(c["blocks"] for c in chains),
+        "workers": workers,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+        "broken": broken,
+        "results": chains,
+    }
+
+
+if __name__ == "__main__":
+    report = verify_parallel(int(sys.argv[1]) if len(sys.argv) > 1 else None)
+    print(
+        f"[AUDIT] {report['chains']} chains, {report['blocks']} blocks, "
+        f"{len(report['broken'])} broken, {report['elapsed_seconds']}s on {report['workers']} workers"
+    )
+    for b in report["broken"]:
+        print(f"[AUDIT] patient {b['patient_id']}: block {b['block_id']} - {b['error']}")
+    sys.exit(0 if report["valid"] else 1)
@@ -0,0 +1,275 @@
+# app/services/ciphertext_cache.py
+"""
+Content-addressed on-disk cache for record ciphertexts, keyed by CID.
+Only used in front of remote blob stores (IPFS); local stores are read directly.
+
+CIDs are immutable, so a cached object never goes stale; the only policy
+needed is a byte budget with LRU eviction. Files are sharded by a hash of
+the CID (CID prefixes like "Qm"/"baf" are not evenly distributed), written
+to a temp file and atomically renamed into place, and read back through
+mmap so hits never copy the ciphertext into the Python heap. The cache
+directory is read on first use and created on the first write.
+"""
+import os
+import mmap
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from app.services.storage_service import store as blob_store
+from app.utils.logger import logger
+
+CACHE_DIR = os.getenv("CIPHERTEXT_CACHE_DIR", os.path.join("cache", "ciphertext"))
+CACHE_MAX_BYTES = int(os.getenv("CIPHERTEXT_CACHE_MAX_BYTES", 2 * 1024 ** 3))
+READ_CHUNK_SIZE = 64 * 1024
+OVERSIZED_MEMORY = 10000  # CIDs remembered as larger than the whole budget
+
+
+class CiphertextCache:
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.enabled = max_bytes > 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # cid -> size, least recently used first
+        self._size = 0
+        self._filling = set()
+        self._oversized = OrderedDict()  # CIDs known not to fit the budget, oldest first
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "writes": 0, "errors": 0, "oversized": 0}
+        self._loaded = False  # the directory is only read (and created) on first use
+
+    def _path(self, cid: str) -> str:
+        shard = hashlib.sha256(cid.encode()).hexdigest()[:2]
+        return os.path.join(self.root, shard, cid)
+
+    def _ensure_loaded(self):
+        if self._loaded:
+            return
+        with self._lock:
+            if not self._loaded:
+                self._load()
+                self._loaded = True
+
+    def _load(self):
+        """Rebuilds the LRU index from disk, oldest access first."""
+        if not os.path.isdir(self.root):
+            return
+        entries = []
+        for shard in os.listdir(self.root):
+            shard_dir = os.path.join(self.root, shard)
+            if shard == "tmp" or not os.path.isdir(shard_dir):
+                continue
+            for cid in os.listdir(shard_dir):
+                st = os.stat(os.path.join(shard_dir, cid))
+                entries.append((st.st_atime, cid, st.st_size))
+        for _, cid, size in sorted(entries):
+            self._index[cid] = size
+            self._size += size
+        # leftovers from writes interrupted by a crash
+        tmp_dir = os.path.join(self.root, "tmp")
+        for name in os.listdir(tmp_dir) if os.path.isdir(tmp_dir) else ():
+            os.remove(os.path.join(tmp_dir, name))
+        self._evict()
+
+    def _evict(self):
+        while self._size > self.max_bytes and self._index:
+            cid, size = self._index.popitem(last=False)
+            self._size -= size
+            self._stats["evictions"] += 1
+            try:
+                os.remove(self._path(cid))
+            except FileNotFoundError:
+                pass
+
+    def open(self, cid: str, count: bool = True):
+        """Returns a read-only mmap of the cached object, or None on a miss."""
+        if not self.enabled:
+            return None
+        self._ensure_loaded()
+        with self._lock:
+            if cid not in self._index:
+                if count:
+                    self._stats["misses"] += 1
+                return None
+            self._index.move_to_end(cid)
+            if count:
+                self._stats["hits"] += 1
+        try:
+            with open(self._path(cid), "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return b""
+                return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except FileNotFoundError:
+            with self._lock:
+                self._size -= self._index.pop(cid, 0)
+            return None
+
+    def store(self, cid: str, chunks):
+        """
+        Writes a chunk stream to the cache and yields each chunk on to the caller.
+        The object only becomes visible once the stream has been fully consumed.
+        """
+        if not self.enabled:
+            yield from chunks
+            return
+        self._ensure_loaded()
+        tmp_dir = os.path.join(self.root, "tmp")
+        os.makedirs(tmp_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        size = 0
+        complete = False
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in chunks:
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        self._mark_oversized(cid)
+                        break  # larger than the whole budget, not worth caching
+                    f.write(chunk)
+                    yield chunk
+                else:
+                    complete = True
+        finally:
+            if complete:
+                self._commit(cid, tmp_path, size)
+            else:
+                os.remove(tmp_path)
+        if not complete and size > self.max_bytes:
+            yield chunk
+            yield from chunks
+
+    def _commit(self, cid: str, tmp_path: str, size: int):
+        path = self._path(cid)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except OSError:
+            logger.exception("Failed to commit %s to the ciphertext cache", cid)
+            os.remove(tmp_path)
+            with self._lock:
+                self._stats["errors"] += 1
+            return
+        with self._lock:
+            self._size += size - self._index.pop(cid, 0)
+            self._index[cid] = size
+            self._stats["writes"] += 1
+            self._evict()
+
+    def _mark_oversized(self, cid: str):
+        with self._lock:
+            self._oversized[cid] = True
+            self._oversized.move_to_end(cid)
+            if len(self._oversized) > OVERSIZED_MEMORY:
+                self._oversized.popitem(last=False)
+            self._stats["oversized"] += 1
+
+    def fits(self, cid: str, size_of) -> bool:
+        """
+        Whether an object can be cached at all. `size_of()` returns its size and
+        is only called for CIDs not already known to exceed the budget.
+        """
+        if not self.enabled:
+            return False
+        with self._lock:
+            if cid in self._oversized:
+                return False
+        try:
+            size = size_of()
+        except Exception:
+            return False  # unknown size: not worth risking a full download
+        if size > self.max_bytes:
+            self._mark_oversized(cid)
+            return False
+        return True
+
+    def fill_in_background(self, cid: str, fetch, size_of=None):
+        """
+        Caches an object on a daemon thread (deduplicated per CID). With `size_of`
+        the object's size is checked first and objects over the budget are skipped.
+        """
+        if not self.enabled:
+            return
+        self._ensure_loaded()
+        with self._lock:
+            if cid in self._index or cid in self._filling or cid in self._oversized:
+                return
+            self._filling.add(cid)
+
+        def run():
+            try:
+                if size_of is not None and not self.fits(cid, size_of):
+                    return
+                for _ in self.store(cid, fetch()):
+                    pass
+            except Exception:
+                logger.exception("Background fill of %s failed", cid)
+                with self._lock:
+                    self._stats["errors"] += 1
+            finally:
+                with self._lock:
+                    self._filling.discard(cid)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def stats(self) -> dict:
+        if self.enabled:
+            self._ensure_loaded()
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": round(self._stats["hits"] / lookups, 4) if lookups else None,
+                "entries": len(self._index),
+                "bytes": self._size,
+                "max_bytes": self.max_bytes,
+            }
+
+
+cache = CiphertextCache(CACHE_DIR, CACHE_MAX_BYTES)
+
+
+def _mmap_chunks(buf, offset: int, length: int, chunk_size: int):
+    try:
+        end = len(buf) if length is None else min(offset + length, len(buf))
+        view = memoryview(buf)
+        try:
+            for pos in range(offset, end, chunk_size):
+                yield bytes(view[pos:min(pos + chunk_size, end)])
+        finally:
+            view.release()
+    finally:
+        if isinstance(buf, mmap.mmap):
+            buf.close()
+
+
+def read(cid: str):
+    """Returns the whole ciphertext (mmap on a hit), fetching it and caching it if it fits the budget on a miss."""
+    if not blob_store.cacheable:
+        return blob_store.get(cid)
+    buf = cache.open(cid)
+    if buf is not None:
+        return buf
+    if not cache.fits(cid, lambda: blob_store.stat(cid)["size"]):
+        return blob_store.get(cid)
+    for _ in cache.store(cid, blob_store.stream(cid)):
+        pass
+    buf = cache.open(cid, count=False)
+    return buf if buf is not None else blob_store.get(cid)
+
+
+def stream(cid: str, offset: int = 0, length: int = None, chunk_size: int = READ_CHUNK_SIZE):
+    """
+    Streams the ciphertext (or a byte range of it) through the cache.
+    Full reads on a miss are written to the cache as they stream; ranged
+    misses are served from the gateway while the object is cached in the background,
+    unless it is larger than the whole cache budget.
+    """
+    if not blob_store.cacheable:
+        return blob_store.stream(cid, offset, length, chunk_size=chunk_size)
+    buf = cache.open(cid)
+    if buf is not None:
+        return _mmap_chunks(buf, offset, length, chunk_size)
+    if offset == 0 and length is None:
+        return cache.store(cid, blob_store.stream(cid, chunk_size=chunk_size))
+    cache.fill_in_background(cid, lambda: blob_store.stream(cid), lambda: blob_store.stat(cid)["size"])
+    return blob_store.stream(cid, offset, length, chunk_size=chunk_size)
@@ -0,0 +1,164 @@
+# app/services/grant_expiry_service.py
+"""
+Expires time-bounded access grants (AccessControl.expires_at).
+
+Each worker keeps a min-heap of the expiry times due within
+GRANT_EXPIRY_HORIZON seconds, reloaded from the expires_at index once per
+horizon. New grants are pushed with schedule(). A daemon thread sleeps until
+the earliest entry and then expires every due grant in batches of
+GRANT_EXPIRY_BATCH_SIZE. For each batch it:
+  - deletes the rows, and with them the wrapped keys,
+  - bulk-inserts one AccessLog entry per grant,
+  - commits, then invalidates the affected doctors in the authorization index.
+
+The heap only decides when to wake. Processing selects due rows from the
+database, so a wake-up also expires grants scheduled by other workers. Rows
+are locked with SKIP LOCKED so that two workers do not expire the same grant.
+Between expiry and processing the authorization index already refuses the
+grant, because it compares expires_at on every check.
+"""
+import os
+import heapq
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy import insert
+from app.database import connection
+from app.models.access_control import AccessControl
+from app.models.access_log import AccessLog
+from app.services.authz_index_service import index as authz_index
+from app.utils.logger import logger
+
+EXPIRY_BATCH_SIZE = int(os.getenv("GRANT_EXPIRY_BATCH_SIZE", 500))
+EXPIRY_HORIZON = timedelta(seconds=float(os.getenv("GRANT_EXPIRY_HORIZON", 3600)))
+EXPIRY_RETRY_SECONDS = 30
+
+
+class GrantExpiryScheduler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._heap = []  # expiry datetimes (UTC) before _loaded_until
+        self._loaded_until = None
+        self._stats = {"expired": 0, "batches": 0, "scheduled": 0, "errors": 0}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="grant-expiry", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def schedule(self, expires_at: datetime):
+        """Registers a new grant's expiry; call after the grant is committed."""
+        with self._lock:
+            if self._loaded_until is None or expires_at >= self._loaded_until:
+                return  # picked up by the next horizon load
+            earliest = not self._heap or expires_at < self._heap[0]
+            heapq.heappush(self._heap, expires_at)
+            self._stats["scheduled"] += 1
+        if earliest:
+            self._wake.set()
+
+    def _load_horizon(self, now: datetime):
+        until = now + EXPIRY_HORIZON
+        db = connection.SessionLocal()
+        try:
+            due = [
+                expires_at for (expires_at,) in db.query(AccessControl.expires_at).filter(
+                    AccessControl.expires_at.isnot(None),
+                    AccessControl.expires_at < until,
+                )
+            ]
+        finally:
+            db.close()
+        heapq.heapify(due)
+        with self._lock:
+            self._heap = due
+            self._loaded_until = until
+
+    def _loop(self):
+        while not self._stop.is_set():
+            timeout = EXPIRY_RETRY_SECONDS
+            try:
+                now = datetime.utcnow()
+                if self._loaded_until is None or now >= self._loaded_until:
+                    self._load_horizon(now)
+                with self._lock:
+                    next_due = self._heap[0] if self._heap else self._loaded_until
+                if next_due <= now:
+                    self.expire_due(now)
+                    continue
+                timeout = (min(next_due, self._loaded_until) - now).total_seconds()
+            except Exception:
+                logger.exception("Grant expiry failed")
+                with self._lock:
+                    self._stats["errors"] += 1
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def expire_due(self, now: datetime = None) -> int:
+        """Expires every grant due at `now`, in batches; returns how many were expired."""
+        now = now or datetime.utcnow()
+        expired = 0
+        while True:
+            count = self._expire_batch(now)
+            expired += count
+            if count < EXPIRY_BATCH_SIZE:
+                break
+        with self._lock:
+            while self._heap and self._heap[0] <= now:
+                heapq.heappop(self._heap)
+        return expired
+
+    def _expire_batch(self, now: datetime) -> int:
+        db = connection.SessionLocal()
+        try:
+            rows = (
+                db.query(AccessControl.id, AccessControl.patient_id, AccessControl.doctor_id, AccessControl.record_id)
+                .filter(AccessControl.expires_at <= now)
+                .order_by(AccessControl.expires_at)
+                .limit(EXPIRY_BATCH_SIZE)
+                .with_for_update(skip_locked=True)
+                .all()
+            )
+            if not rows:
+                return 0
+            db.query(AccessControl).filter(AccessControl.id.in_([r.id for r in rows])).delete(synchronize_session=False)
+            db.execute(insert(AccessLog), [
+                {
+                    "patient_id": r.patient_id,
+                    "doctor_id": r.doctor_id,
+                    "record_id": r.record_id,
+                    "action": f"Access expired for record ID {r.record_id}",
+                    "timestamp": now,
+                }
+                for r in rows
+            ])
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+        authz_index.invalidate(*{r.doctor_id for r in rows})
+        with self._lock:
+            self._stats["expired"] += len(rows)
+            self._stats["batches"] += 1
+        return len(rows)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._heap)
+            stats["next_expiry"] = self._heap[0].isoformat() if self._heap else None
+            stats["horizon_until"] = self._loaded_until.isoformat() if self._loaded_until else None
+        return stats
+
+
+scheduler = GrantExpiryScheduler()
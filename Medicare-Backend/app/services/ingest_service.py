@@ -0,0 +1,214 @@
+# app/services/ingest_service.py
+"""
+Background ingest for async record uploads.
+
+The upload route spools the ciphertext to local disk and creates a
+`pending` Record; a bounded worker pool then pins the file to blob storage,
+fills in `ipfs_cid`, appends the upload Block and marks the record ready.
+Job status is the record's status in the database, so any worker can report it.
+
+Spool files are named `<record_id>.part`, written before the record is committed and
+removed once the record is ready or failed. The process that owns a spool file
+holds an exclusive flock on it until then. At startup recover():
+  - re-queues pending records whose spool file is not locked by a live process,
+  - marks pending records without a spool file as failed,
+  - deletes spool files left behind by finished records or abandoned uploads.
+Without fcntl (Windows) files are not locked, and recover() assumes it is the
+only worker using the spool directory.
+"""
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from app.database import connection
+from app.models.record import Record
+from app.services.storage_service import store as blob_store
+from app.services.blockchain_service import record_data_hash
+from app.services.block_append_service import appender as block_appender
+from app.utils.logger import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+SPOOL_DIR = os.getenv("INGEST_SPOOL_DIR", os.path.join("uploads", "ingest"))
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", 4))
+INGEST_QUEUE_LIMIT = int(os.getenv("INGEST_QUEUE_LIMIT", 100))
+
+_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+_slots = threading.BoundedSemaphore(INGEST_QUEUE_LIMIT)
+
+
+def reserve_slot() -> bool:
+    """Reserves a place in the queue; every reserved slot must be submitted or released."""
+    return _slots.acquire(blocking=False)
+
+
+def release_slot():
+    _slots.release()
+
+
+def _try_lock(f) -> bool:
+    if fcntl is None:
+        return True
+    try:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return True
+    except OSError:
+        return False
+
+
+def _spool_path(record_id: int) -> str:
+    return os.path.join(SPOOL_DIR, f"{record_id}.part")
+
+
+def spool(fileobj, record_id: int):
+    """Copies an upload to the record's spool file, locked, and returns it open.
+
+    Call after the pending record is flushed and before it is committed.
+    """
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    f = open(_spool_path(record_id), "w+b")
+    _try_lock(f)
+    try:
+        shutil.copyfileobj(fileobj, f, 1024 * 1024)
+    except Exception:
+        discard(f)
+        raise
+    return f
+
+
+def discard(spool_file):
+    """Deletes a spooled upload that will not be submitted."""
+    try:
+        os.remove(spool_file.name)
+    except FileNotFoundError:
+        pass
+    spool_file.close()
+
+
+def submit(record_id: int, spool_file):
+    """Queues a spooled upload for pinning, using a slot taken with reserve_slot()."""
+    _executor.submit(_run, record_id, spool_file, True)
+
+
+def get_job(db, record_id: int):
+    """Returns the status of an async upload, read from its record."""
+    record = db.query(Record).filter(Record.id == record_id).first()
+    if not record:
+        return None
+    return {
+        "job_id": record.id,
+        "record_id": record.id,
+        "patient_id": record.patient_id,
+        "doctor_id": record.doctor_id,
+        "filename": record.filename,
+        "status": record.status or "ready",
+        "ipfs_cid": record.ipfs_cid or None,
+        "block_id": record.block_id,
+        "created_at": record.uploaded_at.isoformat() if record.uploaded_at else None,
+    }
+
+
+def _run(record_id: int, spool_file, reserved: bool):
+    db = connection.SessionLocal()
+    try:
+        record = db.query(Record).filter(Record.id == record_id).first()
+        if not record:
+            raise RuntimeError(f"Record {record_id} no longer exists")
+        filename, patient_id = record.filename, record.patient_id
+        doctor_id = record.doctor_id or 0
+        uploader_id = record.doctor_id or record.patient_id
+        db.rollback()
+
+        spool_file.seek(0)
+        cid = blob_store.put_stream(filename, spool_file)
+
+        db.query(Record).filter(Record.id == record_id).update({"ipfs_cid": cid}, synchronize_session=False)
+        db.commit()
+        # the record turns ready in the same transaction as its block
+        block_appender.append(
+            doctor_id=doctor_id,
+            patient_id=patient_id,
+            record_id=record_id,
+            ipfs_cid=cid,
+            data_hash=record_data_hash(cid, record_id, uploader_id, patient_id),
+            mark_record_ready=True,
+        )
+    except Exception:
+        logger.exception("Ingest of record %s failed", record_id)
+        db.rollback()
+        try:
+            db.query(Record).filter(Record.id == record_id, Record.status == "pending").update(
+                {"status": "failed"}, synchronize_session=False
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+    finally:
+        db.close()
+        if reserved:
+            _slots.release()
+        discard(spool_file)
+
+
+def recover() -> dict:
+    """Re-queues or fails pending async uploads left by a stopped process; call at startup."""
+    requeued, failed, removed = [], [], 0
+    claimed = []  # (record id, locked spool file)
+    os.makedirs(SPOOL_DIR, exist_ok=True)
+    db = connection.SessionLocal()
+    try:
+        pending = [r for (r,) in db.query(Record.id).filter(Record.status == "pending")]
+        db.rollback()
+        names = set(os.listdir(SPOOL_DIR))
+        for record_id in pending:
+            name = f"{record_id}.part"
+            if name not in names:
+                failed.append(record_id)
+                continue
+            names.discard(name)
+            try:
+                f = open(os.path.join(SPOOL_DIR, name), "r+b")
+            except FileNotFoundError:
+                continue  # finished since the listing
+            if not _try_lock(f):
+                f.close()  # owned by a live process
+                continue
+            status = db.query(Record.status).filter(Record.id == record_id).scalar()
+            db.rollback()
+            if os.fstat(f.fileno()).st_nlink == 0 or status != "pending":
+                f.close()  # finished while we waited for the lock
+                continue
+            claimed.append((record_id, f))
+
+        if failed:
+            db.query(Record).filter(Record.id.in_(failed), Record.status == "pending").update(
+                {"status": "failed"}, synchronize_session=False
+            )
+            db.commit()
+        while claimed:
+            record_id, f = claimed.pop()
+            _executor.submit(_run, record_id, f, False)
+            requeued.append(record_id)
+
+        # anything else is a finished record's or an abandoned upload's file, unless it is locked
+        for name in names:
+            try:
+                f = open(os.path.join(SPOOL_DIR, name), "r+b")
+            except (FileNotFoundError, IsADirectoryError):
+                continue
+            if _try_lock(f):
+                discard(f)
+                removed += 1
+            else:
+                f.close()
+    finally:
+        db.close()
+        for _, f in claimed:
+            f.close()  # not submitted: leave them for the next startup
+
+    if requeued or failed or removed:
+        logger.info("Ingest recovery: requeued %s, failed %s, removed %d spool files", requeued, failed, removed)
+    return {"requeued": requeued, "failed": failed, "removed": removed}
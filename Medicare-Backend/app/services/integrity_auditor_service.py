@@ -0,0 +1,254 @@
+# app/services/integrity_auditor_service.py
+"""
+Continuous, in-process ledger integrity auditor.
+
+Every INTEGRITY_AUDIT_INTERVAL seconds a daemon thread:
+  1. verifies blocks appended since the last checkpoint (incremental verify_chain),
+  2. re-verifies INTEGRITY_AUDIT_SAMPLES random older chain segments of
+     INTEGRITY_AUDIT_SEGMENT_LENGTH blocks each, from their predecessor's hash,
+  3. checks that each new or sampled block's Record.ipfs_cid still matches Block.ipfs_cid.
+     "New" is above a watermark kept in audit_watermarks, shared by all workers and
+     kept across restarts.
+
+Each worker runs its first audit after a random delay within one interval,
+so that workers started together do not all audit at once.
+
+Findings are logged at ERROR level and kept with the run timings for
+/admin/integrity/status. INTEGRITY_AUDIT_CPU_BUDGET caps the share of wall
+time a pass spends working, database queries included (0.2 = busy at most 20%
+of the time): after each unit of work it sleeps long enough to get back under budget.
+"""
+import os
+import time
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from app.database import connection
+from app.models.blockchain import Block, AuditWatermark
+from app.models.record import Record
+from app.services.blockchain_service import CHAIN_COLUMNS, check_link, verify_chain
+from app.utils.logger import logger
+
+AUDIT_INTERVAL = float(os.getenv("INTEGRITY_AUDIT_INTERVAL", 300))  # seconds, 0 disables
+AUDIT_SAMPLES = int(os.getenv("INTEGRITY_AUDIT_SAMPLES", 20))
+AUDIT_SEGMENT_LENGTH = int(os.getenv("INTEGRITY_AUDIT_SEGMENT_LENGTH", 50))
+AUDIT_CPU_BUDGET = float(os.getenv("INTEGRITY_AUDIT_CPU_BUDGET", 0.2))
+AUDIT_CID_BATCH = 5000
+CID_WATERMARK = "cid_check"
+RUN_HISTORY = 20
+
+
+class _Budget:
+    """
+    Sleeps whenever the pass has been working for more than `share` of the wall
+    time since start. Work is any time not slept here: hashing and database waits alike.
+    """
+
+    def __init__(self, share: float):
+        self.share = share
+        self.wall = time.monotonic()
+        self.slept = 0.0
+
+    def throttle(self):
+        if self.share <= 0 or self.share >= 1:
+            return
+        elapsed = time.monotonic() - self.wall
+        owed = (elapsed - self.slept) / self.share - elapsed
+        if owed > 0:
+            time.sleep(owed)
+            self.slept += owed
+
+
+def _load_watermark(db) -> int:
+    row = db.query(AuditWatermark.last_block_id).filter(AuditWatermark.name == CID_WATERMARK).first()
+    return row.last_block_id if row else 0
+
+
+def _save_watermark(db, block_id: int):
+    """Moves the CID watermark forward (another worker may already be past it) and commits."""
+    values = {"last_block_id": block_id, "updated_at": datetime.utcnow()}
+    watermark = db.query(AuditWatermark).filter(AuditWatermark.name == CID_WATERMARK)
+    advance = watermark.filter(AuditWatermark.last_block_id < block_id)
+    if not advance.update(values, synchronize_session=False) and not watermark.first():
+        try:
+            with db.begin_nested():
+                db.add(AuditWatermark(name=CID_WATERMARK, **values))
+        except IntegrityError:
+            advance.update(values, synchronize_session=False)  # created concurrently
+    db.commit()
+
+
+class IntegrityAuditor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._runs = deque(maxlen=RUN_HISTORY)
+        self._running = False
+
+    def start(self):
+        if AUDIT_INTERVAL <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="integrity-audit", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def is_active(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop.is_set()
+
+    def is_running(self) -> bool:
+        with self._lock:
+            return self._running
+
+    def trigger(self) -> bool:
+        """Wakes the audit thread for a run now; returns False if the thread is not active."""
+        if not self.is_active():
+            return False
+        self._wake.set()
+        return True
+
+    def _loop(self):
+        delay = random.uniform(0, AUDIT_INTERVAL)  # staggers the first run across workers
+        while not self._stop.is_set():
+            self._wake.wait(delay)
+            delay = AUDIT_INTERVAL
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.run_once()
+            except Exception:
+                logger.exception("Integrity audit failed")
+
+    def run_once(self) -> dict:
+        budget = _Budget(AUDIT_CPU_BUDGET)
+        started_at = datetime.utcnow()
+        timings = {}
+        with self._lock:
+            self._running = True
+        db = connection.SessionLocal()
+        try:
+            t = time.monotonic()
+            recent = verify_chain(db, on_batch=budget.throttle)
+            timings["recent_seconds"] = round(time.monotonic() - t, 3)
+            budget.throttle()
+
+            t = time.monotonic()
+            sampled, sample_broken, sampled_ids = self._sample_segments(db, budget)
+            timings["sample_seconds"] = round(time.monotonic() - t, 3)
+
+            t = time.monotonic()
+            cid_mismatches, cid_checked = self._check_cids(db, sampled_ids, budget)
+            timings["cid_seconds"] = round(time.monotonic() - t, 3)
+        finally:
+            db.close()
+            with self._lock:
+                self._running = False
+
+        findings = recent["broken"] + sample_broken + cid_mismatches
+        for finding in findings:
+            logger.error("[INTEGRITY] block %s (patient %s): %s",
+                         finding.get("block_id"), finding.get("patient_id"), finding["error"])
+        result = {
+            "started_at": started_at.isoformat(),
+            "valid": not findings,
+            "recent_blocks_checked": recent["blocks_checked"],
+            "segments_sampled": sampled,
+            "cids_checked": cid_checked,
+            "findings": findings,
+            "timings": {**timings, "throttled_seconds": round(budget.slept, 3)},
+        }
+        with self._lock:
+            self._runs.append(result)
+        return result
+
+    def _sample_segments(self, db, budget: _Budget):
+        low, high = db.query(func.min(Block.id), func.max(Block.id)).one()
+        if low is None or AUDIT_SAMPLES <= 0:
+            return 0, [], []
+        broken, ids = [], []
+        for _ in range(AUDIT_SAMPLES):
+            start = db.query(Block.id, Block.patient_id).filter(Block.id >= random.randint(low, high)).order_by(Block.id).first()
+            predecessor = (
+                db.query(Block.hash_value)
+                .filter(Block.patient_id == start.patient_id, Block.id < start.id)
+                .order_by(Block.id.desc())
+                .first()
+            )
+            segment = (
+                db.query(*CHAIN_COLUMNS)
+                .filter(Block.patient_id == start.patient_id, Block.id >= start.id)
+                .order_by(Block.id)
+                .limit(AUDIT_SEGMENT_LENGTH)
+                .all()
+            )
+            head_hash = predecessor.hash_value if predecessor else "0"
+            for row in segment:
+                ids.append(row.id)
+                error = check_link(row, head_hash)
+                if error:
+                    broken.append({"patient_id": row.patient_id, "block_id": row.id, "error": f"sampled segment: {error}"})
+                    break
+                head_hash = row.hash_value
+            budget.throttle()
+        return AUDIT_SAMPLES, broken, ids
+
+    def _check_cids(self, db, sampled_ids: list, budget: _Budget):
+        """Cross-checks Block.ipfs_cid against Record.ipfs_cid for new and sampled blocks."""
+        mismatches, checked = [], 0
+        base = (
+            db.query(Block.id, Block.patient_id, Block.record_id, Block.ipfs_cid, Record.ipfs_cid.label("record_cid"))
+            .join(Record, Record.id == Block.record_id)
+        )
+        batches = [base.filter(Block.id.in_(sampled_ids[i:i + 1000])) for i in range(0, len(sampled_ids), 1000)]
+        watermark = _load_watermark(db)
+        while True:
+            rows = base.filter(Block.id > watermark).order_by(Block.id).limit(AUDIT_CID_BATCH).all()
+            mismatches += self._cid_mismatches(rows)
+            checked += len(rows)
+            if rows:
+                watermark = rows[-1].id
+                _save_watermark(db, watermark)
+            budget.throttle()
+            if len(rows) < AUDIT_CID_BATCH:
+                break
+        for query in batches:
+            rows = query.all()
+            mismatches += self._cid_mismatches(rows)
+            checked += len(rows)
+            budget.throttle()
+        return mismatches, checked
+
+    @staticmethod
+    def _cid_mismatches(rows) -> list:
+        return [
+            {"patient_id": r.patient_id, "block_id": r.id,
+             "error": f"record {r.record_id} CID {r.record_cid} does not match block CID {r.ipfs_cid}"}
+            for r in rows if r.record_cid != r.ipfs_cid
+        ]
+
+    def status(self) -> dict:
+        with self._lock:
+            runs = list(self._runs)
+            running = self._running
+        return {
+            "enabled": AUDIT_INTERVAL > 0,
+            "interval_seconds": AUDIT_INTERVAL,
+            "cpu_budget": AUDIT_CPU_BUDGET,
+            "running": running,
+            "last_run": runs[-1] if runs else None,
+            "recent_runs": [
+                {k: r[k] for k in ("started_at", "valid", "recent_blocks_checked", "timings")}
+                for r in reversed(runs)
+            ],
+        }
+
+
+auditor = IntegrityAuditor()
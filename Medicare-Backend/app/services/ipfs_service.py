@@ -1,18 +1,136 @@
 import os
+import time
+import uuid
+import random
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from app.utils.logger import logger
 
 IPFS_API = os.getenv("IPFS_API", "http://127.0.0.1:5001")
+IPFS_GATEWAY = os.getenv("IPFS_GATEWAY", "http://127.0.0.1:8080")
+UPLOAD_CHUNK_SIZE = int(os.getenv("IPFS_UPLOAD_CHUNK_SIZE", 1024 * 1024))
+DOWNLOAD_CHUNK_SIZE = int(os.getenv("IPFS_DOWNLOAD_CHUNK_SIZE", 64 * 1024))
+
+POOL_SIZE = int(os.getenv("IPFS_POOL_SIZE", 20))
+CONNECT_TIMEOUT = float(os.getenv("IPFS_CONNECT_TIMEOUT", 3.05))
+READ_TIMEOUT = float(os.getenv("IPFS_READ_TIMEOUT", 60))
+MAX_RETRIES = int(os.getenv("IPFS_MAX_RETRIES", 3))
+RETRY_BACKOFF = float(os.getenv("IPFS_RETRY_BACKOFF", 0.2))
+RETRY_STATUSES = {502, 503, 504}
+
+# One keep-alive session for all API and gateway traffic in this worker.
+# pool_block makes callers wait for a free connection instead of opening extra ones.
+_session = requests.Session()
+_adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE, pool_block=True, max_retries=0)
+_session.mount("http://", _adapter)
+_session.mount("https://", _adapter)
+
+_metrics_lock = threading.Lock()
+_metrics = {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0, "bytes_sent": 0}
+
+
+def _count(name: str, value: int = 1):
+    with _metrics_lock:
+        _metrics[name] += value
+
+
+def _backoff(attempt: int) -> float:
+    # exponential backoff with full jitter
+    return random.uniform(0, RETRY_BACKOFF * (2 ** attempt))
+
+
+def _request(method: str, url: str, rewind=None, **kwargs):
+    """
+    Sends a request through the pooled session, retrying connection errors,
+    timeouts and 502/503/504 responses with jittered backoff.
+    `rewind` is called before each retry to reset a streamed request body;
+    a streamed body without one is sent only once.
+    """
+    kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+    # a consumed body generator cannot be sent again
+    replayable = kwargs.get("data") is None or rewind is not None
+    attempt = 0
+    while True:
+        _count("requests")
+        _count("in_flight")
+        try:
+            response = _session.request(method, url, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            if attempt >= MAX_RETRIES or not replayable:
+                _count("errors")
+                raise
+        else:
+            if response.status_code not in RETRY_STATUSES or attempt >= MAX_RETRIES or not replayable:
+                return response
+            response.close()
+        finally:
+            _count("in_flight", -1)
+
+        _count("retries")
+        time.sleep(_backoff(attempt))
+        attempt += 1
+        if rewind:
+            kwargs["data"] = rewind()
+
+
+def pool_stats() -> dict:
+    """Request counters plus per-host connection pool usage."""
+    with _metrics_lock:
+        stats = dict(_metrics)
+    pools = []
+    manager = _adapter.poolmanager
+    for key in list(manager.pools.keys()):
+        pool = manager.pools.get(key)
+        if pool is None:
+            continue
+        idle = pool.pool.qsize() if pool.pool is not None else 0
+        pools.append({
+            "host": f"{pool.scheme}://{pool.host}:{pool.port}",
+            "maxsize": POOL_SIZE,
+            "idle": idle,
+            "connections_opened": pool.num_connections,
+            "requests": pool.num_requests,
+        })
+    stats["pool_size"] = POOL_SIZE
+    stats["pools"] = pools
+    return stats
+
+
+def slice_chunks(chunks, skip: int, limit: int = None):
+    """Drops the first `skip` bytes of a chunk stream and stops after `limit` bytes."""
+    for chunk in chunks:
+        if skip:
+            if len(chunk) <= skip:
+                skip -= len(chunk)
+                continue
+            chunk = chunk[skip:]
+            skip = 0
+        if limit is not None:
+            if len(chunk) >= limit:
+                yield chunk[:limit]
+                return
+            limit -= len(chunk)
+        yield chunk
+
+
+def _connection_error():
+    return Exception(
+        f"Failed to connect to IPFS at {IPFS_API}. "
+        "Make sure your IPFS node or IPFS Desktop is running."
+    )
+
 
 def add_bytes(filename: str, data: bytes) -> dict:
     """
-    Uploads bytes to a local IPFS node running on 127.0.0.1:5001.
+    Uploads bytes to the local IPFS node.
     Returns a dictionary containing the CID.
     """
     url = f"{IPFS_API}/api/v0/add?pin=true&wrap-with-directory=false"
     files = {"file": (filename, data)}
 
     try:
-        response = requests.post(url, files=files, timeout=60)
+        response = _request("POST", url, files=files)
         response.raise_for_status()  # Raise exception if status != 200
         result = response.json()
         cid = result.get("Hash")
@@ -20,13 +138,118 @@ def add_bytes(filename: str, data: bytes) -> dict:
         if not cid:
             raise Exception("CID not found in IPFS response")
 
-        print(f"Uploaded {filename} to IPFS → CID: {cid}")
+        logger.info("Uploaded %s to IPFS -> CID %s", filename, cid)
         return {"cid": cid}
 
     except requests.exceptions.ConnectionError:
-        raise Exception(
-            "Failed to connect to IPFS at 127.0.0.1:5001. "
-            "Make sure your IPFS node or IPFS Desktop is running."
+        raise _connection_error()
+    except Exception as e:
+        raise Exception(f"IPFS upload failed: {e}")
+
+
+def _multipart_body(filename: str, fileobj, boundary: str, chunk_size: int):
+    """
+    Yields a multipart/form-data body for a single file field, reading
+    `fileobj` chunk by chunk so only one chunk is held in memory at a time.
+    """
+    safe_name = (filename or "file").replace('"', "")
+    yield (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{safe_name}"\r\n'
+        f"Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            break
+        _count("bytes_sent", len(chunk))
+        yield chunk
+    yield f"\r\n--{boundary}--\r\n".encode()
+
+
+def add_stream(filename: str, fileobj, chunk_size: int = UPLOAD_CHUNK_SIZE) -> dict:
+    """
+    Uploads a file-like object to IPFS as a chunked multipart POST.
+    Memory use is bounded by `chunk_size` regardless of the file size.
+    Returns a dictionary containing the CID.
+    """
+    url = f"{IPFS_API}/api/v0/add?pin=true&wrap-with-directory=false"
+    boundary = uuid.uuid4().hex
+    start = fileobj.tell() if fileobj.seekable() else None
+
+    def body():
+        return _multipart_body(filename, fileobj, boundary, chunk_size)
+
+    def rewind():
+        fileobj.seek(start)
+        return body()
+
+    try:
+        response = _request(
+            "POST",
+            url,
+            rewind=rewind if start is not None else None,
+            data=body(),
+            headers={"Content-Type": f"multipart/form-data; boundary={boundary}"},
         )
+        response.raise_for_status()
+        result = response.json()
+        cid = result.get("Hash")
+
+        if not cid:
+            raise Exception("CID not found in IPFS response")
+
+        logger.info("Streamed %s to IPFS -> CID %s", filename, cid)
+        return {"cid": cid}
+
+    except requests.exceptions.ConnectionError:
+        raise _connection_error()
     except Exception as e:
         raise Exception(f"IPFS upload failed: {e}")
+
+
+def cat(cid: str) -> bytes:
+    """Downloads a whole object from the gateway."""
+    response = _request("GET", f"{IPFS_GATEWAY}/ipfs/{cid}")
+    response.raise_for_status()
+    return response.content
+
+
+def stat(cid: str) -> int:
+    """Returns the object size in bytes, from a gateway HEAD request."""
+    response = _request("HEAD", f"{IPFS_GATEWAY}/ipfs/{cid}")
+    if response.status_code == 404:
+        raise FileNotFoundError(cid)
+    response.raise_for_status()
+    return int(response.headers.get("Content-Length", 0))
+
+
+def cat_stream(cid: str, offset: int = 0, length: int = None, chunk_size: int = DOWNLOAD_CHUNK_SIZE):
+    """
+    Streams an object (or the byte range offset..offset+length) from the gateway.
+    The request is sent eagerly so gateway errors surface to the caller
+    before the first chunk is consumed.
+    """
+    headers = {}
+    if offset or length is not None:
+        end = "" if length is None else offset + length - 1
+        headers["Range"] = f"bytes={offset}-{end}"
+
+    response = _request("GET", f"{IPFS_GATEWAY}/ipfs/{cid}", headers=headers, stream=True)
+    try:
+        response.raise_for_status()
+    except Exception:
+        response.close()
+        raise
+
+    def chunks():
+        try:
+            body = response.iter_content(chunk_size=chunk_size)
+            if headers and response.status_code != 206:
+                # gateway ignored the Range header, cut the range out ourselves
+                body = slice_chunks(body, offset, length)
+            yield from body
+        finally:
+            response.close()
+
+    return chunks()
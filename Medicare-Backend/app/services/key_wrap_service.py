@@ -0,0 +1,76 @@
+# app/services/key_wrap_service.py
+"""
+Record key wrapping: ECDH(P-256) with an ephemeral key, SHA-256 of the shared
+secret as KEK, AES-GCM over the record's AES key. This is the scheme of the
+patient and doctor bundles in Record.encryption_key and of the wrapped keys in
+access_control.
+
+For batch grants the patient key is parsed once, KEKs are cached per ephemeral
+key, and each recipient gets one ephemeral key for the whole batch (one ECDH per
+recipient instead of one per record, with a fresh nonce per wrapped key).
+"""
+import os
+import json
+import base64
+from cryptography.hazmat.primitives import serialization, hashes
+from cryptography.hazmat.primitives.asymmetric import ec
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+
+def _kek(private_key, public_key) -> bytes:
+    h = hashes.Hash(hashes.SHA256())
+    h.update(private_key.exchange(ec.ECDH(), public_key))
+    return h.finalize()
+
+
+def load_private_key(private_key_pem: str):
+    """Parses a PEM private key; raises ValueError if it is not one."""
+    return serialization.load_pem_private_key(private_key_pem.encode(), password=None)
+
+
+def patient_bundle(encryption_key) -> dict:
+    """Returns the patient's wrapped-key bundle of a record; raises ValueError if malformed."""
+    enc = json.loads(encryption_key) if isinstance(encryption_key, str) else encryption_key
+    if not isinstance(enc, dict):
+        raise ValueError("encryption key is not an object")
+    bundle = enc.get("patient_bundle", enc)
+    try:
+        return {k: bundle[k] for k in ("wrapped_b64", "nonce_b64", "eph_pub_spki_b64")}
+    except KeyError as e:
+        raise ValueError(f"missing {e.args[0]}")
+
+
+class Unwrapper:
+    """Unwraps many bundles with one private key, deriving each ephemeral key's KEK once."""
+
+    def __init__(self, private_key):
+        self.private_key = private_key
+        self._keks = {}
+
+    def unwrap(self, bundle: dict) -> bytes:
+        eph = bundle["eph_pub_spki_b64"]
+        kek = self._keks.get(eph)
+        if kek is None:
+            kek = self._keks[eph] = _kek(self.private_key, serialization.load_der_public_key(base64.b64decode(eph)))
+        return AESGCM(kek).decrypt(base64.b64decode(bundle["nonce_b64"]), base64.b64decode(bundle["wrapped_b64"]), None)
+
+
+class RecipientWrapper:
+    """Wraps keys for one recipient public key; one ephemeral key per wrapper."""
+
+    def __init__(self, public_key_pem: str):
+        eph_priv = ec.generate_private_key(ec.SECP256R1())
+        self._aead = AESGCM(_kek(eph_priv, serialization.load_pem_public_key(public_key_pem.encode())))
+        self.eph_pub_b64 = base64.b64encode(eph_priv.public_key().public_bytes(
+            encoding=serialization.Encoding.DER,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo,
+        )).decode()
+
+    def wrap(self, aes_key: bytes) -> dict:
+        """Returns the access_control key columns for `aes_key`."""
+        nonce = os.urandom(12)
+        return {
+            "encrypted_aes_key": base64.b64encode(self._aead.encrypt(nonce, aes_key, None)).decode(),
+            "nonce_b64": base64.b64encode(nonce).decode(),
+            "eph_pub_b64": self.eph_pub_b64,
+        }
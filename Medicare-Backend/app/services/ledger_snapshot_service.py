@@ -0,0 +1,340 @@
+# app/services/ledger_snapshot_service.py
+"""
+Append-only binary snapshot of the blocks table, for offline verification.
+
+    header   16 bytes   magic "MCLEDGR1", format version u16, record size u16, committed record count u32
+    records  N x 208    one fixed-width record per block, in block id order
+    index    M x 16     sparse index: (block id u64, record number u64) every INDEX_STRIDE records
+    trailer  32 bytes   record count u64, index entries u64, last block id u64, magic "MCLIDX1\\0"
+
+Record layout (big endian):
+    id u64, doctor_id i64, patient_id i64, record_id i64 (-1 = none), timestamp i64 (unix seconds),
+    hash_version u8, flags u8, cid length u8, 5 pad bytes,
+    hash_value 32s, previous_hash 32s, data_hash 32s (raw SHA-256 bytes), ipfs_cid 64s
+
+Incremental export truncates the old index and trailer, appends only blocks
+newer than the file's last block id, fsyncs, commits the new record count in
+the header and then writes a new footer. A file without a valid trailer
+(interrupted export) is recovered from the header's committed count, so
+records appended after it and partly written index bytes are discarded.
+Version 1 files have no committed count (0) and are recovered from their
+whole records; the next export upgrades them to version 2.
+
+A snapshot holds the block hashes as they were when exported. Rewriting a
+chain in the database (blockchain_service.migrate_legacy_hashes) does not
+invalidate the snapshot itself, but new blocks no longer link to the hashes it
+holds, so export refuses to append them and the snapshot must be re-exported
+to a new file after a hash migration.
+
+    python -m app.services.ledger_snapshot_service export ledger.snap
+    python -m app.services.ledger_snapshot_service verify ledger.snap
+
+Verification needs only this module and block_hash_service, no database.
+"""
+import os
+import sys
+import mmap
+import time
+import struct
+from datetime import datetime, timedelta
+from app.services.block_hash_service import HASH_VERSION, compute_hash
+
+MAGIC = b"MCLEDGR1"
+INDEX_MAGIC = b"MCLIDX1\x00"
+FORMAT_VERSION = 2
+READ_VERSIONS = (1, 2)
+INDEX_STRIDE = 1024
+EXPORT_BATCH_SIZE = 5000
+# blocks younger than this (by the database clock) are left for the next export,
+# so a transaction that commits a lower block id late is not skipped past
+SETTLE_SECONDS = 60
+
+HEADER = struct.Struct(">8sHHI")
+RECORD = struct.Struct(">Qqqqq BBB5x 32s32s32s64s")
+INDEX_ENTRY = struct.Struct(">QQ")
+TRAILER = struct.Struct(">QQQ8s")
+
+FLAG_GENESIS = 0x01    # previous_hash is "0"
+FLAG_NO_DATA_HASH = 0x02
+FLAG_NO_VERSION = 0x04  # legacy block, hash_version NULL
+
+_EPOCH = datetime(1970, 1, 1)
+_ZERO_HASH = bytes(32)
+
+
+def _raw_hash(value: str, block_id: int) -> bytes:
+    if not value or len(value) != 64:
+        raise ValueError(f"Block {block_id}: '{value}' is not a SHA-256 hex digest")
+    return bytes.fromhex(value)
+
+
+def pack_block(b) -> bytes:
+    flags = 0
+    if (b.previous_hash or "0") == "0":
+        flags |= FLAG_GENESIS
+        previous = _ZERO_HASH
+    else:
+        previous = _raw_hash(b.previous_hash, b.id)
+    if b.data_hash:
+        data = _raw_hash(b.data_hash, b.id)
+    else:
+        flags |= FLAG_NO_DATA_HASH
+        data = _ZERO_HASH
+    if b.hash_version is None:
+        flags |= FLAG_NO_VERSION
+    cid = (b.ipfs_cid or "").encode()
+    if len(cid) > 64:
+        raise ValueError(f"Block {b.id}: CID longer than 64 bytes")
+    return RECORD.pack(
+        b.id, b.doctor_id, b.patient_id, -1 if b.record_id is None else b.record_id,
+        int((b.timestamp - _EPOCH).total_seconds()),
+        b.hash_version or 0, flags, len(cid),
+        _raw_hash(b.hash_value, b.id), previous, data, cid,
+    )
+
+
+def _read_footer(f, size: int):
+    """Returns (record count, last block id) of an existing snapshot."""
+    f.seek(0)
+    magic, version, record_size, committed = HEADER.unpack(f.read(HEADER.size))
+    if magic != MAGIC or version not in READ_VERSIONS or record_size != RECORD.size:
+        raise ValueError("Not a ledger snapshot (or an unsupported version)")
+    if size >= HEADER.size + TRAILER.size:
+        f.seek(size - TRAILER.size)
+        count, entries, last_id, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic == INDEX_MAGIC and HEADER.size + count * RECORD.size + entries * INDEX_ENTRY.size + TRAILER.size == size \
+                and (version == 1 or count == committed):
+            return count, last_id
+    if version == 1:
+        # no valid footer and no committed count: keep every complete record
+        count = (size - HEADER.size) // RECORD.size
+    else:
+        # no valid footer: keep the records committed in the header
+        count = committed
+        if HEADER.size + count * RECORD.size > size:
+            raise ValueError("Snapshot is shorter than its committed record count")
+    if not count:
+        return 0, 0
+    f.seek(HEADER.size + (count - 1) * RECORD.size)
+    return count, RECORD.unpack(f.read(RECORD.size))[0]
+
+
+def _commit(f, count: int):
+    """Makes `count` records durable and records them in the header; the footer is written after."""
+    if count > 0xFFFFFFFF:
+        raise ValueError("Snapshot format holds at most 2**32 - 1 records")
+    f.flush()
+    os.fsync(f.fileno())
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, count))
+    f.flush()
+    os.fsync(f.fileno())
+
+
+def _write_footer(f, count: int, index: list, last_id: int):
+    f.seek(HEADER.size + count * RECORD.size)
+    f.truncate()
+    f.write(b"".join(INDEX_ENTRY.pack(block_id, n) for block_id, n in index))
+    f.write(TRAILER.pack(count, len(index), last_id, INDEX_MAGIC))
+
+
+def _read_index(f, count: int) -> list:
+    """Rebuilds the sparse index from the records (used after appends)."""
+    index = []
+    for n in range(0, count, INDEX_STRIDE):
+        f.seek(HEADER.size + n * RECORD.size)
+        index.append((RECORD.unpack(f.read(RECORD.size))[0], n))
+    return index
+
+
+def _chain_heads(f, count: int) -> dict:
+    """patient_id -> raw hash of the last block of each chain in the snapshot."""
+    heads = {}
+    if not count:
+        return heads
+    mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        records = memoryview(mm)[HEADER.size:HEADER.size + count * RECORD.size]
+        try:
+            for record in RECORD.iter_unpack(records):
+                heads[record[2]] = record[8]
+        finally:
+            records.release()
+    finally:
+        mm.close()
+    return heads
+
+
+def _db_utcnow(db) -> datetime:
+    """The database server's current UTC time, the clock block timestamps are compared against."""
+    from sqlalchemy import func
+
+    if db.get_bind().dialect.name == "mysql":
+        return db.query(func.utc_timestamp()).scalar()
+    now = db.query(func.current_timestamp()).scalar()  # UTC on SQLite
+    return datetime.fromisoformat(now) if isinstance(now, str) else now
+
+
+def export(path: str, db=None, settle_seconds: int = SETTLE_SECONDS) -> dict:
+    """Creates the snapshot, or appends the blocks newer than its tail (ValueError if they do not link to it)."""
+    from app.database import connection
+    from app.models.blockchain import Block
+
+    own_session = db is None
+    db = db or connection.SessionLocal()
+    try:
+        exists = os.path.exists(path) and os.path.getsize(path) > 0
+        with open(path, "r+b" if exists else "w+b") as f:
+            if exists:
+                count, last_id = _read_footer(f, os.path.getsize(path))
+            else:
+                f.write(HEADER.pack(MAGIC, FORMAT_VERSION, RECORD.size, 0))
+                count, last_id = 0, 0
+            index = _read_index(f, count)
+            heads = _chain_heads(f, count)
+
+            query = (
+                db.query(Block.id, Block.doctor_id, Block.patient_id, Block.record_id, Block.timestamp,
+                         Block.hash_version, Block.hash_value, Block.previous_hash, Block.data_hash, Block.ipfs_cid)
+                .filter(Block.id > last_id)
+                .order_by(Block.id)
+            )
+            if settle_seconds:
+                query = query.filter(Block.timestamp <= _db_utcnow(db) - timedelta(seconds=settle_seconds))
+
+            footer = (count, list(index), last_id)
+            f.seek(HEADER.size + count * RECORD.size)
+            f.truncate()
+            added = 0
+            buf = []
+            try:
+                for b in query.yield_per(EXPORT_BATCH_SIZE):
+                    packed = pack_block(b)
+                    head = heads.get(b.patient_id)
+                    if head is not None and ((b.previous_hash or "0") == "0" or _raw_hash(b.previous_hash, b.id) != head):
+                        raise ValueError(
+                            f"Block {b.id} does not extend patient {b.patient_id}'s chain as stored in {path}: "
+                            "the chain was rewritten since this snapshot was exported (e.g. by migrate_legacy_hashes) "
+                            "or is broken. Verify the database and export to a new file."
+                        )
+                    heads[b.patient_id] = _raw_hash(b.hash_value, b.id)
+                    if (count + added) % INDEX_STRIDE == 0:
+                        index.append((b.id, count + added))
+                    buf.append(packed)
+                    added += 1
+                    last_id = b.id
+                    if len(buf) >= EXPORT_BATCH_SIZE:
+                        f.write(b"".join(buf))
+                        buf = []
+            except Exception:
+                _write_footer(f, *footer)  # leave the snapshot as it was
+                raise
+            f.write(b"".join(buf))
+            _commit(f, count + added)
+            _write_footer(f, count + added, index, last_id)
+            f.flush()
+            os.fsync(f.fileno())
+        return {"path": path, "blocks_added": added, "blocks_total": count + added, "last_block_id": last_id}
+    finally:
+        if own_session:
+            db.close()
+
+
+def verify(path: str) -> dict:
+    """Checks every chain's linkage and recomputes versioned hashes, straight off an mmap."""
+    started = time.monotonic()
+    with open(path, "rb") as f:
+        size = os.path.getsize(path)
+        count, last_id = _read_footer(f, size)
+        if not count:
+            return {"valid": True, "blocks": 0, "chains": 0, "broken": [], "elapsed_seconds": 0.0}
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            records = memoryview(mm)[HEADER.size:HEADER.size + count * RECORD.size]
+            try:
+                heads = {}
+                legacy = set()  # chains whose head is a legacy block
+                broken = []
+                skip = set()
+                previous_id = 0
+                for (block_id, doctor_id, patient_id, record_id, ts, version, flags, cid_len,
+                     hash_raw, prev_raw, data_raw, cid) in RECORD.iter_unpack(records):
+                    if block_id <= previous_id:
+                        broken.append({"patient_id": patient_id, "block_id": block_id, "error": "block ids out of order"})
+                    previous_id = block_id
+                    if patient_id in skip:
+                        continue
+
+                    head = heads.get(patient_id)
+                    if (flags & FLAG_GENESIS) != (head is None) or (head is not None and prev_raw != head):
+                        error = "previous_hash does not match chain head"
+                        if patient_id in legacy and version:
+                            error += " (legacy hashes in the snapshot were migrated since; re-export it to a new file)"
+                    elif version == HASH_VERSION and bytes.fromhex(compute_hash(
+                        doctor_id, patient_id, None if record_id == -1 else record_id,
+                        _EPOCH + timedelta(seconds=ts), cid[:cid_len].decode(),
+                        "0" if flags & FLAG_GENESIS else prev_raw.hex(),
+                        "" if flags & FLAG_NO_DATA_HASH else data_raw.hex(),
+                    )) != hash_raw:
+                        error = "hash does not match block contents"
+                    else:
+                        heads[patient_id] = hash_raw
+                        if flags & FLAG_NO_VERSION:
+                            legacy.add(patient_id)
+                        else:
+                            legacy.discard(patient_id)
+                        continue
+                    broken.append({"patient_id": patient_id, "block_id": block_id, "error": error})
+                    skip.add(patient_id)
+            finally:
+                records.release()
+        finally:
+            mm.close()
+
+    if previous_id != last_id:
+        broken.append({"patient_id": None, "block_id": last_id, "error": "trailer last block id mismatch"})
+    return {
+        "valid": not broken,
+        "blocks": count,
+        "chains": len(heads) + len(skip),
+        "last_block_id": last_id,
+        "broken": broken,
+        "elapsed_seconds": round(time.monotonic() - started, 3),
+    }
+
+
+def lookup(path: str, block_id: int):
+    """Reads one block record by id using the sparse index (None if absent)."""
+    with open(path, "rb") as f:
+        size = os.path.getsize(path)
+        count, _ = _read_footer(f, size)
+        f.seek(size - TRAILER.size)
+        _, entries, _, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError("Snapshot has no index footer; run export to repair it")
+        f.seek(HEADER.size + count * RECORD.size)
+        index = [INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size)) for _ in range(entries)]
+        start = next((n for first_id, n in reversed(index) if first_id <= block_id), None)
+        if start is None:
+            return None
+        f.seek(HEADER.size + start * RECORD.size)
+        for _ in range(min(INDEX_STRIDE, count - start)):
+            record = RECORD.unpack(f.read(RECORD.size))
+            if record[0] == block_id:
+                return record
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 3 or sys.argv[1] not in ("export", "verify"):
+        print("usage: python -m app.services.ledger_snapshot_service export|verify <path>")
+        sys.exit(2)
+    command, path = sys.argv[1:]
+    if command == "export":
+        print(export(path))
+        sys.exit(0)
+    result = verify(path)
+    print(f"{result['blocks']} blocks, {result['chains']} chains, {len(result['broken'])} broken, {result['elapsed_seconds']}s")
+    for b in result["broken"][:20]:
+        print(f"  block {b['block_id']} (patient {b['patient_id']}): {b['error']}")
+    sys.exit(0 if result["valid"] else 1)
@@ -0,0 +1,169 @@
+# app/services/merkle_service.py
+"""
+Merkle batch anchoring of block hashes.
+
+New (versioned) blocks are periodically grouped into batches of up to
+MERKLE_BATCH_SIZE, in id order, and a Merkle root is stored per batch in
+MerkleAnchor. An inclusion proof for one block is the list of sibling hashes
+on its path to the root, so a client checks a record in O(log n) hashes
+without downloading the ledger.
+
+Tree layout (RFC 6962 style domain separation, no duplicated nodes):
+    leaf = SHA-256(0x00 || block.hash_value)
+    node = SHA-256(0x01 || left || right)
+An unpaired node at the end of a level is carried up unchanged.
+
+Blocks of a chain that still has legacy (hash_version NULL) blocks are not
+anchored: migrate_legacy_hashes rehashes the whole chain, which would break
+the roots those blocks were sealed in. They are anchored once the chain is migrated.
+"""
+import os
+import hashlib
+import threading
+from sqlalchemy.orm import Session, aliased
+from app.database import connection
+from app.models.blockchain import Block, MerkleAnchor
+from app.services.block_hash_service import HASH_VERSION
+from app.utils.logger import logger
+
+MERKLE_BATCH_SIZE = int(os.getenv("MERKLE_BATCH_SIZE", 4096))
+MERKLE_ANCHOR_INTERVAL = float(os.getenv("MERKLE_ANCHOR_INTERVAL", 60))  # seconds, 0 disables
+
+
+def leaf_hash(hash_value: str) -> bytes:
+    return hashlib.sha256(b"\x00" + hash_value.encode()).digest()
+
+
+def _node_hash(left: bytes, right: bytes) -> bytes:
+    return hashlib.sha256(b"\x01" + left + right).digest()
+
+
+def build_levels(hash_values: list) -> list:
+    """All tree levels, leaves first and the root level ([root]) last."""
+    level = [leaf_hash(h) for h in hash_values]
+    levels = [level]
+    while len(level) > 1:
+        nxt = [_node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            nxt.append(level[-1])
+        levels.append(nxt)
+        level = nxt
+    return levels
+
+
+def merkle_root(hash_values: list) -> str:
+    return build_levels(hash_values)[-1][0].hex()
+
+
+def inclusion_proof(levels: list, index: int) -> list:
+    """Sibling hashes from leaf `index` up to the root, each with its side."""
+    proof = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            proof.append({"hash": level[sibling].hex(), "side": "left" if sibling < index else "right"})
+        index //= 2
+    return proof
+
+
+def verify_proof(hash_value: str, proof: list, root_hash: str) -> bool:
+    node = leaf_hash(hash_value)
+    for step in proof:
+        sibling = bytes.fromhex(step["hash"])
+        node = _node_hash(sibling, node) if step["side"] == "left" else _node_hash(node, sibling)
+    return node.hex() == root_hash
+
+
+def anchor_pending(db: Session, batch_size: int = MERKLE_BATCH_SIZE) -> list:
+    """
+    Anchors all unanchored versioned blocks of fully migrated chains, one MerkleAnchor per batch.
+    Blocks are claimed with a conditional update, so concurrent anchorers
+    (one per API worker) never put a block into two batches.
+    """
+    anchors = []
+    legacy = aliased(Block)
+    unmigrated = db.query(legacy.id).filter(legacy.patient_id == Block.patient_id, legacy.hash_version.is_(None))
+    while True:
+        rows = (
+            db.query(Block.id, Block.hash_value)
+            .filter(Block.anchor_id.is_(None), Block.hash_version == HASH_VERSION, ~unmigrated.exists())
+            .order_by(Block.id)
+            .limit(batch_size)
+            .all()
+        )
+        if not rows:
+            return anchors
+        ids = [r.id for r in rows]
+        anchor = MerkleAnchor(
+            root_hash=merkle_root([r.hash_value for r in rows]),
+            leaf_count=len(rows),
+            first_block_id=ids[0],
+            last_block_id=ids[-1],
+        )
+        db.add(anchor)
+        db.flush()
+        claimed = (
+            db.query(Block)
+            .filter(Block.id.in_(ids), Block.anchor_id.is_(None))
+            .update({"anchor_id": anchor.id}, synchronize_session=False)
+        )
+        if claimed != len(ids):
+            db.rollback()  # another worker anchored some of these first
+            continue
+        db.commit()
+        anchors.append(anchor)
+        if len(rows) < batch_size:
+            return anchors
+
+
+def proof_for_block(db: Session, block: Block):
+    """Inclusion proof for an anchored block, or None if it is not anchored yet."""
+    if block.anchor_id is None:
+        return None
+    anchor = db.get(MerkleAnchor, block.anchor_id)
+    leaves = db.query(Block.id, Block.hash_value).filter(Block.anchor_id == anchor.id).order_by(Block.id).all()
+    index = next(i for i, leaf in enumerate(leaves) if leaf.id == block.id)
+    levels = build_levels([leaf.hash_value for leaf in leaves])
+    return {
+        "block_id": block.id,
+        "record_id": block.record_id,
+        "hash_value": block.hash_value,
+        "anchor_id": anchor.id,
+        "root_hash": anchor.root_hash,
+        "anchored_at": anchor.created_at.isoformat() if anchor.created_at else None,
+        "leaf_index": index,
+        "leaf_count": anchor.leaf_count,
+        "proof": inclusion_proof(levels, index),
+        "valid": levels[-1][0].hex() == anchor.root_hash,
+    }
+
+
+_stop = threading.Event()
+_thread = None
+
+
+def _anchor_loop():
+    while not _stop.wait(MERKLE_ANCHOR_INTERVAL):
+        db = connection.SessionLocal()
+        try:
+            anchors = anchor_pending(db)
+            if anchors:
+                logger.info("Anchored %d Merkle batches up to block %d", len(anchors), anchors[-1].last_block_id)
+        except Exception:
+            logger.exception("Merkle anchoring failed")
+            db.rollback()
+        finally:
+            db.close()
+
+
+def start_anchoring():
+    """Starts the periodic anchoring thread (once per worker process)."""
+    global _thread
+    if MERKLE_ANCHOR_INTERVAL <= 0 or _thread is not None:
+        return
+    _thread = threading.Thread(target=_anchor_loop, name="merkle-anchor", daemon=True)
+    _thread.start()
+
+
+def stop_anchoring():
+    _stop.set()
@@ -0,0 +1,104 @@
+# app/services/segment_crypto_service.py
+"""
+Segmented AES-GCM record format (encryption bundle version "2.0").
+
+The plaintext is split into fixed-size segments and each segment is sealed
+on its own, so a record can be decrypted (and verified) as it streams in.
+
+    ciphertext = seg_0 || seg_1 || ... || seg_n
+    seg_i      = AES-GCM(key, nonce_i, plaintext[i*S:(i+1)*S])   (S + 16 bytes, last one may be shorter)
+    nonce_i    = prefix (7 bytes) || i (uint32, big endian) || last flag (1 byte)
+
+The last flag is 0x01 only on the final segment, which makes truncation and
+reordering detectable. An empty plaintext is a single, tag-only last segment.
+"""
+import os
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+
+SEGMENTED_VERSION = "2.0"
+SEGMENTED_SCHEME = "ECIES(P-256)+AES-GCM-STREAM"
+DEFAULT_SEGMENT_SIZE = 64 * 1024
+MAX_SEGMENT_SIZE = 16 * 1024 * 1024
+NONCE_PREFIX_LEN = 7
+TAG_LEN = 16
+
+
+def is_segmented(enc: dict) -> bool:
+    return str(enc.get("version")) == SEGMENTED_VERSION
+
+
+def segment_nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    return prefix + index.to_bytes(4, "big") + (b"\x01" if last else b"\x00")
+
+
+def validate_segment_params(prefix: bytes, segment_size: int):
+    if len(prefix) != NONCE_PREFIX_LEN:
+        raise ValueError(f"Segment nonce prefix must be {NONCE_PREFIX_LEN} bytes")
+    if not 0 < segment_size <= MAX_SEGMENT_SIZE:
+        raise ValueError("Invalid segment size")
+
+
+def encrypt_segmented(key: bytes, plaintext: bytes, segment_size: int = DEFAULT_SEGMENT_SIZE, prefix: bytes = None):
+    """
+    Reference encoder for the segmented format (clients produce the same layout).
+    Returns tuple (prefix, ciphertext).
+    """
+    prefix = prefix or os.urandom(NONCE_PREFIX_LEN)
+    validate_segment_params(prefix, segment_size)
+    aesgcm = AESGCM(key)
+    count = max(1, -(-len(plaintext) // segment_size))
+    out = bytearray()
+    for i in range(count):
+        chunk = plaintext[i * segment_size:(i + 1) * segment_size]
+        out += aesgcm.encrypt(segment_nonce(prefix, i, i == count - 1), chunk, None)
+    return prefix, bytes(out)
+
+
+def plaintext_size(ciphertext_size: int, segment_size: int) -> int:
+    """Plaintext length of a segmented ciphertext of the given length."""
+    ct_segment = segment_size + TAG_LEN
+    full, rest = divmod(ciphertext_size, ct_segment)
+    if rest == 0:
+        return full * segment_size
+    if rest < TAG_LEN:
+        raise ValueError("Truncated segmented ciphertext")
+    return full * segment_size + rest - TAG_LEN
+
+
+def decrypt_segment(aesgcm: AESGCM, prefix: bytes, index: int, segment: bytes, last: bool) -> bytes:
+    return aesgcm.decrypt(segment_nonce(prefix, index, last), bytes(segment), None)
+
+
+def iter_decrypt(key: bytes, prefix: bytes, segment_size: int, chunks, first_index: int = 0, final: bool = True):
+    """
+    Decrypts a stream of ciphertext chunks (any sizes) segment by segment.
+    Holds at most one segment plus one incoming chunk in memory.
+
+    `first_index` is the index of the first segment in the stream and `final`
+    says whether the stream ends with the record's last segment.
+    """
+    validate_segment_params(prefix, segment_size)
+    aesgcm = AESGCM(key)
+    ct_segment = segment_size + TAG_LEN
+    buf = bytearray()
+    index = first_index
+
+    for chunk in chunks:
+        if not chunk:
+            continue
+        buf += chunk
+        # only decrypt a full segment once we know more data follows it,
+        # otherwise it may be the final (last-flagged) one
+        while len(buf) > ct_segment:
+            yield decrypt_segment(aesgcm, prefix, index, buf[:ct_segment], False)
+            del buf[:ct_segment]
+            index += 1
+
+    if final:
+        if len(buf) < TAG_LEN:
+            raise ValueError("Truncated segmented ciphertext")
+        yield decrypt_segment(aesgcm, prefix, index, buf, True)
+    elif buf:
+        if len(buf) != ct_segment:
+            raise ValueError("Truncated segmented ciphertext")
+        yield decrypt_segment(aesgcm, prefix, index, buf, False)
@@ -0,0 +1,145 @@
+# app/services/storage_service.py
+"""
+Blob storage backends for record ciphertexts.
+
+STORAGE_BACKEND selects the implementation:
+  ipfs  (default) - pins to the IPFS node and reads through the gateway
+  local           - content-addressed files on local disk, for benchmarks,
+                    development without an IPFS daemon and single-node deployments
+
+Both return CIDs. The local store uses CIDv1 with the raw codec and a
+sha2-256 multihash, which is the CID IPFS itself assigns to a single-block
+file added with `--cid-version=1 --raw-leaves` (larger files are chunked
+into a DAG by IPFS and get a different root CID).
+"""
+import os
+import abc
+import base64
+import hashlib
+import tempfile
+from app.services import ipfs_service
+from app.utils.logger import logger
+
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "ipfs").lower()
+LOCAL_STORAGE_DIR = os.getenv("LOCAL_STORAGE_DIR", os.path.join("storage", "blobs"))
+CHUNK_SIZE = 1024 * 1024
+
+# CIDv1 prefix: version 1, raw codec (0x55), sha2-256 multihash (0x12) of 32 bytes (0x20)
+_CIDV1_RAW_SHA256 = bytes([0x01, 0x55, 0x12, 0x20])
+
+
+def cid_for_digest(digest: bytes) -> str:
+    """Base32 (multibase "b") CIDv1 for a sha2-256 digest of raw bytes."""
+    return "b" + base64.b32encode(_CIDV1_RAW_SHA256 + digest).decode().lower().rstrip("=")
+
+
+class BlobStore(abc.ABC):
+    """Interface for ciphertext storage. All reads are by CID."""
+
+    name = "abstract"
+    # whether reads are remote and worth putting the ciphertext cache in front of
+    cacheable = False
+
+    @abc.abstractmethod
+    def put_stream(self, filename: str, fileobj) -> str:
+        """Stores a file-like object and returns its CID."""
+
+    @abc.abstractmethod
+    def get(self, cid: str) -> bytes:
+        """Returns the whole object."""
+
+    @abc.abstractmethod
+    def stat(self, cid: str) -> dict:
+        """Returns {"cid", "size"}; raises FileNotFoundError for unknown CIDs."""
+
+    @abc.abstractmethod
+    def stream(self, cid: str, offset: int = 0, length: int = None, chunk_size: int = 64 * 1024):
+        """Yields the object (or the byte range offset..offset+length) in chunks."""
+
+
+class IpfsBlobStore(BlobStore):
+    name = "ipfs"
+    cacheable = True
+
+    def put_stream(self, filename: str, fileobj) -> str:
+        return ipfs_service.add_stream(filename, fileobj)["cid"]
+
+    def get(self, cid: str) -> bytes:
+        return ipfs_service.cat(cid)
+
+    def stat(self, cid: str) -> dict:
+        return {"cid": cid, "size": ipfs_service.stat(cid)}
+
+    def stream(self, cid: str, offset: int = 0, length: int = None, chunk_size: int = 64 * 1024):
+        return ipfs_service.cat_stream(cid, offset, length, chunk_size=chunk_size)
+
+
+class LocalBlobStore(BlobStore):
+    name = "local"
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, cid: str) -> str:
+        # the CID prefix is constant, shard on the tail which is digest-derived
+        return os.path.join(self.root, cid[-2:], cid)
+
+    def put_stream(self, filename: str, fileobj) -> str:
+        digest = hashlib.sha256()
+        os.makedirs(os.path.join(self.root, "tmp"), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.join(self.root, "tmp"))
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = fileobj.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    digest.update(chunk)
+                    out.write(chunk)
+            cid = cid_for_digest(digest.digest())
+            path = self._path(cid)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        logger.debug("Stored %s locally -> CID %s", filename, cid)
+        return cid
+
+    def get(self, cid: str) -> bytes:
+        with open(self._path(cid), "rb") as f:
+            return f.read()
+
+    def stat(self, cid: str) -> dict:
+        return {"cid": cid, "size": os.path.getsize(self._path(cid))}
+
+    def stream(self, cid: str, offset: int = 0, length: int = None, chunk_size: int = 64 * 1024):
+        f = open(self._path(cid), "rb")
+
+        def chunks():
+            remaining = length
+            try:
+                f.seek(offset)
+                while remaining is None or remaining > 0:
+                    chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                    if not chunk:
+                        break
+                    if remaining is not None:
+                        remaining -= len(chunk)
+                    yield chunk
+            finally:
+                f.close()
+
+        return chunks()
+
+
+def _create_store() -> BlobStore:
+    if STORAGE_BACKEND == "local":
+        return LocalBlobStore(LOCAL_STORAGE_DIR)
+    if STORAGE_BACKEND == "ipfs":
+        return IpfsBlobStore()
+    raise RuntimeError(f"Unknown STORAGE_BACKEND '{STORAGE_BACKEND}' (expected 'ipfs' or 'local')")
+
+
+store = _create_store()
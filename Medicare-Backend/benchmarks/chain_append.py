@@ -0,0 +1,123 @@
+# benchmarks/chain_append.py
+"""
+Concurrent block append benchmark.
+
+Many writer threads append blocks to a small set of patient chains at once,
+each append in its own transaction, then every chain is checked for forks
+and broken links.
+
+    python -m benchmarks.chain_append --database-url sqlite:///chain_bench.db --writers 32 --appends 200
+    python -m benchmarks.chain_append --database-url mysql+mysqlconnector://user:pw@host/db_bench
+
+--database-url is required and must be a scratch database: the benchmark
+writes real blocks and refuses to run against the app's configured database.
+"""
+import argparse
+import threading
+import time
+from collections import defaultdict
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm import sessionmaker
+from app.database import connection
+from app.database.connection import Base
+from app.models import user, record  # noqa: F401 - tables referenced by blocks
+from app.models.blockchain import Block, ChainHead, ChainCheckpoint
+from app.services.blockchain_service import append_block, check_link, CHAIN_COLUMNS
+
+PATIENT_ID_BASE = 900000  # keep benchmark chains away from real patients
+
+
+def _writer(session_factory, writer_id, appends, patients, barrier, errors):
+    db = session_factory()
+    barrier.wait()
+    try:
+        for i in range(appends):
+            patient_id = PATIENT_ID_BASE + (writer_id + i) % patients
+            for attempt in range(5):
+                try:
+                    append_block(db, writer_id, patient_id, None, f"bench-{writer_id}-{i}", f"{writer_id}:{i}")
+                    db.commit()
+                    break
+                except OperationalError:
+                    # deadlock / lock wait timeout: retry like a request would
+                    db.rollback()
+            else:
+                errors.append((writer_id, i))
+    finally:
+        db.close()
+
+
+def _check_chains(db, patients):
+    rows = (
+        db.query(*CHAIN_COLUMNS)
+        .filter(Block.patient_id.between(PATIENT_ID_BASE, PATIENT_ID_BASE + patients - 1))
+        .order_by(Block.patient_id, Block.id)
+    )
+    heads, broken = {}, []
+    children = defaultdict(int)
+    for row in rows:
+        children[(row.patient_id, row.previous_hash)] += 1
+        error = check_link(row, heads.get(row.patient_id, "0"))
+        if error:
+            broken.append((row.patient_id, row.id, error))
+        heads[row.patient_id] = row.hash_value
+    forks = [key for key, n in children.items() if n > 1]
+    return broken, forks
+
+
+def run(writers: int, appends: int, patients: int, database_url: str):
+    if database_url == connection.DATABASE_URL:
+        raise SystemExit("Refusing to run against the app's configured database; pass a scratch --database-url")
+    engine = create_engine(database_url, pool_size=writers, max_overflow=0)
+    if engine.dialect.name == "sqlite":
+        # SQLite has no row locks and pysqlite starts transactions lazily; take the
+        # database write lock up front so FOR UPDATE semantics hold (coarsely)
+        @event.listens_for(engine, "connect")
+        def _no_pysqlite_begin(dbapi_conn, _):
+            dbapi_conn.isolation_level = None
+
+        @event.listens_for(engine, "begin")
+        def _begin_immediate(conn):
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+    Base.metadata.create_all(bind=engine)
+    session_factory = sessionmaker(bind=engine, autoflush=False)
+
+    db = session_factory()
+    for model in (Block, ChainHead, ChainCheckpoint):
+        db.query(model).filter(model.patient_id >= PATIENT_ID_BASE).delete(synchronize_session=False)
+    db.commit()
+
+    barrier = threading.Barrier(writers + 1)
+    errors = []
+    threads = [
+        threading.Thread(target=_writer, args=(session_factory, w, appends, patients, barrier, errors))
+        for w in range(writers)
+    ]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - started
+
+    broken, forks = _check_chains(db, patients)
+    db.close()
+    total = writers * appends - len(errors)
+    print(f"{writers} writers x {appends} appends over {patients} chains")
+    print(f"{total} blocks in {elapsed:.2f}s = {total / elapsed:,.0f} appends/sec ({len(errors)} gave up)")
+    print(f"broken links: {len(broken)}, forks: {len(forks)}")
+    for b in broken[:10]:
+        print("  broken", b)
+    return not broken and not forks
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--appends", type=int, default=100)
+    parser.add_argument("--patients", type=int, default=4)
+    parser.add_argument("--database-url", required=True, help="scratch database; not the app's configured one")
+    args = parser.parse_args()
+    raise SystemExit(0 if run(args.writers, args.appends, args.patients, args.database_url) else 1)
@@ -0,0 +1,139 @@
+# benchmarks/upload_batch.py
+"""
+Files/sec of /record/upload/batch against one /record/upload call per file.
+
+A doctor uploads --encounters encounters of --files encrypted files each to
+one patient, once through the batch endpoint and once file by file, through
+the record router in-process. Blobs go to the local store (STORAGE_BACKEND=local,
+in a temporary directory); --pin-latency-ms adds a fixed delay to every pin to
+model the round trip to an IPFS node.
+
+    python -m benchmarks.upload_batch --database-url sqlite:///upload_bench.db
+    python -m benchmarks.upload_batch --database-url mysql+mysqlconnector://user:pw@host/db_bench --files 12 --pin-latency-ms 40
+
+Point it at a scratch database: it creates users, records and blocks.
+"""
+import os
+import json
+import time
+import base64
+import argparse
+import tempfile
+
+
+def _encounter(files: int, size: int):
+    wrapped_key = json.dumps({"wrappedB64": "", "nonceB64": "", "ephPubSpkiB64": ""})
+    return [
+        {
+            "content": os.urandom(size),
+            "file_nonce_b64": base64.b64encode(os.urandom(12)).decode(),
+            "wrapped_key": wrapped_key,
+            "raw_aes_key_b64": base64.b64encode(os.urandom(32)).decode(),
+        }
+        for _ in range(files)
+    ]
+
+
+def run(database_url: str, encounters: int, files: int, size_kb: int, pin_latency_ms: float):
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ.setdefault("LOCAL_STORAGE_DIR", tempfile.mkdtemp(prefix="upload_bench_"))
+
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from app.database import connection
+    from app.database.connection import Base, get_db
+    from app.models.user import User, RoleEnum
+    from app.routes import record
+    from app.services.crypto_service import generate_ecc_keypair
+    from app.services.storage_service import store
+    from app.services.token_service import create_access_token
+
+    if database_url == connection.DATABASE_URL:
+        raise SystemExit("Refusing to run against the app's configured database; pass a scratch --database-url")
+    engine = create_engine(database_url)
+    Base.metadata.create_all(bind=engine)
+    # the block appender opens its own sessions through connection.SessionLocal
+    connection.engine = engine
+    connection.SessionLocal = sessionmaker(bind=engine, autoflush=False)
+
+    def _get_db():
+        db = connection.SessionLocal()
+        try:
+            yield db
+        finally:
+            db.close()
+
+    if pin_latency_ms:
+        put_stream = store.put_stream
+
+        def slow_put_stream(filename, fileobj):
+            time.sleep(pin_latency_ms / 1000)
+            return put_stream(filename, fileobj)
+
+        store.put_stream = slow_put_stream
+
+    app = FastAPI()
+    app.include_router(record.router)
+    app.dependency_overrides[get_db] = _get_db
+    client = TestClient(app)
+
+    db = connection.SessionLocal()
+    tag = os.urandom(4).hex()
+    _, doctor_pub = generate_ecc_keypair()
+    doctor = User(name="bench doctor", email=f"bench-doctor-{tag}@bench.local", password_hash="x",
+                  role=RoleEnum.doctor, public_key=doctor_pub.decode())
+    patient = User(name="bench patient", email=f"bench-patient-{tag}@bench.local", password_hash="x",
+                   role=RoleEnum.patient)
+    db.add_all([doctor, patient])
+    db.commit()
+    headers = {"Authorization": "Bearer " + create_access_token(
+        {"sub": doctor.email, "user_id": doctor.id, "role": "doctor"})}
+    patient_id = patient.id
+    db.close()
+
+    def serial(batch):
+        for i, f in enumerate(batch):
+            response = client.post("/record/upload", headers=headers, files={"file": (f"lab{i}.pdf", f["content"])}, data={
+                "patient_id": str(patient_id),
+                "file_nonce_b64": f["file_nonce_b64"],
+                "wrapped_key": f["wrapped_key"],
+                "raw_aes_key_b64": f["raw_aes_key_b64"],
+            })
+            response.raise_for_status()
+
+    def batched(batch):
+        manifest = [{k: f[k] for k in ("file_nonce_b64", "wrapped_key", "raw_aes_key_b64")} for f in batch]
+        response = client.post(
+            "/record/upload/batch", headers=headers,
+            files=[("files", (f"lab{i}.pdf", f["content"])) for i, f in enumerate(batch)],
+            data={"patient_id": str(patient_id), "manifest": json.dumps(manifest)},
+        )
+        response.raise_for_status()
+        failed = [r for r in response.json()["results"] if r.get("error")]
+        if failed:
+            raise RuntimeError(f"batch upload failed: {failed[:3]}")
+
+    print(f"{encounters} encounters x {files} files of {size_kb} KB, pin latency {pin_latency_ms:g} ms")
+    rates = {}
+    for name, upload in (("serial", serial), ("batch", batched)):
+        workload = [_encounter(files, size_kb * 1024) for _ in range(encounters)]
+        started = time.perf_counter()
+        for batch in workload:
+            upload(batch)
+        elapsed = time.perf_counter() - started
+        rates[name] = encounters * files / elapsed
+        print(f"{name:>7}: {encounters * files} files in {elapsed:.2f}s = {rates[name]:,.1f} files/sec")
+    print(f"batch speedup: {rates['batch'] / rates['serial']:.2f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--database-url", required=True, help="scratch database; not the app's configured one")
+    parser.add_argument("--encounters", type=int, default=20)
+    parser.add_argument("--files", type=int, default=12, help="files per encounter (one batch request)")
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--pin-latency-ms", type=float, default=0)
+    args = parser.parse_args()
+    run(args.database_url, args.encounters, args.files, args.size_kb, args.pin_latency_ms)
@@ -0,0 +1,129 @@
+# benchmarks/upload_rss.py
+"""
+Peak RSS of the record upload path as the file size grows.
+
+For each size a fresh process spools a file into an UploadFile, as FastAPI
+does for /record/upload, then runs the route's digest pass and
+ipfs_service.add_stream against a stub IPFS API served by this script. The
+growth of the process's peak RSS during the upload is reported, next to the
+old buffered path (file.read() + add_bytes) for comparison.
+
+    python -m benchmarks.upload_rss --sizes 16 64 256
+    python -m benchmarks.upload_rss --sizes 16 256 --skip-buffered
+
+Streaming uploads should stay flat: exits 1 if their peak RSS growth varies
+by more than --max-growth-mb across sizes.
+"""
+import os
+import sys
+import json
+import argparse
+import resource
+import subprocess
+import tempfile
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MB = 1024 * 1024
+
+
+class _StubIpfsHandler(BaseHTTPRequestHandler):
+    """Accepts /api/v0/add (chunked or sized bodies), discarding the bytes."""
+
+    def do_POST(self):
+        received = 0
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            while True:
+                size = int(self.rfile.readline().split(b";")[0], 16)
+                if not size:
+                    self.rfile.readline()
+                    break
+                while size:
+                    received += len(self.rfile.read(min(size, MB)))
+                    size -= min(size, MB)
+                self.rfile.readline()
+        else:
+            remaining = int(self.headers.get("Content-Length", 0))
+            while remaining:
+                chunk = self.rfile.read(min(remaining, MB))
+                received += len(chunk)
+                remaining -= len(chunk)
+        body = json.dumps({"Name": "bench", "Hash": f"QmBench{received}", "Size": str(received)}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / MB if sys.platform == "darwin" else peak / 1024  # bytes on macOS, KiB on Linux
+
+
+def _child(size_mb: int, mode: str):
+    """Runs one upload in this process and prints its peak RSS growth in MB."""
+    from starlette.datastructures import UploadFile
+    from app.routes.record import _check_upload
+    from app.services import ipfs_service
+
+    spooled = tempfile.SpooledTemporaryFile(max_size=MB)  # FastAPI's spool threshold
+    block = os.urandom(MB)
+    for _ in range(size_mb):
+        spooled.write(block)
+    spooled.seek(0)
+    del block
+    upload = UploadFile(file=spooled, filename="bench.dcm")
+
+    before = _peak_rss_mb()
+    _check_upload(upload, "bm9uY2U=", "{}", None)
+    if mode == "streaming":
+        ipfs_service.add_stream(upload.filename, upload.file)
+    else:
+        ipfs_service.add_bytes(upload.filename, upload.file.read())
+    print(json.dumps({"growth_mb": round(_peak_rss_mb() - before, 1)}))
+
+
+def _measure(size_mb: int, mode: str, api: str) -> float:
+    env = dict(os.environ, IPFS_API=api)
+    out = subprocess.run(
+        [sys.executable, "-m", "benchmarks.upload_rss", "--child", mode, "--sizes", str(size_mb)],
+        env=env, capture_output=True, text=True, check=True,
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])["growth_mb"]
+
+
+def run(sizes: list, buffered: bool = True, max_growth_mb: float = 32) -> bool:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubIpfsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api = f"http://127.0.0.1:{server.server_address[1]}"
+
+    streaming = []
+    print(f"{'file MB':>8} {'streaming peak +MB':>19} {'buffered peak +MB':>18}")
+    try:
+        for size in sizes:
+            streaming.append(_measure(size, "streaming", api))
+            old = f"{_measure(size, 'buffered', api):>18}" if buffered else f"{'-':>18}"
+            print(f"{size:>8} {streaming[-1]:>19} {old}")
+    finally:
+        server.shutdown()
+
+    spread = max(streaming) - min(streaming)
+    print(f"streaming peak RSS growth varies by {spread:.1f} MB across sizes (limit {max_growth_mb} MB)")
+    return spread <= max_growth_mb
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[16, 64, 256], help="file sizes in MB")
+    parser.add_argument("--skip-buffered", action="store_true", help="only measure the streaming path")
+    parser.add_argument("--max-growth-mb", type=float, default=32)
+    parser.add_argument("--child", choices=["streaming", "buffered"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        _child(args.sizes[0], args.child)
+        raise SystemExit(0)
+    raise SystemExit(0 if run(args.sizes, not args.skip_buffered, args.max_growth_mb) else 1)
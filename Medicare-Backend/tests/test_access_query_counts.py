@@ -0,0 +1,95 @@
+"""Access list and log endpoints issue a fixed number of queries, however many rows they return.
+
+Run from Medicare-Backend with `python -m pytest tests`.
+"""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.database.connection import Base, get_db
+from app.models.user import User, RoleEnum
+from app.models.access_log import AccessLog
+from app.models.access_control import AccessControl
+from app.models.record import Record
+from app.models import blockchain, connection  # noqa: F401  (tables referenced by foreign keys)
+from app.routes import access_control
+from app.services.token_service import create_access_token
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Session = sessionmaker(bind=engine)
+queries = []
+event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *rest: queries.append(statement))
+
+
+def _get_db():
+    db = Session()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+app = FastAPI()
+app.include_router(access_control.router)
+app.dependency_overrides[get_db] = _get_db
+client = TestClient(app)
+
+
+def _add_counterparts(db, owner: User, count: int):
+    """Adds `count` counterparts with a record, a log and a grant each, plus `count` without any."""
+    role = RoleEnum.patient if owner.role == RoleEnum.doctor else RoleEnum.doctor
+    for _ in range(count):
+        for engaged in (True, False):
+            other = User(name="u", email=f"u{db.query(User).count()}@x.io", password_hash="x", role=role)
+            db.add(other)
+            db.flush()
+            if not engaged:
+                continue
+            doctor_id, patient_id = (owner.id, other.id) if role == RoleEnum.patient else (other.id, owner.id)
+            rec = Record(patient_id=patient_id, filename="f.pdf", ipfs_cid="cid", encryption_key="k")
+            db.add(rec)
+            db.flush()
+            db.add(AccessLog(patient_id=patient_id, doctor_id=doctor_id, record_id=rec.id, action="Viewed record"))
+            db.add(AccessControl(patient_id=patient_id, doctor_id=doctor_id, record_id=rec.id,
+                                 status="approved", granted=True))
+    db.commit()
+
+
+# (path, owner role, list key, total key)
+ENDPOINTS = [
+    ("/access/doctor/{id}", RoleEnum.doctor, "granted", "granted_count"),
+    ("/access/patient/{id}", RoleEnum.patient, "granted", "granted_count"),
+    ("/access/authorized", RoleEnum.patient, "authorized_doctors", "count"),
+    ("/access/authorized-patients", RoleEnum.doctor, "authorized_patients", "count"),
+    ("/access/logs/patient/{id}", RoleEnum.patient, "logs", "count"),
+    ("/access/logs/doctor/{id}", RoleEnum.doctor, "logs", "count"),
+]
+
+
+@pytest.mark.parametrize("path, role, list_key, total_key", ENDPOINTS)
+def test_query_count_does_not_grow_with_rows(path, role, list_key, total_key):
+    Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    db = Session()
+    owner = User(name="owner", email="owner@x.io", password_hash="x", role=role)
+    db.add(owner)
+    db.commit()
+    headers = {"Authorization": "Bearer " + create_access_token({"sub": owner.email, "user_id": owner.id, "role": role.value})}
+    url = path.format(id=owner.id)
+
+    counts = []
+    for more in (3, 40):
+        _add_counterparts(db, owner, more)
+        del queries[:]
+        response = client.get(url, params={"limit": 10}, headers=headers)
+        counts.append(len(queries))
+    db.close()
+
+    assert response.status_code == 200
+    body = response.json()
+    assert counts[0] == counts[1]
+    assert len(body[list_key]) == 10
+    assert body[total_key] == 43
+    assert body["next_cursor"] is not None
@@ -2,7 +2,6 @@ import React, { useEffect, useState } from "react";
 import { motion } from "framer-motion";
 import DashboardLayout from "../../components/DashboardLayout";
 import { getAllUsers } from "../../services/adminService";
-import { getLedger } from "../../services/blockchainService";
 import api from "@/services/api";
 import { Users, Blocks, FileText } from "lucide-react";
 
@@ -12,14 +11,13 @@ const AdminDashboard = () => {
 
   const fetchData = async () => {
     try {
-      const [statsRes, ledgerRes, userRes] = await Promise.all([
+      const [statsRes, userRes] = await Promise.all([
         api.get("/admin/stats"),
-        getLedger(),
         getAllUsers(),
       ]);
       setStats({
         users: userRes.data.users?.length || 0,
-        blocks: ledgerRes.data.blocks?.length || 0,
+        blocks: statsRes.data.blocks || 0,
         records: statsRes.data.records || 0,
       });
     } catch (err) {
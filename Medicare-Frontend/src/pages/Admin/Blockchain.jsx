@@ -2,19 +2,23 @@ import React, { useEffect, useState } from "react";
 import { motion } from "framer-motion";
 import DashboardLayout from "../../components/DashboardLayout";
 import { Loader2, Blocks, Hash, Clock, ShieldCheck, User } from "lucide-react";
-import api from "@/services/api";
+import { getLedgerPage } from "@/services/blockchainService";
+import PrimaryButton from "@/components/ui/PrimaryButton";
 import { toast } from "react-hot-toast";
 
 export default function BlockchainLedger() {
   const [blocks, setBlocks] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [search, setSearch] = useState("");
 
-  // 🔹 Fetch blockchain ledger
+  // 🔹 Fetch blockchain ledger (newest page first)
   const fetchBlocks = async () => {
     try {
-      const res = await api.get("/blockchain/ledger");
+      const res = await getLedgerPage();
       setBlocks(res.data.blocks || []);
+      setNextCursor(res.data.next_cursor || null);
     } catch (err) {
       console.error("Error fetching blockchain:", err);
       toast.error("Failed to load blockchain ledger");
@@ -23,6 +27,21 @@ export default function BlockchainLedger() {
     }
   };
 
+  // 🔹 Next (older) page of the ledger
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await getLedgerPage(nextCursor);
+      setBlocks((prev) => [...prev, ...(res.data.blocks || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (err) {
+      console.error("Error fetching blockchain:", err);
+      toast.error("Failed to load more blocks");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchBlocks();
   }, []);
@@ -63,7 +82,7 @@ export default function BlockchainLedger() {
         <div className="relative z-10 max-w-md mx-auto mb-10">
           <input
             type="text"
-            placeholder="Search by doctor, patient, or action..."
+            placeholder="Search loaded blocks by doctor, patient, or action..."
             value={search}
             onChange={(e) => setSearch(e.target.value)}
             className="w-full p-3 rounded-xl bg-white/70 border border-cyan-200/50 text-gray-700 placeholder-gray-500 focus:ring-2 focus:ring-cyan-300 focus:outline-none"
@@ -143,6 +162,17 @@ export default function BlockchainLedger() {
               ))}
             </div>
           )}
+          {!loading && nextCursor && (
+            <div className="flex justify-center mt-10">
+              <PrimaryButton
+                onClick={loadMore}
+                loading={loadingMore}
+                className="px-6 py-2 w-auto flex items-center justify-center gap-2"
+              >
+                Load More
+              </PrimaryButton>
+            </div>
+          )}
         </div>
       </motion.div>
     </DashboardLayout>
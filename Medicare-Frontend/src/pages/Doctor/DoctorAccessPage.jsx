@@ -16,7 +16,10 @@ export default function DoctorAccessPage() {
   const doctorId = user?.id || localStorage.getItem("doctorId");
   const [patients, setPatients] = useState([]);
   const [pendingRequests, setPendingRequests] = useState([]);
+  const [grantedCount, setGrantedCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const fetchAccessData = async () => {
     try {
@@ -25,6 +28,8 @@ export default function DoctorAccessPage() {
         getPendingRequests(doctorId),
       ]);
       setPatients(accessRes.data.granted || []);
+      setGrantedCount(accessRes.data.granted_count || 0);
+      setNextCursor(accessRes.data.next_cursor || null);
       setPendingRequests(pendingRes || []);
     } catch (err) {
       console.error("Error fetching access data:", err);
@@ -34,6 +39,23 @@ export default function DoctorAccessPage() {
     }
   };
 
+  // the access list is paged; next_cursor fetches the next page of connected patients
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await api.get(`/access/doctor/${doctorId}`, {
+        params: { cursor: nextCursor },
+      });
+      setPatients((prev) => [...prev, ...(res.data.granted || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (err) {
+      console.error("Error fetching access data:", err);
+      toast.error("Failed to load more patients");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     fetchAccessData();
   }, [doctorId]);
@@ -236,6 +258,20 @@ export default function DoctorAccessPage() {
                         ))}
                       </tbody>
                     </table>
+                    <div className="flex items-center justify-between px-6 py-4 text-sm text-gray-600">
+                      <span>
+                        Showing {patients.length} of {grantedCount} connected patients
+                      </span>
+                      {nextCursor && patients.length < grantedCount && (
+                        <PrimaryButton
+                          onClick={loadMore}
+                          loading={loadingMore}
+                          className="px-6 py-2 w-auto flex items-center justify-center gap-2"
+                        >
+                          Load More
+                        </PrimaryButton>
+                      )}
+                    </div>
                   </div>
                 )}
               </motion.section>
@@ -11,7 +11,10 @@ const DoctorLogs = () => {
   const { user } = useAuth();
   const doctorId = user?.id || localStorage.getItem("doctorId");
   const [logs, setLogs] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   const formatDate = (dateStr) =>
     new Date(dateStr).toLocaleString("en-IN", {
@@ -24,6 +27,8 @@ const DoctorLogs = () => {
     try {
       const res = await api.get(`/access/logs/doctor/${doctorId}`);
       setLogs(res.data.logs || []);
+      setTotal(res.data.count || 0);
+      setNextCursor(res.data.next_cursor || null);
     } catch (error) {
       console.error("Error fetching doctor logs:", error);
       toast.error("Failed to load logs");
@@ -32,6 +37,23 @@ const DoctorLogs = () => {
     }
   };
 
+  // logs are paged; next_cursor fetches the next (older) page
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await api.get(`/access/logs/doctor/${doctorId}`, {
+        params: { cursor: nextCursor },
+      });
+      setLogs((prev) => [...prev, ...(res.data.logs || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (error) {
+      console.error("Error fetching doctor logs:", error);
+      toast.error("Failed to load more logs");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     if (doctorId) fetchLogs();
   }, [doctorId]);
@@ -147,6 +169,20 @@ const DoctorLogs = () => {
                 ))}
               </tbody>
             </table>
+            <div className="flex items-center justify-between px-6 py-4 text-sm text-gray-600">
+              <span>
+                Showing {logs.length} of {total} logs
+              </span>
+              {nextCursor && (
+                <PrimaryButton
+                  onClick={loadMore}
+                  loading={loadingMore}
+                  className="px-6 py-2 w-auto flex items-center justify-center gap-2"
+                >
+                  Load More
+                </PrimaryButton>
+              )}
+            </div>
           </motion.div>
         )}
       </motion.div>
@@ -15,6 +15,9 @@ export default function AccessControl() {
   const [records, setRecords] = useState([]);
   const [selectedRecord, setSelectedRecord] = useState({});
   const [grantedDoctors, setGrantedDoctors] = useState([]);
+  const [grantedCount, setGrantedCount] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [loading, setLoading] = useState({ doctors: false, records: false, granted: false });
   const [actionLoading, setActionLoading] = useState(null);
   const [search, setSearch] = useState("");
@@ -66,6 +69,8 @@ export default function AccessControl() {
     try {
       const res = await api.get(`/access/patient/${patientId}`);
       setGrantedDoctors(res.data.granted || []);
+      setGrantedCount(res.data.granted_count || 0);
+      setNextCursor(res.data.next_cursor || null);
     } catch {
       toast.error("Failed to load granted doctors");
     } finally {
@@ -73,6 +78,22 @@ export default function AccessControl() {
     }
   };
 
+  // grants are paged; next_cursor fetches the next page
+  const loadMoreGranted = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await api.get(`/access/patient/${patientId}`, {
+        params: { cursor: nextCursor },
+      });
+      setGrantedDoctors((prev) => [...prev, ...(res.data.granted || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch {
+      toast.error("Failed to load more granted doctors");
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   useEffect(() => {
     if (patientId) {
       fetchDoctors();
@@ -268,6 +289,20 @@ export default function AccessControl() {
                       </div>
                     </motion.div>
                   ))}
+                  <div className="flex items-center justify-between text-sm text-gray-600">
+                    <span>
+                      Showing {grantedDoctors.length} of {grantedCount} grants
+                    </span>
+                    {nextCursor && grantedDoctors.length < grantedCount && (
+                      <PrimaryButton
+                        onClick={loadMoreGranted}
+                        loading={loadingMore}
+                        className="px-6 py-2 w-auto flex items-center justify-center gap-2"
+                      >
+                        Load More
+                      </PrimaryButton>
+                    )}
+                  </div>
                 </div>
               )}
             </div>
@@ -8,7 +8,10 @@ import api from "@/services/api";
 
 const PatientLogs = () => {
   const [logs, setLogs] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
   const [loading, setLoading] = useState(true);
+  const [loadingMore, setLoadingMore] = useState(false);
   const patientId = localStorage.getItem("id");
 
   // ⏰ Format Timestamp
@@ -24,6 +27,8 @@ const PatientLogs = () => {
       try {
         const res = await api.get(`/access/logs/patient/${patientId}`);
         setLogs(res.data.logs || []);
+        setTotal(res.data.count || 0);
+        setNextCursor(res.data.next_cursor || null);
       } catch (err) {
         toast.error("Failed to load activity logs");
         console.error(err);
@@ -40,6 +45,8 @@ const PatientLogs = () => {
     try {
       const res = await api.get(`/access/logs/patient/${patientId}`);
       setLogs(res.data.logs || []);
+      setTotal(res.data.count || 0);
+      setNextCursor(res.data.next_cursor || null);
       toast.dismiss();
       toast.success("Logs updated successfully");
     } catch {
@@ -48,6 +55,23 @@ const PatientLogs = () => {
     }
   };
 
+  // 📜 Load the next (older) page of logs
+  const loadMore = async () => {
+    setLoadingMore(true);
+    try {
+      const res = await api.get(`/access/logs/patient/${patientId}`, {
+        params: { cursor: nextCursor },
+      });
+      setLogs((prev) => [...prev, ...(res.data.logs || [])]);
+      setNextCursor(res.data.next_cursor || null);
+    } catch (err) {
+      toast.error("Failed to load more logs");
+      console.error(err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   return (
     <DashboardLayout role="patient">
       <motion.div
@@ -138,6 +162,20 @@ const PatientLogs = () => {
                     ))}
                   </tbody>
                 </table>
+                <div className="flex items-center justify-between px-6 py-4 text-sm text-gray-600">
+                  <span>
+                    Showing {logs.length} of {total} logs
+                  </span>
+                  {nextCursor && (
+                    <PrimaryButton
+                      onClick={loadMore}
+                      loading={loadingMore}
+                      className="flex items-center gap-2 w-auto px-6"
+                    >
+                      Load More
+                    </PrimaryButton>
+                  )}
+                </div>
               </motion.div>
             ) : (
               <p className="text-center text-gray-500 italic">
@@ -1,7 +1,9 @@
 // src/services/blockchainService.js
 import api from "./api";
 
-export const getLedger = () => api.get("/blockchain/ledger");
+// one page of the ledger, newest first; pass the returned next_cursor for the next page
+export const getLedgerPage = (cursor) =>
+  api.get("/blockchain/ledger/page", { params: cursor ? { cursor } : {} });
 
 export const verifyBlockchain = () => api.get("/blockchain/verify");
 